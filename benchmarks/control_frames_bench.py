@@ -0,0 +1,40 @@
+"""
+Micro-benchmark comparing WebSocketProxpy.is_close (full json.loads) with ControlMessageClassifier.is_close.
+
+Run from the project root: python benchmarks/control_frames_bench.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from websocket_proxpy.proxy import WebSocketProxpy
+from websocket_proxpy.util.control import ControlMessageClassifier
+
+ITERATIONS = 2000
+
+MESSAGES = {
+    "close": "{\"action\": \"close\"}",
+    "small json": "{\"action\": \"subscribe\", \"channel\": \"ticker\"}",
+    "plain text": "hello world",
+    "64KiB json": json.dumps({"data": ["x" * 64] * 1000}),
+    "1MiB json": json.dumps({"data": ["x" * 1024] * 1000}),
+}
+
+
+def main() -> None:
+    classifier = ControlMessageClassifier()
+
+    print(f"{'message':<12} {'is_close us':>12} {'classifier us':>14} {'speedup':>8}")
+    for name, message in MESSAGES.items():
+        baseline = timeit.timeit(lambda: WebSocketProxpy.is_close(message), number=ITERATIONS)
+        fast = timeit.timeit(lambda: classifier.is_close(message), number=ITERATIONS)
+        baseline_us = baseline / ITERATIONS * 1e6
+        fast_us = fast / ITERATIONS * 1e6
+        print(f"{name:<12} {baseline_us:>12.2f} {fast_us:>14.2f} {baseline_us / fast_us:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+Load-generation and latency benchmark for WebSocketProxpy.
+
+Starts a local echo upstream and, for each requested mode, a proxy in its own process. N concurrent clients then send
+fixed-size messages through the proxy and directly to the echo server, and the report compares the two.
+
+Run from the project root, e.g.:
+
+    python benchmarks/proxy_bench.py --clients 50 --messages 200 --size 1024 --json bench_output.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import websockets
+import websockets.exceptions
+
+from websocket_proxpy.proxy import WebSocketProxpy
+from websocket_proxpy.util.loggers import ConsoleDebugLogger
+
+MODES = ("OPEN_URL", "FORCED_URL", "FORCED_URL_NO_PASSWORD")
+COMPRESSION = ("default", "off", "deflate", "passthrough")
+PASSWORD = "benchmark"
+HOST = "127.0.0.1"
+
+
+def get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind((HOST, 0))
+        return probe.getsockname()[1]
+
+
+def read_rss_bytes(pid: int) -> int:
+    # Linux only; reports 0 elsewhere
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def read_cpu_seconds(pid: int) -> float:
+    # utime + stime of the process, Linux only; reports 0.0 elsewhere
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_echo_server(port: int) -> None:
+    async def echo(web_socket) -> None:
+        try:
+            async for message in web_socket:
+                await web_socket.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            # the proxy process is terminated between modes without closing its upstream sockets
+            pass
+
+    async def serve() -> None:
+        async with websockets.serve(echo, HOST, port, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(serve())
+
+
+def build_compression_config(compression: str) -> dict or None:
+    if compression == "default":
+        return None
+    if compression == "off":
+        return {'client': {'enabled': False}, 'proxied': {'enabled': False}}
+    # the echo upstream uses websockets' default 12-bit client window, so clients are held to the same
+    return {'passthrough': compression == "passthrough",
+            'client': {'enabled': True, 'clientMaxWindowBits': 12},
+            'proxied': {'enabled': True}}
+
+
+def build_payload(options: argparse.Namespace) -> bytes:
+    if options.payload == "random":
+        return os.urandom(options.size)
+    # compressible, roughly what a JSON API pushes around
+    record = json.dumps({'id': 12345, 'status': "ok", 'tags': ["alpha", "beta"], 'value': 3.25}).encode()
+    return (record * (options.size // len(record) + 1))[:options.size]
+
+
+def build_proxy_config(mode: str, port: int, echo_url: str, options: argparse.Namespace) -> dict:
+    config = {
+        'configuration': {
+            'authenticationConfiguration': {'password': PASSWORD},
+            'serverConfiguration': {
+                'type': mode,
+                'listenHost': HOST,
+                'port': str(port),
+                'requestsPerConnection': str(options.messages + 1),
+                'proxiedUrl': echo_url,
+            },
+            'transportConfiguration': {
+                'sendPrefix': "",
+                'sendSuffix': "",
+                'forwardingMode': options.forwarding_mode,
+            },
+            'flowControlConfiguration': {
+                'client': {'maxSize': options.size * 2 + 1024},
+                'proxied': {'maxSize': options.size * 2 + 1024},
+            },
+        }
+    }
+
+    compression_config = build_compression_config(options.compression)
+    if compression_config is not None:
+        config['configuration']['compressionConfiguration'] = compression_config
+    return config
+
+
+def run_proxy_server(config: dict) -> None:
+    WebSocketProxpy(ConsoleDebugLogger('websocket_proxy_benchmark', level=logging.WARNING)).run(config)
+
+
+async def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def open_session(url: str, mode: str or None, echo_url: str, max_size: int):
+    web_socket = await websockets.connect(url, max_size=max_size)
+
+    if mode in ("OPEN_URL", "FORCED_URL"):
+        await web_socket.send(json.dumps({'password': PASSWORD}))
+        await web_socket.recv()
+    if mode == "OPEN_URL":
+        await web_socket.send(json.dumps({'url': echo_url}))
+    if mode is not None:
+        status = json.loads(await web_socket.recv())
+        if status['status'] != "ok":
+            raise RuntimeError(f"Proxy refused session: {status['message']}")
+
+    return web_socket
+
+
+async def run_client(url: str, mode: str or None, echo_url: str, options: argparse.Namespace,
+                     latencies: list, setup_times: list, ready: asyncio.Event, sessions: list) -> None:
+    payload = build_payload(options)
+    interval = 1.0 / options.rate if options.rate else 0.0
+
+    started = time.perf_counter()
+    web_socket = await open_session(url, mode, echo_url, options.size * 2 + 1024)
+    setup_times.append(time.perf_counter() - started)
+    sessions.append(web_socket)
+    await ready.wait()
+
+    next_send = time.perf_counter()
+    for _ in range(options.messages):
+        if interval:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_send += interval
+
+        sent_at = time.perf_counter()
+        await web_socket.send(payload)
+        await web_socket.recv()
+        latencies.append(time.perf_counter() - sent_at)
+
+
+async def run_load(url: str, mode: str or None, echo_url: str, options: argparse.Namespace,
+                   measured_pid: int or None) -> dict:
+    latencies, setup_times, sessions = [], [], []
+    ready = asyncio.Event()
+    rss_before = read_rss_bytes(measured_pid) if measured_pid else 0
+
+    clients = [asyncio.ensure_future(run_client(url, mode, echo_url, options, latencies, setup_times, ready,
+                                                sessions))
+               for _ in range(options.clients)]
+    while len(setup_times) < options.clients and not any(client.done() for client in clients):
+        await asyncio.sleep(0.01)
+
+    rss_after = read_rss_bytes(measured_pid) if measured_pid else 0
+    cpu_before = read_cpu_seconds(measured_pid) if measured_pid else 0.0
+    started = time.perf_counter()
+    ready.set()
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - started
+    cpu_seconds = (read_cpu_seconds(measured_pid) - cpu_before) if measured_pid else 0.0
+    await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+
+    latencies.sort()
+    setup_times.sort()
+    forwarded_megabytes = len(latencies) * options.size * 2 / 2 ** 20
+
+    return {
+        'messages': len(latencies),
+        'messagesPerSecond': len(latencies) / elapsed if elapsed else 0.0,
+        'latencyP50Ms': percentile(latencies, 0.50) * 1000,
+        'latencyP99Ms': percentile(latencies, 0.99) * 1000,
+        'latencyP999Ms': percentile(latencies, 0.999) * 1000,
+        'setupMeanMs': sum(setup_times) / len(setup_times) * 1000 if setup_times else 0.0,
+        'setupP99Ms': percentile(setup_times, 0.99) * 1000,
+        'rssPerConnectionBytes': (rss_after - rss_before) / options.clients if measured_pid else None,
+        'cpuSecondsPerForwardedMb': cpu_seconds / forwarded_megabytes if measured_pid and forwarded_megabytes else None,
+    }
+
+
+def added(proxied: dict, direct: dict) -> dict:
+    return {key.replace('latency', 'addedLatency'): proxied[key] - direct[key]
+            for key in ('latencyP50Ms', 'latencyP99Ms', 'latencyP999Ms')}
+
+
+async def benchmark(options: argparse.Namespace) -> dict:
+    context = multiprocessing.get_context("spawn")
+    echo_port = get_free_port()
+    echo_url = f"ws://{HOST}:{echo_port}"
+    echo_process = context.Process(target=run_echo_server, args=(echo_port,), daemon=True)
+    echo_process.start()
+
+    results = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'websockets': websockets.version.version,
+        'options': vars(options),
+        'modes': {},
+    }
+
+    try:
+        await wait_for_port(echo_port)
+        results['direct'] = await run_load(echo_url, None, echo_url, options, None)
+
+        for mode in options.modes:
+            proxy_port = get_free_port()
+            proxy_process = context.Process(target=run_proxy_server,
+                                            args=(build_proxy_config(mode, proxy_port, echo_url, options),),
+                                            daemon=True)
+            proxy_process.start()
+            try:
+                await wait_for_port(proxy_port)
+                mode_results = await run_load(f"ws://{HOST}:{proxy_port}", mode, echo_url, options,
+                                              proxy_process.pid)
+                mode_results.update(added(mode_results, results['direct']))
+                results['modes'][mode] = mode_results
+            finally:
+                proxy_process.terminate()
+                proxy_process.join()
+    finally:
+        echo_process.terminate()
+        echo_process.join()
+
+    return results
+
+
+def print_report(results: dict) -> None:
+    print(f"{'target':<24} {'msgs/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'+p50 ms':>8} {'+p99 ms':>8} "
+          f"{'setup ms':>9} {'RSS/conn':>9} {'CPU s/MB':>9}")
+    rows = [("direct", results['direct'])] + list(results['modes'].items())
+    for name, row in rows:
+        rss = row['rssPerConnectionBytes']
+        cpu = row['cpuSecondsPerForwardedMb']
+        print(f"{name:<24} {row['messagesPerSecond']:>10.0f} {row['latencyP50Ms']:>8.3f} {row['latencyP99Ms']:>8.3f} "
+              f"{row['latencyP999Ms']:>8.3f} {row.get('addedLatencyP50Ms', 0.0):>8.3f} "
+              f"{row.get('addedLatencyP99Ms', 0.0):>8.3f} {row['setupMeanMs']:>9.3f} "
+              f"{'-' if rss is None else f'{rss / 1024:.1f}K':>9} {'-' if cpu is None else f'{cpu:.4f}':>9}")
+
+
+def parse_arguments(arguments: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Throughput/latency benchmark for WebSocketProxpy")
+    parser.add_argument('--clients', type=int, default=20, help="concurrent client sessions")
+    parser.add_argument('--messages', type=int, default=200, help="messages sent by each client")
+    parser.add_argument('--size', type=int, default=256, help="message size in bytes")
+    parser.add_argument('--rate', type=float, default=0.0, help="messages/sec per client, 0 for as fast as possible")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--forwarding-mode', choices=("REQUEST_RESPONSE", "FULL_DUPLEX"), default="REQUEST_RESPONSE")
+    parser.add_argument('--compression', choices=COMPRESSION, default="default",
+                        help="proxy permessage-deflate setup; clients and the echo upstream use websockets' defaults")
+    parser.add_argument('--payload', choices=("random", "json"), default="random",
+                        help="random bytes don't compress, json does")
+    parser.add_argument('--json', metavar='PATH', help="also write machine-readable results to PATH ('-' for stdout)")
+    return parser.parse_args(arguments)
+
+
+def main() -> None:
+    options = parse_arguments()
+    results = asyncio.run(benchmark(options))
+    print_report(results)
+
+    if options.json == "-":
+        print(json.dumps(results, indent=2))
+    elif options.json:
+        with open(options.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Micro-benchmark of the status responses a FORCED_URL handshake sends (authenticated, proxied connection open):
+rendering them with json.dumps per session versus WebSocketProxpy.status_responses. Reports time, peak traced memory
+during a handshake and the bytes of the objects it leaves for sending, including the UTF-8 encoding websockets does
+for str messages.
+
+Run from the project root: python benchmarks/status_responses_bench.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from websocket_proxpy.proxy import PROXIED_CONNECTION_OPEN, WebSocketProxpy, WebSocketConnection
+from websocket_proxpy.util.jsonutils import StatusResponses, get_json_status_response
+from websocket_proxpy.util.loggers import ConsoleDebugLogger
+
+ITERATIONS = 20000
+PROXIED_URL = "ws://localhost:8081/test"
+
+
+def create_proxpy(pre_encoded: bool) -> WebSocketProxpy:
+    proxpy = WebSocketProxpy(ConsoleDebugLogger('websocket_proxy'))
+    proxpy.serverType = "FORCED_URL"
+    proxpy.proxied_url = PROXIED_URL
+    proxpy.status_responses = StatusResponses(pre_encoded=pre_encoded)
+    proxpy.pin_status_responses()
+    return proxpy
+
+
+def encode(response) -> bytes:
+    # what websockets does with a str message before framing it
+    return response if isinstance(response, bytes) else response.encode("utf-8")
+
+
+def render_per_session(proxpy: WebSocketProxpy, connection: WebSocketConnection) -> list:
+    authenticated_message = "Authenticated " + proxpy.get_post_authentication_directions()
+    connection_open_message = "Proxied connection [" + PROXIED_URL + "] open for arbitrary requests."
+    return [encode(get_json_status_response("ok", authenticated_message)),
+            encode(get_json_status_response("ok", connection_open_message))]
+
+
+def render_cached(proxpy: WebSocketProxpy, connection: WebSocketConnection) -> list:
+    return [encode(proxpy.get_authenticated_response(connection)),
+            encode(proxpy.status_responses.format("ok", PROXIED_CONNECTION_OPEN, PROXIED_URL))]
+
+
+def measure_new_bytes(handshake, proxpy: WebSocketProxpy, handshakes: int = 1000) -> float:
+    # the responses are kept alive, so whatever a handshake had to allocate for them stays traced
+    connection = WebSocketConnection()
+    responses = []
+    handshake(proxpy, connection)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(handshakes):
+        responses.append(handshake(proxpy, connection))
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / handshakes
+
+
+def measure_peak_bytes(handshake, proxpy: WebSocketProxpy, handshakes: int = 1000) -> float:
+    connection = WebSocketConnection()
+    handshake(proxpy, connection)
+    peak_total = 0
+    tracemalloc.start()
+    for _ in range(handshakes):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        handshake(proxpy, connection)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - before
+    tracemalloc.stop()
+    return peak_total / handshakes
+
+
+def main() -> None:
+    variants = {
+        "json.dumps per session": (render_per_session, create_proxpy(False)),
+        "status_responses": (render_cached, create_proxpy(False)),
+        "status_responses preEncoded": (render_cached, create_proxpy(True)),
+    }
+
+    print(f"{'variant':<28} {'us/handshake':>13} {'peak bytes':>11} {'new bytes':>10}")
+    for name, (handshake, proxpy) in variants.items():
+        connection = WebSocketConnection()
+        seconds = timeit.timeit(lambda: handshake(proxpy, connection), number=ITERATIONS)
+        print(f"{name:<28} {seconds / ITERATIONS * 1e6:>13.2f} {measure_peak_bytes(handshake, proxpy):>11.0f} "
+              f"{measure_new_bytes(handshake, proxpy):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
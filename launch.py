@@ -2,6 +2,7 @@ import sys
 from websocket_proxpy.proxy import WebSocketProxpy
 from websocket_proxpy.util import loggers
 from websocket_proxpy.util import base
+from websocket_proxpy import workers
 
 try:
     import yaml
@@ -13,4 +14,10 @@ CONFIG_FILE_NAME = "config.yaml"
 
 config = yaml.load(open(CONFIG_FILE_NAME), Loader=yaml.SafeLoader)
 
-WebSocketProxpy(loggers.ConsoleDebugLogger('websocket_proxy')).run(config)
+logger = loggers.create_logger_from_yaml(workers.LOGGER_NAME, config)
+worker_count = workers.get_worker_count(config)
+
+if worker_count > 1:
+    workers.WorkerSupervisor(worker_count, config, logger, config_path=CONFIG_FILE_NAME).run()
+else:
+    WebSocketProxpy(logger).run(config, CONFIG_FILE_NAME)
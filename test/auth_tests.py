@@ -0,0 +1,152 @@
+import json
+import unittest
+from unittest.mock import patch
+from websocket_proxpy.auth import (Authenticator, SessionTokenCache, create_dummy_password, hash_password,
+                                   verify_password)
+from websocket_proxpy.proxy import WebSocketProxpy, WebSocketConnection
+from websocket_proxpy.util.loggers import ConsoleDebugLogger
+from fakes import FakeClock
+
+
+PBKDF2_PREFIX = "pbkdf2_sha256$"
+
+
+class StaticAuthenticator(Authenticator):
+
+    def authenticate(self, credentials: dict) -> str or None:
+        return "static" if credentials.get('apiKey') == self.authentication_configuration['apiKey'] else None
+
+
+def create_connection(credentials: dict) -> WebSocketConnection:
+    connection = WebSocketConnection()
+    connection.credentials = json.dumps(credentials)
+    return connection
+
+
+def create_config(authentication_configuration: dict) -> dict:
+    return {'configuration': {
+        'authenticationConfiguration': authentication_configuration,
+        'serverConfiguration': {'type': "FORCED_URL", 'listenHost': "localhost", 'port': "7777",
+                                'requestsPerConnection': "10", 'proxiedUrl': "ws://localhost:8080"},
+        'transportConfiguration': {'sendPrefix': "", 'sendSuffix': ""},
+    }}
+
+
+class PasswordHashingTests(unittest.TestCase):
+
+    def test_hashed_password(self) -> None:
+        stored_password = hash_password("secret", iterations=1000)
+        self.assertTrue(stored_password.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(verify_password("secret", stored_password))
+        self.assertFalse(verify_password("Secret", stored_password))
+        self.assertNotEqual(stored_password, hash_password("secret", iterations=1000))
+
+    def test_plain_and_malformed_passwords(self) -> None:
+        self.assertTrue(verify_password("secret", "secret"))
+        self.assertFalse(verify_password("secret", "secre"))
+        self.assertFalse(verify_password(12345, "12345"))
+        self.assertFalse(verify_password("secret", None))
+        self.assertFalse(verify_password("secret", "pbkdf2_sha256$x$y"))
+
+    def test_dummy_password_matches_stored_iterations(self) -> None:
+        dummy_password = create_dummy_password([hash_password("a", iterations=1000), "plain",
+                                                hash_password("b", iterations=2000), None])
+        self.assertTrue(dummy_password.startswith("pbkdf2_sha256$2000$"))
+        self.assertFalse(create_dummy_password(["plain"]).startswith(PBKDF2_PREFIX))
+
+    def test_authenticator_must_implement_authenticate(self) -> None:
+        with self.assertRaises(TypeError):
+            Authenticator({})
+
+
+class SessionTokenCacheTests(unittest.TestCase):
+
+    def test_tokens_are_single_use(self) -> None:
+        session_tokens = SessionTokenCache()
+        token = session_tokens.issue("alice")
+
+        self.assertEqual("alice", session_tokens.redeem(token))
+        self.assertIsNone(session_tokens.redeem(token))
+        self.assertIsNone(session_tokens.redeem(["not", "a", "token"]))
+        self.assertEqual(2, session_tokens.get_stats()['tokensRejected'])
+
+    def test_tokens_expire(self) -> None:
+        clock = FakeClock()
+        session_tokens = SessionTokenCache(ttl=10, clock=clock)
+        expired_token = session_tokens.issue("alice")
+        clock.now = 10
+        self.assertIsNone(session_tokens.redeem(expired_token))
+
+        session_tokens.issue("alice")
+        clock.now = 25
+        session_tokens.issue("bob")
+        self.assertEqual(1, session_tokens.get_stats()['tokensActive'])
+
+    def test_oldest_tokens_are_evicted(self) -> None:
+        session_tokens = SessionTokenCache(max_size=2)
+        oldest_token = session_tokens.issue("alice")
+        session_tokens.issue("bob")
+        newest_token = session_tokens.issue("carol")
+
+        self.assertIsNone(session_tokens.redeem(oldest_token))
+        self.assertEqual("carol", session_tokens.redeem(newest_token))
+        self.assertEqual(1, session_tokens.get_stats()['tokensEvicted'])
+
+
+class ProxyAuthenticationTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.web_socket_proxpy = WebSocketProxpy(ConsoleDebugLogger('websocket_proxy'))
+
+    async def test_multiple_users_with_hashed_passwords(self) -> None:
+        self.assertTrue(self.web_socket_proxpy.load_config_from_yaml(create_config({
+            'password': "shared",
+            'users': {'alice': hash_password("wonderland", iterations=1000), 'bob': "builder"},
+        })))
+        self.assertTrue(self.web_socket_proxpy.authenticate_in_thread)
+
+        connection = create_connection({'user': "alice", 'password': "wonderland"})
+        self.assertTrue(await self.web_socket_proxpy.authenticate_session(connection))
+        self.assertEqual("alice", connection.user)
+        self.assertTrue(self.web_socket_proxpy.authenticate(create_connection({'user': "bob", 'password': "builder"})))
+        self.assertTrue(self.web_socket_proxpy.authenticate(create_connection({'password': "shared"})))
+
+        self.assertFalse(self.web_socket_proxpy.authenticate(create_connection({'user': "bob", 'password': "shared"})))
+        self.assertFalse(self.web_socket_proxpy.authenticate(create_connection({'user': "eve", 'password': "x"})))
+        self.assertFalse(self.web_socket_proxpy.authenticate(create_connection({'user': ["alice"], 'password': "x"})))
+        self.assertFalse(self.web_socket_proxpy.authenticate(create_connection(["password"])))
+
+    async def test_unknown_user_is_checked_against_dummy_hash(self) -> None:
+        self.assertTrue(self.web_socket_proxpy.load_config_from_yaml(create_config({
+            'users': {'alice': hash_password("wonderland", iterations=1000)}})))
+        dummy_password = self.web_socket_proxpy.config.dummy_password
+        self.assertTrue(dummy_password.startswith("pbkdf2_sha256$1000$"))
+
+        with patch("websocket_proxpy.proxy.verify_password", wraps=verify_password) as checked_password:
+            self.assertFalse(self.web_socket_proxpy.authenticate(create_connection({'user': "eve", 'password': "x"})))
+        checked_password.assert_called_once_with("x", dummy_password)
+
+    async def test_session_token_resumes_session(self) -> None:
+        self.assertTrue(self.web_socket_proxpy.load_config_from_yaml(create_config({
+            'password': "shared", 'sessionTokens': {'enabled': True, 'ttl': 60}})))
+        connection = create_connection({'password': "shared"})
+        self.assertTrue(self.web_socket_proxpy.authenticate(connection))
+        fields = self.web_socket_proxpy.get_session_token_fields(connection)
+        self.assertEqual(60, fields['tokenTtl'])
+
+        resumed_connection = create_connection({'token': fields['token']})
+        self.assertTrue(self.web_socket_proxpy.authenticate(resumed_connection))
+        self.assertEqual("default", resumed_connection.user)
+        self.assertFalse(self.web_socket_proxpy.authenticate(create_connection({'token': fields['token']})))
+        self.assertEqual(1, self.web_socket_proxpy.get_stats()['sessionTokens']['tokensRedeemed'])
+
+    async def test_authenticator_class(self) -> None:
+        self.assertTrue(self.web_socket_proxpy.load_config_from_yaml(create_config({
+            'authenticatorClass': "auth_tests.StaticAuthenticator", 'apiKey': "k3y"})))
+
+        self.assertTrue(await self.web_socket_proxpy.authenticate_session(create_connection({'apiKey': "k3y"})))
+        self.assertFalse(await self.web_socket_proxpy.authenticate_session(create_connection({'apiKey': "key"})))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import BINARY, TEXT, Frame
+from websocket_proxpy.compression import (CompressionControl, LegCompression, ProxyClientDeflateFactory,
+                                          ProxyPerMessageDeflate, ProxyServerDeflateFactory, can_relay,
+                                          receive_passthrough_message)
+from websocket_proxpy.transport import PrecompressedMessage
+from fakes import FakeWebSocket
+
+PAYLOAD = b'{"status": "ok", "values": [1, 2, 3]}' * 20
+
+
+def create_extension(min_size: int = 0, passthrough: bool = False, remote_max_window_bits: int = 15,
+                     local_max_window_bits: int = 15) -> ProxyPerMessageDeflate:
+    return ProxyPerMessageDeflate.adopt(PerMessageDeflate(False, False, remote_max_window_bits, local_max_window_bits),
+                                        min_size, passthrough)
+
+
+class LegCompressionTests(unittest.TestCase):
+
+    def test_connection_kwargs(self) -> None:
+        self.assertEqual({}, LegCompression.from_yaml(None).server_kwargs())
+        self.assertEqual({'compression': None}, LegCompression.from_yaml({'enabled': False}).client_kwargs())
+
+        leg_compression = LegCompression.from_yaml({'serverMaxWindowBits': 10, 'level': 1, 'minSize': "256"})
+        server_factory = leg_compression.server_kwargs()['extensions'][0]
+        self.assertIsInstance(server_factory, ProxyServerDeflateFactory)
+        self.assertEqual(10, server_factory.server_max_window_bits)
+        self.assertEqual({'memLevel': 5, 'level': 1}, server_factory.compress_settings)
+        self.assertEqual(256, server_factory.min_size)
+
+        client_factory = leg_compression.client_kwargs(passthrough=True)['extensions'][0]
+        self.assertIsInstance(client_factory, ProxyClientDeflateFactory)
+        self.assertTrue(client_factory.client_max_window_bits)
+        self.assertTrue(client_factory.passthrough)
+
+    def test_invalid_window_bits(self) -> None:
+        with self.assertRaises(ValueError):
+            LegCompression(True, server_max_window_bits=20).server_kwargs()
+
+
+class ProxyPerMessageDeflateTests(unittest.TestCase):
+
+    def test_small_messages_are_sent_uncompressed(self) -> None:
+        extension = create_extension(min_size=100)
+
+        small_frame = extension.encode(Frame(TEXT, b"small"))
+        self.assertFalse(small_frame.rsv1)
+        self.assertEqual(b"small", small_frame.data)
+
+        large_frame = extension.encode(Frame(TEXT, PAYLOAD))
+        self.assertTrue(large_frame.rsv1)
+        self.assertLess(len(large_frame.data), len(PAYLOAD))
+
+    def test_relayed_message_is_not_inflated_and_deflated_again(self) -> None:
+        client_peer = PerMessageDeflate(False, False, 15, 15)
+        proxied_peer = PerMessageDeflate(False, False, 15, 15)
+        client_leg = create_extension(passthrough=True)
+        proxied_leg = create_extension(passthrough=True)
+        client_leg.relay_incoming = True
+        proxied_leg.relay_only = True
+
+        for _ in range(3):
+            compressed_frame = client_peer.encode(Frame(BINARY, PAYLOAD))
+            received_frame = client_leg.decode(compressed_frame)
+            self.assertFalse(received_frame.rsv1)
+            self.assertEqual(compressed_frame.data, received_frame.data)
+            self.assertEqual((False, True), client_leg.received.popleft())
+
+            relayed_frame = proxied_leg.encode(Frame(BINARY, PrecompressedMessage(received_frame.data, False)))
+            self.assertTrue(relayed_frame.rsv1)
+            self.assertEqual(PAYLOAD, proxied_peer.decode(relayed_frame).data)
+
+        # the proxy's own messages must not touch the peer's inflate context
+        self.assertFalse(proxied_leg.encode(Frame(TEXT, PAYLOAD)).rsv1)
+
+    def test_messages_are_inflated_until_relaying_starts(self) -> None:
+        client_peer = PerMessageDeflate(False, False, 15, 15)
+        client_leg = create_extension(passthrough=True)
+
+        self.assertEqual(PAYLOAD, client_leg.decode(client_peer.encode(Frame(TEXT, PAYLOAD))).data)
+        self.assertEqual((True, False), client_leg.received.popleft())
+        self.assertEqual(1, client_leg.inflated_messages)
+
+    def test_can_relay(self) -> None:
+        self.assertTrue(can_relay(create_extension(remote_max_window_bits=12), create_extension()))
+        self.assertFalse(can_relay(create_extension(), create_extension(local_max_window_bits=12)))
+
+        source = create_extension()
+        source.inflated_messages = 1
+        self.assertFalse(can_relay(source, create_extension()))
+
+        # a peer without context takeover starts every message with an empty window, so earlier ones don't matter
+        no_context_takeover_source = ProxyPerMessageDeflate.adopt(PerMessageDeflate(True, False, 15, 15), 0, True)
+        no_context_takeover_source.inflated_messages = 1
+        self.assertTrue(can_relay(no_context_takeover_source, create_extension()))
+
+        context_takeover_source = create_extension()
+        no_context_takeover_destination = ProxyPerMessageDeflate.adopt(PerMessageDeflate(False, True, 15, 15), 0, True)
+        self.assertFalse(can_relay(context_takeover_source, no_context_takeover_destination))
+
+
+class CompressionControlTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_receive_passthrough_message(self) -> None:
+        extension = create_extension(passthrough=True)
+        extension.received.extend([(True, True), (True, False), (False, False)])
+        web_socket = FakeWebSocket([b"\x01\x02", "text".encode(), b"\x00binary"])
+
+        message = await receive_passthrough_message(web_socket, extension)
+        self.assertIsInstance(message, PrecompressedMessage)
+        self.assertTrue(message.is_text)
+        self.assertEqual("text", await receive_passthrough_message(web_socket, extension))
+        self.assertEqual(b"\x00binary", await receive_passthrough_message(web_socket, extension))
+
+    def test_plain_sockets_use_the_default_receiver(self) -> None:
+        compression_control = CompressionControl(passthrough=True)
+        compression_control.start_session(object(), object())
+
+        self.assertEqual({'compressionPassthroughDirections': 0, 'compressionRecompressedDirections': 0},
+                         compression_control.get_stats())
+        self.assertEqual("receive_message", compression_control.get_receiver(object()).__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
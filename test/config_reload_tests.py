@@ -0,0 +1,127 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import yaml
+from websocket_proxpy.config_reload import ConfigFileWatcher, get_applied_config, get_restart_required_changes
+from websocket_proxpy.proxy import WebSocketProxpy, WebSocketConnection
+from websocket_proxpy.util.loggers import ConsoleDebugLogger
+
+
+def create_config(**server_configuration) -> dict:
+    settings = {'type': "FORCED_URL", 'listenHost': "localhost", 'port': "7777", 'requestsPerConnection': "500",
+                'proxiedUrl': "ws://localhost:8080/test"}
+    settings.update(server_configuration)
+    return {'configuration': {'authenticationConfiguration': {'password': "gogol"},
+                              'serverConfiguration': settings,
+                              'transportConfiguration': {'sendPrefix': "", 'sendSuffix': ""}}}
+
+
+class RestartRequiredChangesTests(unittest.TestCase):
+
+    def test_reloadable_changes_are_not_listed(self) -> None:
+        self.assertEqual([], get_restart_required_changes(
+            create_config(), create_config(requestsPerConnection="5", proxiedUrl="ws://localhost:9090")))
+
+    def test_listener_changes_are_listed(self) -> None:
+        self.assertEqual(["serverConfiguration.port"],
+                         get_restart_required_changes(create_config(), create_config(port="8888")))
+
+    def test_added_section_is_listed(self) -> None:
+        new_config = create_config()
+        new_config['configuration']['metricsConfiguration'] = {'port': 9100}
+        self.assertEqual(["metricsConfiguration.port"], get_restart_required_changes(create_config(), new_config))
+
+    def test_applied_config_keeps_restart_required_values(self) -> None:
+        new_config = create_config(port="8888", requestsPerConnection="5")
+        new_config['configuration']['metricsConfiguration'] = {'port': 9100}
+        applied_config = get_applied_config(create_config(), new_config)
+
+        self.assertEqual(create_config(requestsPerConnection="5"), applied_config)
+        self.assertEqual(["metricsConfiguration.port", "serverConfiguration.port"],
+                         get_restart_required_changes(applied_config, new_config))
+
+
+class ConfigReloadTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        config_file, self.config_path = tempfile.mkstemp(suffix=".yaml")
+        os.close(config_file)
+        self.addCleanup(os.remove, self.config_path)
+        self.write_config(create_config())
+
+        self.web_socket_proxpy = WebSocketProxpy(ConsoleDebugLogger('websocket_proxy'))
+        self.web_socket_proxpy.config_path = self.config_path
+        self.assertTrue(self.web_socket_proxpy.load_config_from_yaml(create_config()))
+
+    def write_config(self, config: dict or str) -> None:
+        with open(self.config_path, "w") as config_file:
+            config_file.write(config if isinstance(config, str) else yaml.dump(config))
+
+    async def test_reload_applies_to_new_sessions_only(self) -> None:
+        old_session = WebSocketConnection()
+        old_session.config = self.web_socket_proxpy.config
+
+        self.write_config(create_config(requestsPerConnection="5", proxiedUrl="ws://localhost:9090"))
+        self.assertTrue(await self.web_socket_proxpy.reload_config())
+
+        self.assertEqual(500, self.web_socket_proxpy.get_session_config(old_session).requests_per_connection)
+        self.assertEqual(5, self.web_socket_proxpy.config.requests_per_connection)
+        self.assertEqual("ws://localhost:9090", self.web_socket_proxpy.config.proxied_url)
+        self.assertEqual(old_session.config.generation + 1, self.web_socket_proxpy.config.generation)
+        self.assertEqual(1, self.web_socket_proxpy.get_stats()['configReloads'])
+
+    async def test_invalid_file_keeps_running_config(self) -> None:
+        config = self.web_socket_proxpy.config
+        self.write_config("configuration: [unclosed")
+        self.assertFalse(await self.web_socket_proxpy.reload_config())
+
+        self.write_config(create_config(type="NO_SUCH_TYPE"))
+        self.assertFalse(await self.web_socket_proxpy.reload_config())
+
+        self.assertIs(config, self.web_socket_proxpy.config)
+        self.assertEqual(2, self.web_socket_proxpy.get_stats()['configReloadFailures'])
+
+    async def test_restart_required_changes_are_not_applied(self) -> None:
+        self.write_config(create_config(port="8888", requestsPerConnection="5"))
+        self.assertTrue(await self.web_socket_proxpy.reload_config())
+
+        self.assertEqual(7777, self.web_socket_proxpy.port)
+        self.assertEqual(5, self.web_socket_proxpy.requests_per_connection)
+
+        # still not applied, so a second reload of the same file reports it again
+        self.assertEqual(["serverConfiguration.port"],
+                         get_restart_required_changes(self.web_socket_proxpy.config_yaml, create_config(port="8888")))
+        self.assertTrue(await self.web_socket_proxpy.reload_config())
+        self.assertEqual("7777", self.web_socket_proxpy.config_yaml['configuration']['serverConfiguration']['port'])
+
+    async def test_reload_is_validated_against_running_config(self) -> None:
+        # the pool stays until a restart, and a SHARED pool can't run with FULL_DUPLEX forwarding
+        running_config = create_config(upstreamPool={'enabled': True, 'mode': "SHARED"})
+        self.assertTrue(self.web_socket_proxpy.load_config_from_yaml(running_config))
+        new_config = create_config()
+        new_config['configuration']['transportConfiguration']['forwardingMode'] = "FULL_DUPLEX"
+        self.write_config(new_config)
+
+        self.assertFalse(await self.web_socket_proxpy.reload_config())
+        self.assertEqual("REQUEST_RESPONSE", self.web_socket_proxpy.forwarding_mode)
+        self.assertIs(running_config, self.web_socket_proxpy.config_yaml)
+
+    async def test_watcher_notices_changed_file(self) -> None:
+        changes = []
+        watcher = ConfigFileWatcher(self.config_path, lambda: changes.append(True), interval=0.01)
+        self.assertFalse(watcher.has_changed())
+
+        watcher.start()
+        self.write_config(create_config(requestsPerConnection="123456"))
+        for _ in range(100):
+            if changes:
+                break
+            await asyncio.sleep(0.01)
+        await watcher.close()
+
+        self.assertEqual([True], changes)
+
+
+if __name__ == '__main__':
+    unittest.main()
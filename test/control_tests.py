@@ -0,0 +1,37 @@
+import unittest
+from websocket_proxpy.util.control import ControlMessageClassifier, MAX_CONTROL_MESSAGE_LENGTH
+
+
+class ControlMessageClassifierTests(unittest.TestCase):
+
+    def test_is_close_with_matching_json(self) -> None:
+        classifier = ControlMessageClassifier()
+        self.assertTrue(classifier.is_close("{\"action\": \"close\"}"))
+        self.assertTrue(classifier.is_close("  {\"action\":\"close\"}"))
+
+    def test_is_close_with_non_matching_messages(self) -> None:
+        classifier = ControlMessageClassifier()
+        self.assertFalse(classifier.is_close("xyz"))
+        self.assertFalse(classifier.is_close("{\"action\": \"test\"}"))
+        self.assertFalse(classifier.is_close("{\"note\": \"close\"}"))
+        self.assertFalse(classifier.is_close("[\"close\"]"))
+        self.assertFalse(classifier.is_close("{\"action\": \"close\""))
+
+    def test_is_close_skips_binary_frames(self) -> None:
+        self.assertFalse(ControlMessageClassifier().is_close(b"{\"action\": \"close\"}"))
+
+    def test_is_close_skips_oversized_messages(self) -> None:
+        padding = " " * MAX_CONTROL_MESSAGE_LENGTH
+        self.assertFalse(ControlMessageClassifier().is_close("{\"action\": \"close\"}" + padding))
+
+    def test_is_close_when_disabled(self) -> None:
+        self.assertFalse(ControlMessageClassifier(enabled=False).is_close("{\"action\": \"close\"}"))
+
+    def test_is_close_with_prefix(self) -> None:
+        classifier = ControlMessageClassifier(prefix="!proxpy ")
+        self.assertTrue(classifier.is_close("!proxpy {\"action\": \"close\"}"))
+        self.assertFalse(classifier.is_close("{\"action\": \"close\"}"))
+
+
+if __name__ == '__main__':
+    unittest.main()
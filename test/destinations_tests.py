@@ -0,0 +1,154 @@
+import asyncio
+import socket
+import unittest
+import websockets.exceptions
+from websockets.datastructures import Headers
+from websockets.http11 import Response
+from websocket_proxpy.destinations import (CircuitBreaker, DestinationPolicy, DestinationUnavailable, DnsCache,
+                                           compile_destination_patterns)
+from fakes import FakeClock
+
+
+class CountingDnsCache(DnsCache):
+
+    def __init__(self, addresses: list or None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.addresses = addresses
+        self.lookups = 0
+
+    async def lookup(self, host: str) -> list[str]:
+        self.lookups += 1
+        await asyncio.sleep(0)
+        if self.addresses is None:
+            error = socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+            self.store(host, error, self.negative_ttl)
+            raise error
+        self.store(host, self.addresses, self.ttl)
+        return self.addresses
+
+
+class DestinationPatternTests(unittest.TestCase):
+
+    def test_patterns(self) -> None:
+        allowed = compile_destination_patterns(["localhost:8081", "*.Example.com", "10.0.0.*:80??", "[::1]"])
+
+        self.assertTrue(allowed.fullmatch("localhost:8081"))
+        self.assertFalse(allowed.fullmatch("localhost:8082"))
+        self.assertTrue(allowed.fullmatch("api.example.com:443"))
+        self.assertFalse(allowed.fullmatch("example.com.evil.org:80"))
+        self.assertTrue(allowed.fullmatch("10.0.0.7:8081"))
+        self.assertFalse(allowed.fullmatch("10.0.0.7:9000"))
+        self.assertTrue(allowed.fullmatch("::1:9000"))
+
+    def test_no_patterns_allow_everything(self) -> None:
+        self.assertIsNone(compile_destination_patterns([]))
+        self.assertIsNone(compile_destination_patterns(None))
+
+
+class DnsCacheTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_results_are_cached_until_ttl(self) -> None:
+        clock = FakeClock()
+        dns_cache = CountingDnsCache(["10.0.0.1"], ttl=30, clock=clock)
+
+        results = await asyncio.gather(*(dns_cache.resolve("upstream") for _ in range(3)))
+        self.assertEqual([["10.0.0.1"]] * 3, results)
+        self.assertEqual(1, dns_cache.lookups)
+
+        clock.now = 29
+        await dns_cache.resolve("upstream")
+        self.assertEqual(1, dns_cache.lookups)
+        clock.now = 31
+        await dns_cache.resolve("upstream")
+        self.assertEqual(2, dns_cache.lookups)
+        self.assertEqual(1, dns_cache.get_stats()['dnsHits'])
+
+    async def test_failed_lookups_are_cached(self) -> None:
+        dns_cache = CountingDnsCache(None, negative_ttl=5, clock=FakeClock())
+
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                await dns_cache.resolve("missing")
+        self.assertEqual(1, dns_cache.lookups)
+        self.assertEqual(1, dns_cache.get_stats()['dnsNegativeHits'])
+
+    async def test_ip_addresses_skip_resolution(self) -> None:
+        dns_cache = CountingDnsCache(None)
+        self.assertEqual(["127.0.0.1"], await dns_cache.resolve("127.0.0.1"))
+        self.assertEqual(0, dns_cache.lookups)
+
+    async def test_size_is_bounded(self) -> None:
+        dns_cache = CountingDnsCache(["10.0.0.1"], max_size=2)
+        for host in ("a", "b", "c"):
+            await dns_cache.resolve(host)
+        self.assertEqual(["b", "c"], list(dns_cache.entries))
+
+
+class CircuitBreakerTests(unittest.TestCase):
+
+    def test_opens_after_threshold_and_allows_one_trial(self) -> None:
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=clock)
+
+        breaker.record_failure("upstream:80")
+        self.assertTrue(breaker.allow("upstream:80"))
+        breaker.record_failure("upstream:80")
+        self.assertFalse(breaker.allow("upstream:80"))
+        self.assertEqual(["upstream:80"], breaker.get_open_destinations())
+
+        clock.now = 10
+        self.assertTrue(breaker.allow("upstream:80"))
+        self.assertFalse(breaker.allow("upstream:80"))
+
+        breaker.record_success("upstream:80")
+        self.assertTrue(breaker.allow("upstream:80"))
+        self.assertEqual({'breakerOpenCircuits': 0, 'breakerOpened': 1, 'breakerRejected': 2}, breaker.get_stats())
+
+
+class DestinationPolicyTests(unittest.IsolatedAsyncioTestCase):
+
+    def test_check_url(self) -> None:
+        policy = DestinationPolicy(None, ["localhost:8081"])
+
+        self.assertIsNone(policy.check_url("ws://localhost:8081/test"))
+        self.assertEqual("Destination [localhost:80] is not allowed", policy.check_url("ws://localhost/test"))
+        self.assertEqual("URL has no host", policy.check_url("ws:///test"))
+        self.assertIsNotNone(policy.check_url("ws://localhost:port/test"))
+        self.assertEqual(3, policy.get_stats()['destinationsRejected'])
+
+    async def test_connect_uses_resolved_address_and_trips_breaker(self) -> None:
+        attempts = []
+
+        async def connect(url: str, host: str, port: int) -> str:
+            attempts.append((url, host, port))
+            if host == "10.0.0.1":
+                raise ConnectionRefusedError()
+            return "web socket"
+
+        policy = DestinationPolicy(connect, dns_cache=CountingDnsCache(["10.0.0.1", "10.0.0.2"]))
+        self.assertEqual("web socket", await policy.connect("ws://upstream:8081/test"))
+        self.assertEqual([("ws://upstream:8081/test", "10.0.0.1", 8081), ("ws://upstream:8081/test", "10.0.0.2", 8081)],
+                         attempts)
+
+        policy = DestinationPolicy(connect, dns_cache=CountingDnsCache(["10.0.0.1"]),
+                                   breaker=CircuitBreaker(failure_threshold=1))
+        with self.assertRaises(ConnectionRefusedError):
+            await policy.connect("ws://upstream/test")
+        with self.assertRaises(DestinationUnavailable):
+            await policy.connect("ws://upstream/test")
+        self.assertEqual(1, policy.get_stats()['breakerOpenCircuits'])
+
+    async def test_rejected_handshake_trips_breaker(self) -> None:
+        async def connect(url: str, host: str, port: int) -> str:
+            raise websockets.exceptions.InvalidStatus(Response(502, "Bad Gateway", Headers()))
+
+        policy = DestinationPolicy(connect, dns_cache=CountingDnsCache(["10.0.0.1"]),
+                                   breaker=CircuitBreaker(failure_threshold=1))
+        with self.assertRaises(websockets.exceptions.InvalidStatus):
+            await policy.connect("ws://upstream/test")
+        with self.assertRaises(DestinationUnavailable):
+            await policy.connect("ws://upstream/test")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import time
+import unittest
+from websocket_proxpy import event_loop
+from websocket_proxpy.event_loop import LoopLagMonitor
+from websocket_proxpy.proxy import WebSocketProxpy
+from websocket_proxpy.util.loggers import ConsoleDebugLogger
+from fakes import FakeWebSocket
+
+
+class FakeServer:
+
+    def __init__(self) -> None:
+        self.closed_with = None
+
+    def close(self, close_connections: bool = True) -> None:
+        self.closed_with = close_connections
+
+    async def wait_closed(self) -> None:
+        pass
+
+
+class EventLoopTests(unittest.TestCase):
+
+    def test_asyncio_backend_uses_the_default_loop(self) -> None:
+        self.assertIsNone(event_loop.get_loop_factory("ASYNCIO"))
+
+    @unittest.skipIf(event_loop.import_uvloop() is None, "uvloop not installed")
+    def test_auto_backend_prefers_uvloop(self) -> None:
+        loop_factory = event_loop.get_loop_factory("AUTO")
+
+        async def get_loop_module() -> str:
+            return type(asyncio.get_running_loop()).__module__
+
+        self.assertEqual("uvloop", event_loop.run(get_loop_module(), loop_factory))
+
+    def test_run_with_default_loop(self) -> None:
+        async def answer() -> int:
+            return 42
+
+        self.assertEqual(42, event_loop.run(answer()))
+
+
+class LoopLagMonitorTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_blocking_callback_is_reported(self) -> None:
+        monitor = LoopLagMonitor(ConsoleDebugLogger('websocket_proxy'), interval=0.01, threshold=0.02)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.05)
+        await asyncio.sleep(0.03)
+        await monitor.close()
+
+        self.assertGreaterEqual(monitor.lag_events, 1)
+        self.assertGreaterEqual(monitor.get_stats()['loopLagMax'], 0.02)
+        self.assertGreater(monitor.histogram.count, 1)
+
+
+class DrainTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.web_socket_proxpy = WebSocketProxpy(ConsoleDebugLogger('websocket_proxy'))
+        self.web_socket_proxpy.drain_timeout = 0.2
+        self.server = FakeServer()
+
+    async def test_drain_waits_for_sessions_to_finish(self) -> None:
+        connection = self.web_socket_proxpy.sessions.open(FakeWebSocket())
+        asyncio.get_running_loop().call_later(0.05, self.web_socket_proxpy.sessions.close, connection)
+
+        started = time.monotonic()
+        await self.web_socket_proxpy.drain(self.server)
+
+        self.assertFalse(self.server.closed_with)
+        self.assertLess(time.monotonic() - started, 0.2)
+        self.assertIsNone(connection.proxy_web_socket.close_code)
+
+    async def test_drain_closes_sessions_left_at_the_deadline(self) -> None:
+        connection = self.web_socket_proxpy.sessions.open(FakeWebSocket())
+
+        await self.web_socket_proxpy.drain(self.server)
+
+        self.assertEqual(1001, connection.proxy_web_socket.close_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import asyncio
+import websockets.exceptions
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeTransport:
+
+    def __init__(self, buffered: int) -> None:
+        self.buffered = buffered
+
+    def get_write_buffer_size(self) -> int:
+        return self.buffered
+
+
+class FakeWebSocket:
+    """
+    In-memory stand-in for a websockets connection: recv() returns the messages queued on incoming (None closes the
+    connection), sends are recorded, and every ping() hands out a pong waiter the test resolves.
+    """
+    remote_address = ("127.0.0.1", 50000)
+
+    def __init__(self, messages: list = (), buffered: int = 0) -> None:
+        self.incoming = asyncio.Queue()
+        for message in messages:
+            self.incoming.put_nowait(message)
+        self.transport = FakeTransport(buffered)
+        self.sent = []
+        self.closed = False
+        self.close_code = None
+        self.pong_waiters = []
+
+    async def recv(self, decode: bool or None = None):
+        message = await self.incoming.get()
+        if message is None:
+            raise websockets.exceptions.ConnectionClosedOK(None, None)
+        return message
+
+    async def send(self, message) -> None:
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.closed = True
+        self.close_code = code
+
+    async def ping(self) -> asyncio.Future:
+        pong_waiter = asyncio.get_running_loop().create_future()
+        self.pong_waiters.append(pong_waiter)
+        return pong_waiter
@@ -0,0 +1,56 @@
+import unittest
+from websocket_proxpy.flow_control import BackpressureExceeded, FlowControl, LegLimits
+from websocket_proxpy.transport import FragmentedMessage
+from fakes import FakeWebSocket
+
+
+class LegLimitsTests(unittest.TestCase):
+
+    def test_connection_kwargs_only_include_configured_limits(self) -> None:
+        self.assertEqual({}, LegLimits.from_yaml(None).connection_kwargs())
+        self.assertEqual({'max_size': 1024, 'max_queue': 4, 'write_limit': (65536, 16384)},
+                         LegLimits.from_yaml({'maxSize': "1024", 'maxQueue': 4, 'writeHighWatermark': 65536,
+                                              'writeLowWatermark': 16384}).connection_kwargs())
+        self.assertEqual({'write_limit': 4096}, LegLimits(write_high_watermark=4096).connection_kwargs())
+
+
+class FlowControlTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_pause_always_sends(self) -> None:
+        web_socket = FakeWebSocket(buffered=10 ** 9)
+        self.assertTrue(await FlowControl().send_to_client(web_socket, "message"))
+        self.assertEqual(["message"], web_socket.sent)
+
+    async def test_drop_above_high_watermark(self) -> None:
+        flow_control = FlowControl(client_limits=LegLimits(write_high_watermark=100), policy="DROP")
+
+        self.assertTrue(await flow_control.send_to_client(FakeWebSocket(buffered=99), "message"))
+        self.assertFalse(await flow_control.send_to_client(FakeWebSocket(buffered=100), "message"))
+        self.assertEqual(1, flow_control.get_stats()['droppedMessages'])
+
+    async def test_dropped_fragmented_message_is_read_to_the_end(self) -> None:
+        flow_control = FlowControl(client_limits=LegLimits(write_high_watermark=100), policy="DROP")
+        remaining = ["c", "d"]
+
+        async def fragments():
+            while remaining:
+                yield remaining.pop(0)
+
+        message = FragmentedMessage(["a", "b"], fragments())
+        self.assertFalse(await flow_control.send_to_client(FakeWebSocket(buffered=100), message))
+        self.assertEqual([], remaining)
+
+    async def test_disconnect_above_high_watermark(self) -> None:
+        flow_control = FlowControl(proxied_limits=LegLimits(write_high_watermark=100), policy="DISCONNECT")
+
+        with self.assertRaises(BackpressureExceeded):
+            await flow_control.send_to_proxied(FakeWebSocket(buffered=500), "message")
+        self.assertEqual(1, flow_control.get_stats()['backpressureDisconnects'])
+
+    def test_invalid_policy(self) -> None:
+        with self.assertRaises(ValueError):
+            FlowControl(policy="IGNORE")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import unittest
+from websocket_proxpy.proxy import PROXIED_CONNECTION_OPEN, WebSocketProxpy, WebSocketConnection
+from websocket_proxpy.util.jsonutils import StatusResponses, get_json_status_response
+from websocket_proxpy.util.loggers import ConsoleDebugLogger
+
+
+class GetJsonStatusResponseTests(unittest.TestCase):
+
+    def test_fields_are_merged(self) -> None:
+        self.assertEqual({'status': "ok", 'message': "hi", 'token': "abc"},
+                         json.loads(get_json_status_response("ok", "hi", {'token': "abc"})))
+
+
+class StatusResponsesTests(unittest.TestCase):
+
+    def test_pinned_responses_are_rendered_once(self) -> None:
+        status_responses = StatusResponses()
+        status_responses.pin("ok", "Proxied connection [{}] open.", "ws://localhost:8081")
+
+        response = status_responses.format("ok", "Proxied connection [{}] open.", "ws://localhost:8081")
+        self.assertEqual({'status': "ok", 'message': "Proxied connection [ws://localhost:8081] open."},
+                         json.loads(response))
+        self.assertIs(response, status_responses.format("ok", "Proxied connection [{}] open.", "ws://localhost:8081"))
+        self.assertEqual(0, status_responses.get_stats()['statusResponseMisses'])
+
+    def test_parametrized_responses_are_cached_with_eviction(self) -> None:
+        status_responses = StatusResponses(max_size=2)
+
+        first = status_responses.format("error", "Unable to connect [{}]", "ws://a")
+        self.assertIs(first, status_responses.format("error", "Unable to connect [{}]", "ws://a"))
+        status_responses.format("error", "Unable to connect [{}]", "ws://b")
+        status_responses.format("error", "Unable to connect [{}]", "ws://c")
+        self.assertEqual([("ws://b",), ("ws://c",)], [args for _, _, args in status_responses.cache])
+        self.assertEqual({'statusResponsesCached': 2, 'statusResponseHits': 1, 'statusResponseMisses': 3},
+                         status_responses.get_stats())
+
+    def test_pre_encoded(self) -> None:
+        status_responses = StatusResponses(pre_encoded=True)
+        self.assertEqual(b'{"status": "error", "message": "WSS not yet supported"}',
+                         status_responses.format("error", "WSS not yet supported"))
+
+    def test_proxy_responses_have_no_stray_quotes(self) -> None:
+        proxpy = WebSocketProxpy(ConsoleDebugLogger('websocket_proxy'))
+        proxpy.serverType = "FORCED_URL"
+        proxpy.proxied_url = "ws://localhost:8081"
+        proxpy.pin_status_responses()
+
+        self.assertEqual("Authenticated Authenticated. Socket open for arbitrary proxy requests.",
+                         json.loads(proxpy.get_authenticated_response(WebSocketConnection()))['message'])
+        self.assertEqual("Proxied connection [ws://localhost:8081] open for arbitrary requests.",
+                         json.loads(proxpy.status_responses.format("ok", PROXIED_CONNECTION_OPEN,
+                                                                   "ws://localhost:8081"))['message'])
+        self.assertEqual(0, proxpy.status_responses.get_stats()['statusResponseMisses'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
+import os
+import tempfile
 import unittest
 import logging
 from unittest.mock import patch
-from websocket_proxpy.util.loggers import ConsoleDebugLogger
+from websocket_proxpy.util.loggers import ConsoleDebugLogger, PayloadFormatter, create_logger_from_yaml
 
 
 class TestConsoleDebugLogger(unittest.TestCase):
@@ -30,6 +32,53 @@ class TestConsoleDebugLogger(unittest.TestCase):
 
         mock_logger.debug.assert_called_once_with("WebSocketProxy: %s", message)
 
+    @patch('logging.getLogger')
+    def test_operational_messages_use_their_level(self, mock_get_logger):
+        mock_logger = mock_get_logger.return_value
+        logger_instance = ConsoleDebugLogger("test_logger", level=logging.INFO)
+
+        logger_instance.info("Started")
+        logger_instance.warning("Worker [%s] exited", 1)
+        logger_instance.error("Unable to connect")
+
+        mock_logger.info.assert_called_once_with("WebSocketProxy: %s", "Started")
+        mock_logger.warning.assert_called_once_with("WebSocketProxy: Worker [%s] exited", 1)
+        mock_logger.error.assert_called_once_with("WebSocketProxy: %s", "Unable to connect")
+        mock_logger.debug.assert_not_called()
+
+    @patch('logging.getLogger')
+    def test_log_payload_skipped_when_level_disabled(self, mock_get_logger):
+        mock_logger = mock_get_logger.return_value
+        mock_logger.isEnabledFor.return_value = False
+
+        ConsoleDebugLogger("test_logger", level=logging.INFO).log_payload("Received", "payload")
+
+        mock_logger.setLevel.assert_called_once_with(logging.INFO)
+        mock_logger.debug.assert_not_called()
+
+    def test_payload_formatter_truncates(self):
+        self.assertEqual("abc... <6 chars>", str(PayloadFormatter("abcdef", 3, False)))
+        self.assertEqual("abc", str(PayloadFormatter("abc", 3, False)))
+        self.assertEqual("abcdef", str(PayloadFormatter("abcdef", None, False)))
+
+    def test_payload_formatter_redacts(self):
+        self.assertEqual("<redacted 6 chars>", str(PayloadFormatter("secret", None, True)))
+        self.assertEqual("<redacted 2 bytes>", str(PayloadFormatter(b"\x00\x01", 1, True)))
+
+    def test_non_blocking_file_logging(self):
+        with tempfile.TemporaryDirectory() as log_directory:
+            log_file = os.path.join(log_directory, "proxpy.log")
+            config = {'configuration': {'loggingConfiguration': {
+                'level': "debug", 'maxPayloadLength': 4, 'nonBlocking': True, 'file': log_file}}}
+            logger_instance = create_logger_from_yaml("test_file_logger", config)
+            logger_instance.log_payload("Received", "0123456789")
+            logger_instance.close()
+            for handler in list(logger_instance.logger.handlers):
+                logger_instance.logger.removeHandler(handler)
+
+            with open(log_file) as log_contents:
+                self.assertIn("WebSocketProxy: Received [0123... <10 chars>]", log_contents.read())
+
 
 if __name__ == '__main__':
     unittest.main()
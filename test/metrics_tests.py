@@ -0,0 +1,78 @@
+import asyncio
+import unittest
+from websocket_proxpy.metrics import Counter, Histogram, MetricsRegistry, MetricsServer, ProxyMetrics
+
+
+class MetricsTests(unittest.TestCase):
+
+    def test_histogram_observe(self) -> None:
+        histogram = Histogram((0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(5.0)
+
+        self.assertEqual([2, 0, 1], histogram.counts)
+        self.assertEqual(3, histogram.count)
+        self.assertAlmostEqual(5.15, histogram.sum)
+
+    def test_render(self) -> None:
+        counter = Counter()
+        counter.inc(3)
+        histogram = Histogram((0.1, 1.0))
+        histogram.observe(0.5)
+
+        registry = MetricsRegistry()
+        registry.register("test_total", "counter", "A counter.", [({'direction': "in"}, counter)])
+        registry.register("test_seconds", "histogram", "A histogram.", [({}, histogram)])
+
+        self.assertEqual("\n".join([
+            "# HELP test_total A counter.",
+            "# TYPE test_total counter",
+            'test_total{direction="in"} 3',
+            "# HELP test_seconds A histogram.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{le="0.1"} 0',
+            'test_seconds_bucket{le="1.0"} 1',
+            'test_seconds_bucket{le="+Inf"} 1',
+            "test_seconds_sum 0.5",
+            "test_seconds_count 1",
+        ]) + "\n", registry.render())
+
+    def test_proxy_metrics_gauge_reads_callback(self) -> None:
+        self.assertIn("proxpy_active_sessions 7", ProxyMetrics(lambda: 7).render())
+
+    def test_proxy_metrics_buffered_bytes(self) -> None:
+        buffered = {'clientBufferedBytes': 30, 'clientBufferedBytesMax': 20, 'proxiedBufferedBytes': 5,
+                    'proxiedBufferedBytesMax': 5}
+        rendered = ProxyMetrics(lambda: 0, lambda: buffered).render()
+        self.assertIn('proxpy_buffered_bytes{leg="client"} 30', rendered)
+        self.assertIn('proxpy_buffered_bytes_max{leg="proxied"} 5', rendered)
+
+
+class MetricsServerTests(unittest.IsolatedAsyncioTestCase):
+
+    async def fetch(self, port: int, path: str) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def test_serves_metrics(self) -> None:
+        metrics = ProxyMetrics(lambda: 0)
+        metrics.connections.inc()
+        server = MetricsServer(metrics, "127.0.0.1", 0)
+        await server.start()
+        port = server.server.sockets[0].getsockname()[1]
+
+        try:
+            response = await self.fetch(port, "/metrics")
+            self.assertTrue(response.startswith(b"HTTP/1.0 200 OK"))
+            self.assertIn(b"proxpy_connections_total 1", response)
+            self.assertTrue((await self.fetch(port, "/other")).startswith(b"HTTP/1.0 404"))
+        finally:
+            await server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import asyncio
+import unittest
+import websockets.exceptions
+from websocket_proxpy.multiplexer import ChannelEnvelope, UpstreamMultiplexer
+
+
+class FakeUpstreamWebSocket:
+    """Echo upstream that keeps the channel envelope on its replies."""
+
+    def __init__(self) -> None:
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    async def send(self, message) -> None:
+        self.sent.append(message)
+        self.incoming.put_nowait(message)
+
+    async def close(self) -> None:
+        self.incoming.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+class ChannelEnvelopeTests(unittest.TestCase):
+
+    def test_wrap_and_unwrap(self) -> None:
+        envelope = ChannelEnvelope("{\"channel\": {channel}, \"payload\": ", "}")
+        wrapped = envelope.wrap(12, "\"hello\"")
+
+        self.assertEqual("{\"channel\": 12, \"payload\": \"hello\"}", wrapped)
+        self.assertEqual((12, "\"hello\""), envelope.unwrap(wrapped))
+        self.assertEqual((3, b"\x00\x01"), envelope.unwrap(envelope.wrap(3, b"\x00\x01")))
+
+    def test_unwrap_rejects_foreign_messages(self) -> None:
+        envelope = ChannelEnvelope()
+        self.assertIsNone(envelope.unwrap("no channel"))
+        self.assertIsNone(envelope.unwrap("abc:payload"))
+
+    def test_invalid_templates(self) -> None:
+        with self.assertRaises(ValueError):
+            ChannelEnvelope("no placeholder")
+        with self.assertRaises(ValueError):
+            ChannelEnvelope("prefix{channel}")
+
+
+class UpstreamMultiplexerTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.connects = []
+
+    async def connect(self, url: str) -> FakeUpstreamWebSocket:
+        web_socket = FakeUpstreamWebSocket()
+        self.connects.append(web_socket)
+        return web_socket
+
+    async def test_channels_share_one_upstream_and_get_their_own_replies(self) -> None:
+        multiplexer = UpstreamMultiplexer(self.connect, ChannelEnvelope())
+        first, second = await asyncio.gather(multiplexer.open_channel("ws://upstream"),
+                                             multiplexer.open_channel("ws://upstream"))
+
+        await second.send("for second")
+        await first.send("for first")
+
+        self.assertEqual("for first", await first.recv())
+        self.assertEqual("for second", await second.recv())
+        self.assertEqual(1, len(self.connects))
+        self.assertEqual({'destinations': 1, 'upstreams': 1, 'channels': 2, 'unroutableMessages': 0,
+                          'channelOverflows': 0, 'idleClosed': 0}, multiplexer.get_stats())
+        await multiplexer.close()
+
+    async def test_upstream_close_fails_channels(self) -> None:
+        multiplexer = UpstreamMultiplexer(self.connect, ChannelEnvelope())
+        channel = await multiplexer.open_channel("ws://upstream")
+
+        await self.connects[0].close()
+        with self.assertRaises(websockets.exceptions.ConnectionClosedOK):
+            await channel.recv()
+        self.assertEqual(0, multiplexer.get_stats()['upstreams'])
+
+    async def test_overflowing_channel_is_dropped(self) -> None:
+        multiplexer = UpstreamMultiplexer(self.connect, ChannelEnvelope(), channel_queue_size=1)
+        slow, other = await multiplexer.open_channel("ws://upstream"), await multiplexer.open_channel("ws://upstream")
+
+        await slow.send("one")
+        await slow.send("two")
+        await other.send("still routed")
+
+        self.assertEqual("still routed", await other.recv())
+        self.assertEqual("one", await slow.recv())
+        with self.assertRaises(websockets.exceptions.ConnectionClosedError):
+            await slow.recv()
+        self.assertEqual(1, multiplexer.get_stats()['channelOverflows'])
+        await multiplexer.close()
+
+    async def test_additional_upstream_when_channels_exhausted(self) -> None:
+        multiplexer = UpstreamMultiplexer(self.connect, ChannelEnvelope(), max_upstreams_per_url=2,
+                                          max_channels_per_upstream=1)
+        for _ in range(3):
+            await multiplexer.open_channel("ws://upstream")
+
+        self.assertEqual(2, len(self.connects))
+        await multiplexer.close()
+
+    async def test_upstream_without_channels_is_closed(self) -> None:
+        multiplexer = UpstreamMultiplexer(self.connect, ChannelEnvelope(), idle_timeout=0)
+        first = await multiplexer.open_channel("ws://first")
+        second = await multiplexer.open_channel("ws://second")
+
+        await first.close()
+        await asyncio.sleep(0)
+        self.assertEqual({'destinations': 1, 'upstreams': 1, 'channels': 1, 'unroutableMessages': 0,
+                          'channelOverflows': 0, 'idleClosed': 1}, multiplexer.get_stats())
+        with self.assertRaises(StopAsyncIteration):
+            await self.connects[0].__anext__()
+
+        await second.close()
+        await multiplexer.close()
+        self.assertEqual(0, multiplexer.get_stats()['upstreams'])
+
+    async def test_idle_upstream_is_reused_within_grace_period(self) -> None:
+        multiplexer = UpstreamMultiplexer(self.connect, ChannelEnvelope(), idle_timeout=0.05)
+        await (await multiplexer.open_channel("ws://upstream")).close()
+        channel = await multiplexer.open_channel("ws://upstream")
+
+        await asyncio.sleep(0.1)
+        await channel.send("still open")
+        self.assertEqual("still open", await channel.recv())
+        self.assertEqual(1, len(self.connects))
+
+        await channel.close()
+        await asyncio.sleep(0.1)
+        self.assertEqual(0, multiplexer.get_stats()['upstreams'])
+        self.assertEqual(1, multiplexer.get_stats()['idleClosed'])
+        await multiplexer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
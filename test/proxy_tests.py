@@ -1,7 +1,12 @@
+import asyncio
 import unittest
 import yaml
+from websocket_proxpy.flow_control import FlowControl, LegLimits
 from websocket_proxpy.proxy import WebSocketProxpy, WebSocketConnection
+from websocket_proxpy.rate_limits import RateLimit, RateLimiter
+from websocket_proxpy.upstream_pool import UpstreamPool, UpstreamResponseTimeout
 from websocket_proxpy.util.loggers import ConsoleDebugLogger
+from fakes import FakeWebSocket
 
 
 class WebSocketProxpyTests(unittest.TestCase):
@@ -76,6 +81,8 @@ class WebSocketProxpyTests(unittest.TestCase):
         self.assertIsNone(proxpy.parse_destination_url("{\"yo\": \"hey\"}"))
         self.assertEqual("blah", proxpy.parse_destination_url("{\"url\": \"blah\"}"))
         self.assertIsNone(proxpy.parse_destination_url("*\"url\": \"blah\"}"))
+        self.assertIsNone(proxpy.parse_destination_url("[\"url\"]"))
+        self.assertIsNone(proxpy.parse_destination_url("{\"url\": 5}"))
 
     # has valid server type tests
     def test_has_valid_server_type(self) -> None:
@@ -137,5 +144,116 @@ class WebSocketProxpyTests(unittest.TestCase):
         self.assertTrue(self.web_socket_proxpy.is_open_url_server())
 
 
+class WebSocketProxpyFullDuplexTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.web_socket_proxpy = WebSocketProxpy(ConsoleDebugLogger('websocket_proxy'))
+        self.web_socket_proxpy.forwarding_mode = "FULL_DUPLEX"
+        self.client = FakeWebSocket()
+        self.proxied = FakeWebSocket()
+
+    async def test_unsolicited_upstream_frames_reach_client(self) -> None:
+        session = asyncio.ensure_future(
+            self.web_socket_proxpy.process_requests(self.client, self.proxied, WebSocketConnection()))
+
+        self.proxied.incoming.put_nowait("push 1")
+        self.proxied.incoming.put_nowait("push 2")
+        self.client.incoming.put_nowait("request")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.client.incoming.put_nowait("{\"action\": \"close\"}")
+        await asyncio.wait_for(session, 1)
+
+        self.assertEqual(["push 1", "push 2"], self.client.sent)
+        self.assertEqual(["request"], self.proxied.sent)
+        self.assertTrue(self.proxied.closed)
+
+        metrics = self.web_socket_proxpy.metrics
+        self.assertEqual(1, metrics.messages_client_to_proxied.value)
+        self.assertEqual(2, metrics.messages_proxied_to_client.value)
+        self.assertEqual(len("push 1push 2"), metrics.bytes_proxied_to_client.value)
+        self.assertEqual(3, metrics.message_latency.count)
+
+    async def test_upstream_close_ends_session(self) -> None:
+        session = asyncio.ensure_future(
+            self.web_socket_proxpy.process_requests(self.client, self.proxied, WebSocketConnection()))
+
+        self.proxied.incoming.put_nowait("last words")
+        self.proxied.incoming.put_nowait(None)
+        await asyncio.wait_for(session, 1)
+
+        self.assertEqual("last words", self.client.sent[0])
+        self.assertIn("Proxied connection closed.", self.client.sent[1])
+
+    async def test_request_limit_stops_forwarding(self) -> None:
+        self.web_socket_proxpy.requests_per_connection = 1
+        self.client.incoming.put_nowait("one")
+        self.client.incoming.put_nowait("two")
+        await asyncio.wait_for(
+            self.web_socket_proxpy.process_requests(self.client, self.proxied, WebSocketConnection()), 1)
+
+        self.assertEqual(["one"], self.proxied.sent)
+        self.assertIn("error", self.client.sent[-1])
+
+
+class WebSocketProxpyRequestResponseTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.web_socket_proxpy = WebSocketProxpy(ConsoleDebugLogger('websocket_proxy'))
+        self.client = FakeWebSocket()
+        self.proxied = FakeWebSocket()
+
+    async def test_flow_control_applies_to_proxied_leg(self) -> None:
+        self.web_socket_proxpy.flow_control = FlowControl(proxied_limits=LegLimits(write_high_watermark=0),
+                                                          policy="DROP")
+        for message in ("one", None):
+            self.client.incoming.put_nowait(message)
+        await asyncio.wait_for(
+            self.web_socket_proxpy.process_requests(self.client, self.proxied, WebSocketConnection()), 1)
+
+        self.assertEqual([], self.proxied.sent)
+        self.assertIn("request dropped", self.client.sent[-1])
+        self.assertEqual(1, self.web_socket_proxpy.get_stats()['droppedMessages'])
+
+    async def test_shared_upstream_without_reply_times_out(self) -> None:
+        async def connect(url: str) -> FakeWebSocket:
+            return self.proxied
+
+        self.web_socket_proxpy.upstream_pool = UpstreamPool("ws://upstream", connect, min_size=0, shared=True,
+                                                            response_timeout=0.01)
+        connection = WebSocketConnection()
+        connection.upstream_lease = await self.web_socket_proxpy.upstream_pool.acquire()
+        connection.upstream_lock = connection.upstream_lease.lock
+        self.client.incoming.put_nowait("unanswered")
+
+        with self.assertRaises(UpstreamResponseTimeout):
+            await asyncio.wait_for(self.web_socket_proxpy.process_requests(self.client, self.proxied, connection), 1)
+        self.assertTrue(self.proxied.closed)
+
+    async def test_rate_limited_message_is_not_forwarded(self) -> None:
+        self.web_socket_proxpy.rate_limiter = RateLimiter(RateLimit(messages_per_second=1), max_delay=0)
+        self.proxied.incoming.put_nowait("reply")
+        for message in ("one", "two", None):
+            self.client.incoming.put_nowait(message)
+        await asyncio.wait_for(
+            self.web_socket_proxpy.process_requests(self.client, self.proxied, WebSocketConnection()), 1)
+
+        self.assertEqual(["one"], self.proxied.sent)
+        self.assertEqual("reply", self.client.sent[0])
+        self.assertIn("Rate limit exceeded", self.client.sent[-1])
+
+
+class WebSocketProxpySessionsTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.web_socket_proxpy = WebSocketProxpy(ConsoleDebugLogger('websocket_proxy'))
+        self.client = FakeWebSocket()
+
+    def test_describe_sessions_includes_buffered_bytes(self) -> None:
+        self.web_socket_proxpy.sessions.open(self.client)
+        description = self.web_socket_proxpy.describe_sessions()[0]
+        self.assertEqual((0, 0), (description['clientBufferedBytes'], description['proxiedBufferedBytes']))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+import unittest
+from websocket_proxpy.rate_limits import ConnectionLimiter, RateLimit, RateLimiter, TokenBucket
+from websocket_proxpy.sessions import WebSocketConnection
+from fakes import FakeClock
+
+
+class TokenBucketTests(unittest.TestCase):
+
+    def test_refills_at_rate_up_to_burst(self) -> None:
+        bucket = TokenBucket(10, 2, 0.0)
+        self.assertEqual(0.0, bucket.get_delay(2, 0.0))
+        bucket.tokens -= 2
+        self.assertAlmostEqual(0.1, bucket.get_delay(1, 0.0))
+        self.assertEqual(0.0, bucket.get_delay(1, 100.0))
+        self.assertEqual(2, bucket.tokens)
+
+    def test_message_over_burst_passes_when_full(self) -> None:
+        bucket = TokenBucket(100, 100, 0.0)
+        self.assertEqual(0.0, bucket.get_delay(1000, 0.0))
+        bucket.tokens -= 1000
+        self.assertAlmostEqual(9.01, bucket.get_delay(1, 0.0))
+
+
+class RateLimiterTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+
+    def open_session(self, ip: str = "10.0.0.1") -> WebSocketConnection:
+        return WebSocketConnection(client_address=(ip, 50000))
+
+    def test_session_messages_are_delayed_then_rejected(self) -> None:
+        limiter = RateLimiter(session_limit=RateLimit(messages_per_second=10, message_burst=1), max_delay=0.15,
+                              clock=self.clock)
+        connection = self.open_session()
+
+        self.assertEqual(0.0, limiter.acquire(connection, 10))
+        self.assertAlmostEqual(0.1, limiter.acquire(connection, 10))
+        self.assertIsNone(limiter.acquire(connection, 10))
+        self.assertEqual(0.0, limiter.acquire(self.open_session(), 10))
+
+        self.clock.now += 1
+        self.assertEqual(0.0, limiter.acquire(connection, 10))
+        self.assertEqual({'rateLimitDelayed': 1, 'rateLimitRejected': 1, 'rateLimitTrackedIps': 0,
+                          'rateLimitEvictedIps': 0}, limiter.get_stats())
+
+    def test_bytes_are_shared_per_ip(self) -> None:
+        limiter = RateLimiter(ip_limit=RateLimit(bytes_per_second=100), max_delay=0, clock=self.clock)
+
+        self.assertEqual(0.0, limiter.acquire(self.open_session(), 100))
+        self.assertIsNone(limiter.acquire(self.open_session(), 1))
+        self.assertEqual(0.0, limiter.acquire(self.open_session("10.0.0.2"), 1))
+
+    def test_ip_table_is_bounded(self) -> None:
+        limiter = RateLimiter(ip_limit=RateLimit(messages_per_second=1), max_tracked_ips=2, max_delay=0,
+                              clock=self.clock)
+        for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.1", "10.0.0.3"):
+            limiter.acquire(self.open_session(ip), 1)
+
+        self.assertEqual(["10.0.0.1", "10.0.0.3"], list(limiter.ip_buckets))
+        self.assertEqual(1, limiter.get_stats()['rateLimitEvictedIps'])
+
+    def test_global_limit_delays_in_arrival_order(self) -> None:
+        limiter = RateLimiter(global_limit=RateLimit(messages_per_second=10, message_burst=1), max_delay=1,
+                              clock=self.clock)
+        delays = [limiter.acquire(self.open_session(f"10.0.0.{index}"), 1) for index in range(4)]
+        for expected, delay in zip([0.0, 0.1, 0.2, 0.3], delays):
+            self.assertAlmostEqual(expected, delay)
+
+    def test_unrejectable_messages_are_capped_at_max_delay(self) -> None:
+        limiter = RateLimiter(session_limit=RateLimit(messages_per_second=1), max_delay=0.5, clock=self.clock)
+        connection = self.open_session()
+        limiter.acquire(connection, 0)
+
+        self.assertEqual(0.5, limiter.acquire(connection, 0, may_reject=False))
+        limiter.charge(connection, 100)
+        self.assertEqual(0, limiter.get_stats()['rateLimitRejected'])
+
+    def test_negative_limits_are_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            RateLimit.from_yaml({'messagesPerSecond': -1})
+        self.assertFalse(RateLimit.from_yaml(None).is_enabled())
+        self.assertEqual(RateLimit(5, 1000, 10, 0),
+                         RateLimit.from_yaml({'messagesPerSecond': 5, 'bytesPerSecond': 1000, 'messageBurst': 10}))
+
+
+class ConnectionLimiterTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_disabled_limiter_admits_everyone(self) -> None:
+        limiter = ConnectionLimiter()
+        self.assertTrue(all([await limiter.acquire() for _ in range(100)]))
+        self.assertFalse(limiter.is_saturated())
+
+    async def test_waiters_get_freed_slots_in_order(self) -> None:
+        limiter = ConnectionLimiter(max_connections=1, max_pending=2, queue_timeout=1)
+        self.assertTrue(await limiter.acquire())
+
+        first = asyncio.ensure_future(limiter.acquire())
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        self.assertTrue(limiter.is_saturated())
+        self.assertFalse(await limiter.acquire())
+
+        limiter.release()
+        self.assertTrue(await first)
+        self.assertFalse(second.done())
+        limiter.release()
+        self.assertTrue(await second)
+        limiter.release()
+
+        self.assertEqual(0, limiter.active)
+        self.assertEqual({'connectionsQueued': 2, 'connectionsWaiting': 0, 'connectionsRejected': 1},
+                         limiter.get_stats())
+
+    async def test_waiter_times_out(self) -> None:
+        limiter = ConnectionLimiter(max_connections=1, max_pending=1, queue_timeout=0.01)
+        self.assertTrue(await limiter.acquire())
+        self.assertFalse(await limiter.acquire())
+
+        # the slot isn't handed to the waiter that gave up
+        limiter.release()
+        self.assertEqual(0, limiter.active)
+        self.assertTrue(await limiter.acquire())
+
+
+if __name__ == '__main__':
+    unittest.main()
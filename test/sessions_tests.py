@@ -0,0 +1,51 @@
+import struct
+import unittest
+from websocket_proxpy.sessions import SessionRegistry, WebSocketConnection
+from fakes import FakeWebSocket
+
+
+class WebSocketConnectionTests(unittest.TestCase):
+
+    def test_session_is_slotted(self) -> None:
+        connection = WebSocketConnection()
+        self.assertFalse(hasattr(connection, '__dict__'))
+        with self.assertRaises(AttributeError):
+            connection.unexpected_attribute = 1
+
+    def test_session_memory_footprint(self) -> None:
+        # one pointer per declared slot on top of the bare object, and no __dict__ or __weakref__ slot
+        self.assertNotIn('__dict__', WebSocketConnection.__slots__)
+        self.assertNotIn('__weakref__', WebSocketConnection.__slots__)
+        self.assertEqual(object.__basicsize__ + len(WebSocketConnection.__slots__) * struct.calcsize("P"),
+                         WebSocketConnection.__basicsize__)
+
+
+class SessionRegistryTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_open_lookup_close(self) -> None:
+        registry = SessionRegistry()
+        first = registry.open(FakeWebSocket())
+        second = registry.open(FakeWebSocket())
+
+        self.assertEqual(2, len(registry))
+        self.assertIs(first, registry.get(first.session_id))
+        self.assertEqual(("127.0.0.1", 50000), second.client_address)
+        self.assertEqual([first, second], list(registry))
+
+        registry.close(first)
+        self.assertIsNone(registry.get(first.session_id))
+        self.assertEqual(1, len(registry))
+
+    async def test_close_all(self) -> None:
+        registry = SessionRegistry()
+        connection = registry.open(FakeWebSocket())
+        connection.proxied_web_socket = FakeWebSocket()
+
+        await registry.close_all()
+
+        self.assertEqual(1001, connection.proxy_web_socket.close_code)
+        self.assertEqual(1001, connection.proxied_web_socket.close_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from websocket_proxpy.sessions import SessionRegistry
+from websocket_proxpy.timeouts import SessionTimers
+from websocket_proxpy.util.loggers import ConsoleDebugLogger
+from fakes import FakeClock, FakeWebSocket
+
+
+class SessionTimersTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.sessions = SessionRegistry()
+
+    def create_timers(self, **kwargs) -> SessionTimers:
+        settings = {'handshake_timeout': 0, 'idle_timeout': 0, 'max_lifetime': 0, 'ping_interval': 0}
+        settings.update(kwargs)
+        return SessionTimers(self.sessions, ConsoleDebugLogger('websocket_proxy'), clock=self.clock, **settings)
+
+    def open_session(self, timers: SessionTimers, established: bool = True):
+        connection = self.sessions.open(FakeWebSocket())
+        connection.connected_at = connection.last_activity_at = self.clock.now
+        timers.track(connection)
+        if established:
+            connection.proxied_web_socket = FakeWebSocket()
+            timers.track(connection)
+        return connection
+
+    async def advance(self, timers: SessionTimers, seconds: float) -> None:
+        self.clock.now += seconds
+        timers.expire_due(self.clock.now)
+        await asyncio.gather(*timers.pending)
+
+    async def test_handshake_timeout(self) -> None:
+        timers = self.create_timers(handshake_timeout=10)
+        waiting = self.open_session(timers, established=False)
+        established = self.open_session(timers)
+
+        await self.advance(timers, 10)
+
+        self.assertEqual(1000, waiting.proxy_web_socket.close_code)
+        self.assertIsNone(established.proxy_web_socket.close_code)
+        self.assertEqual(1, timers.get_stats()['handshakeTimeouts'])
+
+    async def test_idle_timeout_follows_activity(self) -> None:
+        timers = self.create_timers(idle_timeout=10)
+        connection = self.open_session(timers)
+
+        await self.advance(timers, 6)
+        connection.last_activity_at = self.clock.now
+        await self.advance(timers, 6)
+        self.assertIsNone(connection.proxy_web_socket.close_code)
+        self.assertEqual(1, len(timers.heap))
+
+        await self.advance(timers, 4)
+        self.assertEqual(1000, connection.proxy_web_socket.close_code)
+        self.assertEqual(1000, connection.proxied_web_socket.close_code)
+
+    async def test_max_lifetime(self) -> None:
+        timers = self.create_timers(max_lifetime=60, idle_timeout=30)
+        connection = self.open_session(timers)
+
+        for _ in range(5):
+            connection.last_activity_at = self.clock.now
+            await self.advance(timers, 12)
+        self.assertEqual(1000, connection.proxy_web_socket.close_code)
+        self.assertEqual(1, timers.get_stats()['lifetimeExpirations'])
+
+    async def test_keepalive_pings_both_legs(self) -> None:
+        timers = self.create_timers(ping_interval=20, ping_timeout=5)
+        connection = self.open_session(timers)
+
+        await self.advance(timers, 20)
+        self.assertEqual(1, len(connection.proxy_web_socket.pong_waiters))
+        self.assertEqual(1, len(connection.proxied_web_socket.pong_waiters))
+        connection.proxy_web_socket.pong_waiters[0].set_result(0.01)
+        connection.proxied_web_socket.pong_waiters[0].set_result(0.01)
+        await self.advance(timers, 5)
+        self.assertIsNone(connection.proxy_web_socket.close_code)
+
+        await self.advance(timers, 15)
+        connection.proxy_web_socket.pong_waiters[1].set_result(0.01)
+        await self.advance(timers, 5)
+        self.assertEqual(1011, connection.proxy_web_socket.close_code)
+        self.assertEqual(1, timers.get_stats()['keepaliveFailures'])
+
+    async def test_closed_sessions_leave_the_heap(self) -> None:
+        timers = self.create_timers(idle_timeout=10)
+        connection = self.open_session(timers)
+        self.sessions.close(connection)
+
+        await self.advance(timers, 10)
+        self.assertIsNone(connection.proxy_web_socket.close_code)
+        self.assertEqual([], timers.heap)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from websocket_proxpy.transport import FragmentedMessage, MessageWrapper, receive_message, send_message
+
+
+class FakeStreamingWebSocket:
+
+    def __init__(self, frames: list) -> None:
+        self.frames = frames
+        self.sent = []
+
+    def recv_streaming(self):
+        return self.iterate_frames()
+
+    async def iterate_frames(self):
+        for frame in self.frames:
+            yield frame
+
+    async def send(self, message) -> None:
+        if hasattr(message, '__aiter__'):
+            self.sent.append([fragment async for fragment in message])
+        else:
+            self.sent.append(message)
+
+
+class MessageWrapperTests(unittest.TestCase):
+
+    def test_empty_wrapper_returns_message_untouched(self) -> None:
+        message = b"\x00\x01\x02"
+        self.assertIs(message, MessageWrapper("", "").wrap(message))
+        self.assertIs(message, MessageWrapper(None, "suffix").wrap(message))
+
+    def test_wrap_text(self) -> None:
+        self.assertEqual("<hello>", MessageWrapper("<", ">").wrap("hello"))
+
+    def test_wrap_binary(self) -> None:
+        wrapper = MessageWrapper("<", ">")
+        self.assertEqual(b"<\x00\xff>", wrapper.wrap(b"\x00\xff"))
+        self.assertEqual(b"<ab>", wrapper.wrap(memoryview(bytearray(b"ab"))))
+
+
+class TransportTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_receive_single_frame_message(self) -> None:
+        self.assertEqual(b"frame", await receive_message(FakeStreamingWebSocket([b"frame"])))
+
+    async def test_fragmented_message_is_forwarded_frame_by_frame(self) -> None:
+        source = FakeStreamingWebSocket([b"one", b"two", b"three"])
+        destination = FakeStreamingWebSocket([])
+
+        message = await receive_message(source)
+        self.assertIsInstance(message, FragmentedMessage)
+        await send_message(destination, MessageWrapper("<", ">").wrap(message))
+
+        self.assertEqual([[b"<", b"one", b"two", b"three", b">"]], destination.sent)
+
+    async def test_fragmented_text_message_without_wrapper(self) -> None:
+        destination = FakeStreamingWebSocket([])
+        await send_message(destination, await receive_message(FakeStreamingWebSocket(["a", "b"])))
+        self.assertEqual([["a", "b"]], destination.sent)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import asyncio
+import enum
+import unittest
+import websockets.exceptions
+from websocket_proxpy.upstream_pool import UpstreamPool, UpstreamResponseTimeout, is_socket_open
+
+
+class FakeState(enum.Enum):
+    OPEN = 1
+    CLOSED = 3
+
+
+class FakeUpstreamSocket:
+
+    def __init__(self) -> None:
+        self.state = FakeState.OPEN
+        self.responds_to_ping = True
+
+    async def ping(self):
+        pong_waiter = asyncio.get_running_loop().create_future()
+        if self.responds_to_ping:
+            pong_waiter.set_result(None)
+        return pong_waiter
+
+    async def close(self) -> None:
+        self.state = FakeState.CLOSED
+
+
+class UpstreamPoolTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.connects = []
+
+    async def connect(self, url: str) -> FakeUpstreamSocket:
+        socket = FakeUpstreamSocket()
+        self.connects.append(socket)
+        return socket
+
+    def create_pool(self, **kwargs) -> UpstreamPool:
+        return UpstreamPool("ws://localhost:9001", self.connect, **kwargs)
+
+    async def test_start_pre_warms_min_size(self) -> None:
+        pool = self.create_pool(min_size=2, max_size=4)
+        await pool.start()
+
+        self.assertEqual(2, len(self.connects))
+        lease = await pool.acquire()
+        self.assertIs(self.connects[-1], lease.socket)
+        self.assertEqual(1, pool.get_stats()['hits'])
+        await pool.close()
+
+    async def test_released_upstream_is_closed_and_replaced(self) -> None:
+        pool = self.create_pool(min_size=1, max_size=2)
+        await pool.start()
+        lease = await pool.acquire()
+        await pool.release(lease)
+        await pool.refill_task
+
+        # frames left on the old upstream must never reach the next client
+        self.assertEqual(FakeState.CLOSED, lease.socket.state)
+        self.assertIsNot(lease, await pool.acquire())
+        stats = pool.get_stats()
+        self.assertEqual(2, stats['hits'])
+        self.assertEqual(1, stats['retired'])
+        self.assertEqual(2, len(self.connects))
+        await pool.close()
+
+    async def test_closed_upstream_is_evicted_on_release(self) -> None:
+        pool = self.create_pool(min_size=0, max_size=2)
+        lease = await pool.acquire()
+        await lease.socket.close()
+        await pool.release(lease)
+
+        self.assertIsNot(lease, await pool.acquire())
+        self.assertEqual(1, pool.get_stats()['evictions'])
+
+    async def test_acquire_waits_for_capacity(self) -> None:
+        pool = self.create_pool(min_size=0, max_size=1, acquire_timeout=1)
+        lease = await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+
+        await pool.release(lease)
+        self.assertIsNot(lease, await waiter)
+        self.assertEqual(1, pool.get_stats()['waits'])
+
+    async def test_acquire_times_out_when_exhausted(self) -> None:
+        pool = self.create_pool(min_size=0, max_size=1, acquire_timeout=0.01)
+        await pool.acquire()
+        with self.assertRaises(asyncio.TimeoutError):
+            await pool.acquire()
+
+    async def test_health_check_evicts_unresponsive_upstreams(self) -> None:
+        pool = self.create_pool(min_size=1, max_size=2, ping_timeout=0.01)
+        await pool.fill_to_min_size()
+        self.connects[0].responds_to_ping = False
+
+        await pool.evict_idle_and_broken()
+        await pool.fill_to_min_size()
+
+        self.assertEqual(1, pool.get_stats()['evictions'])
+        self.assertIs(self.connects[1], (await pool.acquire()).socket)
+
+    async def test_shared_mode_multiplexes_up_to_max_size(self) -> None:
+        pool = self.create_pool(min_size=0, max_size=2, shared=True)
+        leases = [await pool.acquire() for _ in range(5)]
+
+        self.assertEqual(2, len(self.connects))
+        self.assertEqual(5, pool.get_stats()['leases'])
+        for lease in leases:
+            await pool.release(lease)
+        self.assertEqual(2, pool.get_stats()['idle'])
+
+    async def test_concurrent_shared_acquires_stay_within_max_size(self) -> None:
+        pool = self.create_pool(min_size=0, max_size=2, shared=True)
+        leases = await asyncio.gather(*(pool.acquire() for _ in range(5)))
+
+        self.assertEqual(2, len(self.connects))
+        self.assertEqual(2, len({id(lease) for lease in leases}))
+
+    async def test_unanswered_round_trip_evicts_shared_upstream(self) -> None:
+        pool = self.create_pool(min_size=0, max_size=1, shared=True, response_timeout=0.01)
+        first, second = await pool.acquire(), await pool.acquire()
+
+        waiting = asyncio.ensure_future(pool.exchange(second, lambda: asyncio.sleep(0, "reply")))
+        with self.assertRaises(UpstreamResponseTimeout):
+            await pool.exchange(first, asyncio.Event().wait)
+
+        # the session queued behind the stuck one isn't blocked for good
+        self.assertEqual("reply", await waiting)
+        self.assertFalse(is_socket_open(first.socket))
+        self.assertEqual(0, pool.get_stats()['size'])
+        self.assertEqual(1, pool.get_stats()['responseTimeouts'])
+
+    async def test_rejected_handshake_stops_pre_warming(self) -> None:
+        async def reject(url: str):
+            raise websockets.exceptions.InvalidHandshake("rejected")
+
+        pool = UpstreamPool("ws://localhost:9001", reject, min_size=2, max_size=2)
+        await pool.start()
+        self.assertEqual(0, pool.get_stats()['size'])
+        self.assertEqual(1, pool.get_stats()['connectErrors'])
+        await pool.close()
+
+    def test_invalid_size_bounds(self) -> None:
+        with self.assertRaises(ValueError):
+            self.create_pool(min_size=3, max_size=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import time
+import unittest
+from websocket_proxpy.util.loggers import ConsoleDebugLogger
+from websocket_proxpy.workers import WorkerSupervisor, aggregate_stats, get_worker_count
+
+
+class RecordingLogger(ConsoleDebugLogger):
+
+    def __init__(self) -> None:
+        super().__init__('websocket_proxy')
+        self.messages = []
+
+    def emit(self, log_function, message: str, args: tuple) -> None:
+        self.messages.append((log_function.__name__, message))
+
+
+class WorkersTests(unittest.TestCase):
+
+    def test_get_worker_count(self) -> None:
+        self.assertEqual(1, get_worker_count(None))
+        self.assertEqual(1, get_worker_count({'configuration': {'serverConfiguration': {}}}))
+        self.assertEqual(1, get_worker_count({'configuration': {'serverConfiguration': {'workers': 0}}}))
+        self.assertEqual(4, get_worker_count({'configuration': {'serverConfiguration': {'workers': "4"}}}))
+
+    def test_aggregate_stats(self) -> None:
+        aggregated = aggregate_stats([
+            {'activeSessions': 2, 'totalSessions': 10,
+             'upstreamPool': {'url': "ws://a", 'hits': 3, 'hitRate': 0.5, 'waitTimeMax': 0.2}},
+            {'activeSessions': 1, 'totalSessions': 5,
+             'upstreamPool': {'url': "ws://a", 'hits': 4, 'hitRate': 0.9, 'waitTimeMax': 0.1}},
+        ])
+
+        self.assertEqual({'activeSessions': 3, 'totalSessions': 15,
+                          'upstreamPool': {'hits': 7, 'waitTimeMax': 0.2}}, aggregated)
+
+    def test_supervisor_logs_reported_worker_stats(self) -> None:
+        logger = RecordingLogger()
+        supervisor = WorkerSupervisor(2, None, logger)
+        supervisor.stats_interval = 0
+        supervisor.stats_queue.put((0, {'totalSessions': 2}))
+        supervisor.stats_queue.put((1, {'totalSessions': 3}))
+
+        deadline = time.monotonic() + 5
+        while len(supervisor.worker_stats) < 2 and time.monotonic() < deadline:
+            supervisor.drain_stats()
+            time.sleep(0.01)
+        supervisor.log_stats_if_due()
+
+        self.assertEqual(5, supervisor.get_stats()['totalSessions'])
+        level, message = logger.messages[-1]
+        self.assertEqual("info", level)
+        self.assertIn("'totalSessions': 5", message)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import abc
+import base64
+import collections
+import getpass
+import hashlib
+import hmac
+import importlib
+import secrets
+import threading
+import time
+from typing import Callable
+
+PBKDF2_SCHEME = "pbkdf2_sha256"
+DEFAULT_PBKDF2_ITERATIONS = 200000
+
+
+def hash_password(password: str, iterations: int = DEFAULT_PBKDF2_ITERATIONS, salt: bytes or None = None) -> str:
+    """Returns pbkdf2_sha256$<iterations>$<salt>$<hash>, the format accepted in authenticationConfiguration.users."""
+    salt = salt if salt is not None else secrets.token_bytes(16)
+    derived = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return "$".join((PBKDF2_SCHEME, str(iterations), base64.b64encode(salt).decode("ascii"),
+                     base64.b64encode(derived).decode("ascii")))
+
+
+def verify_password(password, stored: str) -> bool:
+    # every comparison goes through hmac.compare_digest so response time doesn't reveal how much of a secret matched
+    if not isinstance(password, str) or not isinstance(stored, str):
+        return False
+
+    if not stored.startswith(PBKDF2_SCHEME + "$"):
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+
+    try:
+        _, iterations, salt, expected = stored.split("$")
+        derived = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), base64.b64decode(salt), int(iterations))
+        return hmac.compare_digest(derived, base64.b64decode(expected))
+    except ValueError:
+        return False
+
+
+def create_dummy_password(stored_passwords) -> str:
+    """
+    A stored password no client can match, checked for unknown users so they take as long to reject as a wrong
+    password: hashed with the most PBKDF2 iterations among stored_passwords, or plain if none of them is hashed.
+    """
+    iterations = 0
+    for stored in stored_passwords:
+        if isinstance(stored, str) and stored.startswith(PBKDF2_SCHEME + "$"):
+            try:
+                iterations = max(iterations, int(stored.split("$")[1]))
+            except (IndexError, ValueError):
+                pass
+    if iterations > 0:
+        return hash_password(secrets.token_urlsafe(16), iterations)
+    return secrets.token_urlsafe(16)
+
+
+class Authenticator(abc.ABC):
+    """
+    Interface for authenticationConfiguration.authenticatorClass. The class is constructed with the
+    authenticationConfiguration section and gets the client's parsed credential JSON; it returns the user name, or
+    None to reject the client. authenticate() is called from a worker thread, so it may block.
+    """
+
+    def __init__(self, authentication_configuration: dict) -> None:
+        self.authentication_configuration = authentication_configuration
+
+    @abc.abstractmethod
+    def authenticate(self, credentials: dict) -> str or None:
+        pass
+
+
+def load_authenticator_class(class_path: str) -> type:
+    module_name, _, class_name = class_path.rpartition(".")
+    if not module_name:
+        raise ImportError(f"Authenticator class [{class_path}] must be given as module.ClassName")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class SessionTokenCache:
+    """
+    Short-lived, single-use resumption tokens: a client that reconnects with {"token": ...} skips the password check
+    and gets a new token. Tokens expire after ttl seconds and the oldest are dropped beyond max_size, so lookups,
+    issuing and expiry are all O(1). Locked, since tokens may be redeemed from the authentication worker threads.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_size: int = 10000,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        # token -> (user, expires_at); every token lives for ttl, so insertion order is also expiry order
+        self.tokens = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.issued = 0
+        self.redeemed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def issue(self, user: str) -> str:
+        now = self.clock()
+        token = secrets.token_urlsafe(24)
+        with self.lock:
+            self.expire(now)
+            self.tokens[token] = (user, now + self.ttl)
+            self.issued += 1
+            if len(self.tokens) > self.max_size:
+                self.tokens.popitem(last=False)
+                self.evicted += 1
+        return token
+
+    def redeem(self, token) -> str or None:
+        with self.lock:
+            entry = self.tokens.pop(token, None) if isinstance(token, str) else None
+            if entry is None or entry[1] <= self.clock():
+                self.rejected += 1
+                return None
+
+            self.redeemed += 1
+            return entry[0]
+
+    def expire(self, now: float) -> None:
+        while self.tokens:
+            token, (_, expires_at) = next(iter(self.tokens.items()))
+            if expires_at > now:
+                return
+            del self.tokens[token]
+
+    def get_stats(self) -> dict:
+        return {
+            'tokensActive': len(self.tokens),
+            'tokensIssued': self.issued,
+            'tokensRedeemed': self.redeemed,
+            'tokensRejected': self.rejected,
+            'tokensEvicted': self.evicted,
+        }
+
+
+if __name__ == '__main__':
+    print(hash_password(getpass.getpass("Password to hash: ")))
@@ -0,0 +1,252 @@
+import collections
+import functools
+
+from websockets.exceptions import ProtocolError
+from websockets.extensions.permessage_deflate import (ClientPerMessageDeflateFactory, PerMessageDeflate,
+                                                      ServerPerMessageDeflateFactory)
+from websockets.frames import CONT, CTRL_OPCODES, TEXT, Frame
+
+from websocket_proxpy.transport import PrecompressedMessage, receive_message
+
+
+class ProxyPerMessageDeflate(PerMessageDeflate):
+    """
+    permessage-deflate as negotiated by websockets, plus two proxy behaviours:
+
+    Single-frame messages shorter than min_size are sent uncompressed; deflate costs more CPU than it saves on them.
+
+    With passthrough, every incoming data message is recorded as (is_text, still_compressed) so the proxy can tell
+    what recv() returned. Once relay_incoming is set, compressed messages are left compressed, and once relay_only is
+    set, only PrecompressedMessages relayed from the other leg go out compressed, so the peer's inflate context only
+    ever sees the stream produced by the peer on the other leg.
+    """
+
+    @classmethod
+    def adopt(cls, extension: PerMessageDeflate, min_size: int, passthrough: bool) -> 'ProxyPerMessageDeflate':
+        # re-classed in place so the zlib objects websockets allocated during negotiation aren't allocated twice
+        extension.__class__ = cls
+        extension.min_size = min_size
+        extension.passthrough = passthrough
+        extension.relay_incoming = False
+        extension.relay_only = False
+        extension.relay_continuation = False
+        extension.received = collections.deque()
+        extension.inflated_messages = 0
+        return extension
+
+    def decode(self, frame: Frame, *, max_size: int or None = None) -> Frame:
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+
+        if frame.opcode is CONT:
+            if not self.relay_continuation:
+                return super().decode(frame, max_size=max_size)
+            if frame.rsv1:
+                raise ProtocolError("RSV1 bit set in continuation frame")
+            self.relay_continuation = not frame.fin
+            return frame
+
+        relayed = frame.rsv1 and self.relay_incoming
+        if self.passthrough:
+            self.received.append((frame.opcode is TEXT, relayed))
+        if not relayed:
+            if frame.rsv1:
+                self.inflated_messages += 1
+            return super().decode(frame, max_size=max_size)
+
+        # the payload stays compressed; the receiving peer on the other leg inflates it and enforces its max_size
+        self.relay_continuation = not frame.fin
+        return Frame(frame.opcode, frame.data, frame.fin, False, frame.rsv2, frame.rsv3)
+
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+
+        if isinstance(frame.data, PrecompressedMessage):
+            return Frame(frame.opcode, frame.data, frame.fin, True, frame.rsv2, frame.rsv3)
+
+        if self.relay_only or (frame.fin and frame.opcode is not CONT and len(frame.data) < self.min_size):
+            return frame
+
+        return super().encode(frame)
+
+
+class ProxyServerDeflateFactory(ServerPerMessageDeflateFactory):
+    """Client leg: the proxy is the server."""
+
+    def __init__(self, min_size: int = 0, passthrough: bool = False, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.min_size = min_size
+        self.passthrough = passthrough
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ProxyPerMessageDeflate.adopt(extension, self.min_size, self.passthrough)
+
+
+class ProxyClientDeflateFactory(ClientPerMessageDeflateFactory):
+    """Proxied leg: the proxy is the client."""
+
+    def __init__(self, min_size: int = 0, passthrough: bool = False, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.min_size = min_size
+        self.passthrough = passthrough
+
+    def process_response_params(self, params, accepted_extensions):
+        extension = super().process_response_params(params, accepted_extensions)
+        return ProxyPerMessageDeflate.adopt(extension, self.min_size, self.passthrough)
+
+
+class LegCompression:
+    """
+    permessage-deflate settings for one leg (client or proxied), passed through to websockets.serve/connect. enabled
+    None keeps the websockets default; window bits and context takeover use the RFC 7692 parameter names of that leg.
+    """
+    __slots__ = ('enabled', 'server_max_window_bits', 'client_max_window_bits', 'server_no_context_takeover',
+                 'client_no_context_takeover', 'level', 'mem_level', 'min_size')
+
+    def __init__(self, enabled: bool or None = None, server_max_window_bits: int or None = None,
+                 client_max_window_bits: int or None = None, server_no_context_takeover: bool = False,
+                 client_no_context_takeover: bool = False, level: int or None = None, mem_level: int or None = None,
+                 min_size: int = 0) -> None:
+        self.enabled = enabled
+        self.server_max_window_bits = server_max_window_bits
+        self.client_max_window_bits = client_max_window_bits
+        self.server_no_context_takeover = server_no_context_takeover
+        self.client_no_context_takeover = client_no_context_takeover
+        self.level = level
+        self.mem_level = mem_level
+        self.min_size = min_size
+
+    @classmethod
+    def from_yaml(cls, leg_configuration: dict or None) -> 'LegCompression':
+        if not leg_configuration:
+            return cls()
+
+        def optional_int(key: str) -> int or None:
+            value = leg_configuration.get(key)
+            return int(value) if value is not None else None
+
+        return cls(bool(leg_configuration.get('enabled', True)),
+                   optional_int('serverMaxWindowBits'), optional_int('clientMaxWindowBits'),
+                   bool(leg_configuration.get('serverNoContextTakeover', False)),
+                   bool(leg_configuration.get('clientNoContextTakeover', False)),
+                   optional_int('level'), optional_int('memLevel'), optional_int('minSize') or 0)
+
+    def get_compress_settings(self) -> dict:
+        # websockets' own default trades a little ratio for much less memory per connection
+        compress_settings = {'memLevel': 5 if self.mem_level is None else self.mem_level}
+        if self.level is not None:
+            compress_settings['level'] = self.level
+        return compress_settings
+
+    def get_factory_kwargs(self) -> dict:
+        return {
+            'server_no_context_takeover': self.server_no_context_takeover,
+            'client_no_context_takeover': self.client_no_context_takeover,
+            'server_max_window_bits': self.server_max_window_bits,
+            'client_max_window_bits': self.client_max_window_bits,
+            'compress_settings': self.get_compress_settings(),
+        }
+
+    def server_kwargs(self, passthrough: bool = False) -> dict:
+        if self.enabled is None:
+            return {}
+        if not self.enabled:
+            return {'compression': None}
+        return {'compression': None,
+                'extensions': [ProxyServerDeflateFactory(self.min_size, passthrough, **self.get_factory_kwargs())]}
+
+    def client_kwargs(self, passthrough: bool = False) -> dict:
+        if self.enabled is None:
+            return {}
+        if not self.enabled:
+            return {'compression': None}
+
+        factory_kwargs = self.get_factory_kwargs()
+        if factory_kwargs['client_max_window_bits'] is None:
+            # advertise support so the server may pick a smaller window, as websockets does by default
+            factory_kwargs['client_max_window_bits'] = True
+        return {'compression': None,
+                'extensions': [ProxyClientDeflateFactory(self.min_size, passthrough, **factory_kwargs)]}
+
+
+def get_deflate_extension(web_socket) -> ProxyPerMessageDeflate or None:
+    for extension in getattr(getattr(web_socket, 'protocol', None), 'extensions', ()):
+        if isinstance(extension, ProxyPerMessageDeflate):
+            return extension
+    return None
+
+
+def can_relay(source: ProxyPerMessageDeflate, destination: ProxyPerMessageDeflate) -> bool:
+    # the destination peer inflates with the window and context takeover negotiated on its own leg, so they must
+    # cover what the source peer compresses with; a source message inflated earlier would be missing from its window,
+    # unless the source peer resets its context after every message
+    return (source.remote_max_window_bits <= destination.local_max_window_bits
+            and (source.remote_no_context_takeover or not destination.local_no_context_takeover)
+            and (source.inflated_messages == 0 or source.remote_no_context_takeover))
+
+
+async def receive_passthrough_message(web_socket, extension: ProxyPerMessageDeflate):
+    message = await web_socket.recv(decode=False)
+    is_text, is_compressed = extension.received.popleft()
+
+    if is_compressed:
+        return PrecompressedMessage(message, is_text)
+    return message.decode() if is_text else message
+
+
+class CompressionControl:
+    """
+    Per-leg permessage-deflate settings and, with passthrough, relaying of compressed payloads between the legs of a
+    session when both peers negotiated compatible parameters, so messages aren't inflated and deflated again.
+    """
+
+    def __init__(self, client: LegCompression = None, proxied: LegCompression = None,
+                 passthrough: bool = False) -> None:
+        self.client = client or LegCompression()
+        self.proxied = proxied or LegCompression()
+        self.passthrough = passthrough
+        self.passthrough_directions = 0
+        self.recompressed_directions = 0
+
+    def server_kwargs(self) -> dict:
+        return self.client.server_kwargs(self.passthrough)
+
+    def client_kwargs(self) -> dict:
+        return self.proxied.client_kwargs(self.passthrough)
+
+    def get_receiver(self, web_socket):
+        extension = get_deflate_extension(web_socket) if self.passthrough else None
+        if extension is None:
+            return receive_message
+        return functools.partial(receive_passthrough_message, extension=extension)
+
+    def discard_received(self, web_socket) -> None:
+        # messages read with a plain recv() (credentials, destination url) still have to be taken off the record
+        extension = get_deflate_extension(web_socket) if self.passthrough else None
+        if extension is not None and extension.received:
+            extension.received.popleft()
+
+    def start_session(self, proxy_web_socket, proxied_web_socket) -> None:
+        if not self.passthrough:
+            return
+
+        client_extension = get_deflate_extension(proxy_web_socket)
+        proxied_extension = get_deflate_extension(proxied_web_socket)
+        if client_extension is None or proxied_extension is None:
+            return
+
+        for source, destination in ((client_extension, proxied_extension), (proxied_extension, client_extension)):
+            if can_relay(source, destination):
+                source.relay_incoming = True
+                destination.relay_only = True
+                self.passthrough_directions += 1
+            else:
+                self.recompressed_directions += 1
+
+    def get_stats(self) -> dict:
+        return {
+            'compressionPassthroughDirections': self.passthrough_directions,
+            'compressionRecompressedDirections': self.recompressed_directions,
+        }
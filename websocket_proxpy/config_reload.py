@@ -0,0 +1,134 @@
+import asyncio
+import copy
+import os
+import signal
+from typing import Callable, Hashable, NamedTuple, Union
+
+import yaml
+
+from websocket_proxpy.transport import MessageWrapper
+from websocket_proxpy.util.control import ControlMessageClassifier
+
+RELOAD_SIGNAL = getattr(signal, 'SIGHUP', None)
+
+# config keys applied to new sessions on reload; every other change needs a restart
+RELOADABLE_KEYS = {
+    'serverConfiguration': ('proxiedUrl', 'requestsPerConnection'),
+    'authenticationConfiguration': ('password', 'users', 'authenticatorClass'),
+    'transportConfiguration': ('sendPrefix', 'sendSuffix', 'forwardingMode', 'controlMessages', 'controlPrefix',
+                               'statusResponses'),
+}
+
+
+class SessionConfig(NamedTuple):
+    """
+    The settings a session runs with, taken when it opens. A reload swaps in a new snapshot for new sessions, while
+    sessions already open keep the one they started with. users is a read-only mapping, since authentication may
+    read it from worker threads.
+    """
+    generation: int
+    proxied_url: str
+    requests_per_connection: int
+    message_wrapper: MessageWrapper
+    control_classifier: ControlMessageClassifier
+    forwarding_mode: str
+    password: str or None
+    users: dict
+    dummy_password: str or None
+    authenticator: any
+    authenticate_in_thread: bool
+
+
+def read_config_file(path: str) -> Union[dict[Hashable, any], list, None]:
+    with open(path) as config_file:
+        try:
+            return yaml.load(config_file, Loader=yaml.SafeLoader)
+        except yaml.YAMLError as error:
+            raise ValueError(f"can't parse the YAML: {error}") from error
+
+
+def get_restart_required_changes(old_config_yaml: dict, new_config_yaml: dict) -> list[str]:
+    """Dotted paths of the changed settings that a reload doesn't apply."""
+    old_configuration = (old_config_yaml or {}).get('configuration') or {}
+    new_configuration = (new_config_yaml or {}).get('configuration') or {}
+
+    changes = []
+    for section in sorted(set(old_configuration) | set(new_configuration), key=str):
+        # a missing section is compared as an empty one, so adding one with only reloadable keys needs no restart
+        old_section = old_configuration.get(section) or {}
+        new_section = new_configuration.get(section) or {}
+        reloadable_keys = RELOADABLE_KEYS.get(section, ())
+        if not isinstance(old_section, dict) or not isinstance(new_section, dict):
+            if old_section != new_section:
+                changes.append(str(section))
+            continue
+        for key in sorted(set(old_section) | set(new_section), key=str):
+            if key not in reloadable_keys and old_section.get(key) != new_section.get(key):
+                changes.append(f"{section}.{key}")
+    return changes
+
+
+def get_applied_config(old_config_yaml: dict, new_config_yaml: dict) -> dict:
+    """
+    The config a reload actually puts in place: the running one with only the RELOADABLE_KEYS taken from the new one,
+    so changes needing a restart are still reported on the next reload.
+    """
+    applied_config_yaml = copy.deepcopy(old_config_yaml or {})
+    applied_configuration = applied_config_yaml.setdefault('configuration', {})
+    new_configuration = (new_config_yaml or {}).get('configuration') or {}
+
+    for section, reloadable_keys in RELOADABLE_KEYS.items():
+        new_section = new_configuration.get(section) or {}
+        applied_section = applied_configuration.get(section) or {}
+        if not isinstance(new_section, dict) or not isinstance(applied_section, dict):
+            continue
+        for key in reloadable_keys:
+            if key in new_section:
+                applied_section[key] = copy.deepcopy(new_section[key])
+            else:
+                applied_section.pop(key, None)
+        if applied_section or section in applied_configuration:
+            applied_configuration[section] = applied_section
+    return applied_config_yaml
+
+
+class ConfigFileWatcher:
+    """Polls the config file's modification time and size every interval seconds and calls on_change when they move."""
+
+    def __init__(self, path: str, on_change: Callable[[], None], interval: float = 2.0) -> None:
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.signature = self.get_signature()
+        self.task = None
+
+    def get_signature(self) -> tuple or None:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def has_changed(self) -> bool:
+        signature = self.get_signature()
+        # a file that is missing mid-save is picked up once it's back
+        if signature is None or signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.has_changed():
+                self.on_change()
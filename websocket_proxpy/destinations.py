@@ -0,0 +1,246 @@
+import asyncio
+import collections
+import fnmatch
+import functools
+import ipaddress
+import re
+import socket
+import time
+from typing import Awaitable, Callable
+from urllib.parse import urlsplit
+
+import websockets.exceptions
+
+DEFAULT_WS_PORT = 80
+
+
+class DestinationUnavailable(OSError):
+    """Raised instead of connecting while a destination's circuit is open."""
+
+
+def compile_destination_patterns(patterns: list) -> re.Pattern or None:
+    """
+    Compiles host[:port] patterns such as "localhost:8081", "*.example.com" or "10.0.0.*:80??" (fnmatch syntax,
+    case-insensitive, a missing port matches any port) into a single regex matched against "host:port". None, for an
+    empty list, allows every destination.
+    """
+    alternatives = []
+    for pattern in patterns or ():
+        pattern = str(pattern).strip()
+        host_pattern, separator, port_pattern = pattern.rpartition(":")
+        if not separator or "]" in port_pattern or not host_pattern:
+            host_pattern, port_pattern = pattern, "*"
+        if not host_pattern:
+            raise ValueError(f"Destination pattern [{pattern}] has no host")
+        alternatives.append(fnmatch.translate(f"{host_pattern.strip('[]')}:{port_pattern or '*'}"))
+
+    if not alternatives:
+        return None
+    return re.compile("|".join(f"(?:{alternative})" for alternative in alternatives), re.IGNORECASE)
+
+
+def split_destination(url: str) -> tuple[str, int]:
+    """Returns (host, port) of a ws:// url; raises ValueError if either is missing or invalid."""
+    parts = urlsplit(url)
+    if parts.scheme != "ws":
+        raise ValueError("URL must start with ws://")
+    if not parts.hostname:
+        raise ValueError("URL has no host")
+    return parts.hostname, parts.port or DEFAULT_WS_PORT
+
+
+class DnsCache:
+    """
+    Caches getaddrinfo results for ttl seconds, and failed lookups for negative_ttl seconds, keeping at most max_size
+    hosts. Concurrent lookups of the same host share one resolution.
+    """
+
+    def __init__(self, ttl: float = 30.0, negative_ttl: float = 5.0, max_size: int = 1024,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.clock = clock
+        # host -> (addresses or the lookup error, expires_at), least recently used first
+        self.entries = collections.OrderedDict()
+        self.resolving = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    async def resolve(self, host: str) -> list[str]:
+        try:
+            return [str(ipaddress.ip_address(host))]
+        except ValueError:
+            pass
+
+        entry = self.entries.get(host)
+        if entry is not None and entry[1] > self.clock():
+            self.entries.move_to_end(host)
+            result = entry[0]
+            if isinstance(result, OSError):
+                self.negative_hits += 1
+                raise type(result)(*result.args)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        resolving = self.resolving.get(host)
+        if resolving is None:
+            resolving = asyncio.ensure_future(self.lookup(host))
+            self.resolving[host] = resolving
+            resolving.add_done_callback(functools.partial(self.lookup_done, host))
+        return await asyncio.shield(resolving)
+
+    def lookup_done(self, host: str, resolving: asyncio.Future) -> None:
+        self.resolving.pop(host, None)
+        if not resolving.cancelled():
+            # every waiter may have been cancelled; the error is cached either way and mustn't be logged as lost
+            resolving.exception()
+
+    async def lookup(self, host: str) -> list[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            address_infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except OSError as error:
+            self.store(host, error, self.negative_ttl)
+            raise
+
+        addresses = list(dict.fromkeys(address_info[4][0] for address_info in address_infos))
+        self.store(host, addresses, self.ttl)
+        return addresses
+
+    def store(self, host: str, result, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self.entries[host] = (result, self.clock() + ttl)
+        self.entries.move_to_end(host)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        cache_hits = self.hits + self.negative_hits
+        lookups = cache_hits + self.misses
+        return {
+            'dnsCachedHosts': len(self.entries),
+            'dnsHits': self.hits,
+            'dnsNegativeHits': self.negative_hits,
+            'dnsMisses': self.misses,
+            'dnsHitRate': cache_hits / lookups if lookups else 0.0,
+        }
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive connect failures per destination. After failure_threshold of them the circuit opens and
+    connects fail immediately for cooldown seconds; then a single trial connect is let through, which closes the
+    circuit on success or opens it for another cooldown on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 10.0, max_size: int = 1024,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_size = max_size
+        self.clock = clock
+        # destination -> [consecutive failures, open until]
+        self.failures = collections.OrderedDict()
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self, destination: str) -> bool:
+        state = self.failures.get(destination)
+        if state is None or state[0] < self.failure_threshold:
+            return True
+
+        now = self.clock()
+        if now < state[1]:
+            self.rejected += 1
+            return False
+        # half open: this connect is the trial, everyone else keeps failing fast until it finishes
+        state[1] = now + self.cooldown
+        return True
+
+    def record_success(self, destination: str) -> None:
+        self.failures.pop(destination, None)
+
+    def record_failure(self, destination: str) -> None:
+        state = self.failures.setdefault(destination, [0, 0.0])
+        self.failures.move_to_end(destination)
+        state[0] += 1
+        if state[0] >= self.failure_threshold:
+            if state[0] == self.failure_threshold:
+                self.opened += 1
+            state[1] = self.clock() + self.cooldown
+        while len(self.failures) > self.max_size:
+            self.failures.popitem(last=False)
+
+    def get_open_destinations(self) -> list[str]:
+        return [destination for destination, (failures, _) in self.failures.items()
+                if failures >= self.failure_threshold]
+
+    def get_stats(self) -> dict:
+        return {
+            'breakerOpenCircuits': len(self.get_open_destinations()),
+            'breakerOpened': self.opened,
+            'breakerRejected': self.rejected,
+        }
+
+
+class DestinationPolicy:
+    """
+    OPEN_URL destinations: the client's url is checked against the allowed destination patterns, its host is
+    resolved through the DNS cache, and destinations that keep failing are cut off by the circuit breaker.
+    """
+
+    def __init__(self, connect: Callable[..., Awaitable], allowed_destinations: list = None,
+                 dns_cache: DnsCache = None, breaker: CircuitBreaker = None) -> None:
+        self.connect_function = connect
+        self.allowed = compile_destination_patterns(allowed_destinations)
+        self.dns_cache = dns_cache or DnsCache()
+        self.breaker = breaker or CircuitBreaker()
+        self.rejected = 0
+
+    def check_url(self, url: str) -> str or None:
+        """Returns why url may not be opened, or None if it may."""
+        try:
+            host, port = split_destination(url)
+        except ValueError as error:
+            self.rejected += 1
+            return str(error)
+
+        if self.allowed is not None and not self.allowed.fullmatch(f"{host}:{port}"):
+            self.rejected += 1
+            return f"Destination [{host}:{port}] is not allowed"
+        return None
+
+    async def connect(self, url: str, **kwargs) -> any:
+        host, port = split_destination(url)
+        destination = f"{host}:{port}"
+        if not self.breaker.allow(destination):
+            raise DestinationUnavailable(f"Destination [{destination}] is failing, not connecting")
+
+        try:
+            web_socket = await self.connect_addresses(url, await self.dns_cache.resolve(host), port, **kwargs)
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.InvalidHandshake):
+            # a rejected handshake (e.g. a 502 from a proxy in front of the upstream) counts as a failure too
+            self.breaker.record_failure(destination)
+            raise
+
+        self.breaker.record_success(destination)
+        return web_socket
+
+    async def connect_addresses(self, url: str, addresses: list[str], port: int, **kwargs) -> any:
+        # the url keeps the original host for the Host header; only the TCP connection goes to the cached address
+        for address in addresses[:-1]:
+            try:
+                return await self.connect_function(url, host=address, port=port, **kwargs)
+            except OSError:
+                continue
+        return await self.connect_function(url, host=addresses[-1], port=port, **kwargs)
+
+    def get_stats(self) -> dict:
+        stats = {'destinationsRejected': self.rejected}
+        stats.update(self.dns_cache.get_stats())
+        stats.update(self.breaker.get_stats())
+        return stats
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Callable, Coroutine
+
+from websocket_proxpy.metrics import Histogram
+
+LOOP_BACKENDS = ("AUTO", "ASYNCIO", "UVLOOP")
+
+
+def import_uvloop():
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop
+
+
+def get_loop_factory(backend: str) -> Callable[[], asyncio.AbstractEventLoop] or None:
+    # None means asyncio's default event loop
+    if backend == "ASYNCIO":
+        return None
+
+    uvloop = import_uvloop()
+    return uvloop.new_event_loop if uvloop is not None else None
+
+
+def run(main: Coroutine, loop_factory: Callable[[], asyncio.AbstractEventLoop] or None = None) -> any:
+    if loop_factory is None:
+        return asyncio.run(main)
+
+    runner_class = getattr(asyncio, 'Runner', None)
+    if runner_class is None:
+        # Python < 3.11 has no loop_factory; an explicit loop is still closed and cleaned up like asyncio.run does
+        loop = loop_factory()
+        try:
+            asyncio.set_event_loop(loop)
+            return loop.run_until_complete(main)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    with runner_class(loop_factory=loop_factory) as runner:
+        return runner.run(main)
+
+
+class LoopLagMonitor:
+    """
+    Wakes up every interval seconds and measures how late it was. Lag above threshold means a callback held the loop
+    for that long, delaying every session on it, and is logged.
+    """
+
+    def __init__(self, logger, interval: float = 0.5, threshold: float = 0.1, histogram: Histogram = None) -> None:
+        self.logger = logger
+        self.interval = interval
+        self.threshold = threshold
+        self.histogram = histogram or Histogram()
+        self.task = None
+        self.max_lag = 0.0
+        self.lag_events = 0
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected_at = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.observe(max(0.0, loop.time() - expected_at))
+
+    def observe(self, lag: float) -> None:
+        self.histogram.observe(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.threshold:
+            self.lag_events += 1
+            self.logger.warning(f"Event loop blocked for [{lag * 1000:.1f}] ms, above the "
+                                f"[{self.threshold * 1000:.0f}] ms threshold")
+
+    def get_stats(self) -> dict:
+        return {
+            'loopLagMax': self.max_lag,
+            'loopLagEvents': self.lag_events,
+        }
@@ -0,0 +1,105 @@
+from websocket_proxpy.transport import FragmentedMessage, send_message
+
+# websockets' own default write_limit high watermark
+DEFAULT_WRITE_HIGH_WATERMARK = 2 ** 15
+
+
+class BackpressureExceeded(Exception):
+    pass
+
+
+def get_buffered_bytes(web_socket) -> int:
+    transport = getattr(web_socket, 'transport', None)
+    if transport is None:
+        return 0
+    return transport.get_write_buffer_size()
+
+
+class LegLimits:
+    """Buffer limits for one leg (client or proxied) of a session, passed through to websockets.serve/connect."""
+    __slots__ = ('max_size', 'max_queue', 'write_high_watermark', 'write_low_watermark')
+
+    def __init__(self, max_size: int or None = None, max_queue: int or None = None,
+                 write_high_watermark: int or None = None, write_low_watermark: int or None = None) -> None:
+        self.max_size = max_size
+        self.max_queue = max_queue
+        self.write_high_watermark = write_high_watermark
+        self.write_low_watermark = write_low_watermark
+
+    @classmethod
+    def from_yaml(cls, leg_configuration: dict or None) -> 'LegLimits':
+        leg_configuration = leg_configuration or {}
+
+        def optional_int(key: str) -> int or None:
+            value = leg_configuration.get(key)
+            return int(value) if value is not None else None
+
+        return cls(optional_int('maxSize'), optional_int('maxQueue'),
+                   optional_int('writeHighWatermark'), optional_int('writeLowWatermark'))
+
+    def get_high_watermark(self) -> int:
+        if self.write_high_watermark is None:
+            return DEFAULT_WRITE_HIGH_WATERMARK
+        return self.write_high_watermark
+
+    def connection_kwargs(self) -> dict:
+        kwargs = {}
+        if self.max_size is not None:
+            kwargs['max_size'] = self.max_size
+        if self.max_queue is not None:
+            kwargs['max_queue'] = self.max_queue
+        if self.write_high_watermark is not None:
+            if self.write_low_watermark is not None:
+                kwargs['write_limit'] = (self.write_high_watermark, self.write_low_watermark)
+            else:
+                kwargs['write_limit'] = self.write_high_watermark
+        return kwargs
+
+
+class FlowControl:
+    """
+    Decides what happens when the receiving leg can't keep up:
+
+    PAUSE waits for the write buffer to drain, which stops the pump reading from the other leg, so the kernel and
+    websockets' max_queue push back on the sender. DROP discards messages while the write buffer is above the high
+    watermark. DISCONNECT raises BackpressureExceeded so the session is torn down.
+    """
+    POLICIES = ("PAUSE", "DROP", "DISCONNECT")
+
+    def __init__(self, client_limits: LegLimits = None, proxied_limits: LegLimits = None,
+                 policy: str = "PAUSE") -> None:
+        if policy not in self.POLICIES:
+            raise ValueError(f"Flow control policy [{policy}] is invalid")
+
+        self.client_limits = client_limits or LegLimits()
+        self.proxied_limits = proxied_limits or LegLimits()
+        self.policy = policy
+        self.dropped_messages = 0
+        self.disconnects = 0
+
+    async def send_to_client(self, proxy_web_socket, message) -> bool:
+        return await self.send(proxy_web_socket, message, self.client_limits.get_high_watermark())
+
+    async def send_to_proxied(self, proxied_web_socket, message) -> bool:
+        return await self.send(proxied_web_socket, message, self.proxied_limits.get_high_watermark())
+
+    async def send(self, web_socket, message, high_watermark: int) -> bool:
+        if self.policy != "PAUSE" and get_buffered_bytes(web_socket) >= high_watermark:
+            if self.policy == "DROP":
+                if isinstance(message, FragmentedMessage):
+                    await message.discard()
+                self.dropped_messages += 1
+                return False
+
+            self.disconnects += 1
+            raise BackpressureExceeded(f"Write buffer above [{high_watermark}] bytes")
+
+        await send_message(web_socket, message)
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            'policy': self.policy,
+            'droppedMessages': self.dropped_messages,
+            'backpressureDisconnects': self.disconnects,
+        }
@@ -0,0 +1,181 @@
+import asyncio
+import bisect
+from typing import Callable
+
+# seconds; covers sub-millisecond forwarding up to slow upstream handshakes
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+SESSION_DURATION_BUCKETS = (1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0, 14400.0, 86400.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """Reads its value from a callback at scrape time, so nothing is updated on the hot path."""
+    __slots__ = ('read',)
+
+    def __init__(self, read: Callable[[], float]) -> None:
+        self.read = read
+
+    @property
+    def value(self) -> float:
+        return self.read()
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        # one slot per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+
+    def __init__(self) -> None:
+        self.families = []
+
+    def register(self, name: str, metric_type: str, help_text: str, metrics: list) -> None:
+        # metrics is a list of (labels, metric) pairs sharing one name
+        self.families.append((name, metric_type, help_text, metrics))
+
+    def render(self) -> str:
+        lines = []
+        for name, metric_type, help_text, metrics in self.families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, metric in metrics:
+                if isinstance(metric, Histogram):
+                    lines.extend(self.render_histogram(name, labels, metric))
+                else:
+                    lines.append(f"{name}{format_labels(labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def render_histogram(name: str, labels: dict, histogram: Histogram) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(histogram.bounds) + ["+Inf"], histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return lines
+
+
+class ProxyMetrics:
+    """The proxy's counters, gauges and histograms; every hot-path update is an attribute increment."""
+
+    def __init__(self, active_sessions: Callable[[], int], buffered_bytes: Callable[[], dict] = None) -> None:
+        self.connections = Counter()
+        self.auth_failures = Counter()
+        self.upstream_connect_errors = Counter()
+        self.messages_client_to_proxied = Counter()
+        self.messages_proxied_to_client = Counter()
+        self.bytes_client_to_proxied = Counter()
+        self.bytes_proxied_to_client = Counter()
+        self.upstream_connect_time = Histogram()
+        self.message_latency = Histogram()
+        self.session_duration = Histogram(SESSION_DURATION_BUCKETS)
+        self.loop_lag = Histogram()
+
+        self.registry = MetricsRegistry()
+        self.registry.register("proxpy_connections_total", "counter", "Client connections accepted.",
+                               [({}, self.connections)])
+        self.registry.register("proxpy_active_sessions", "gauge", "Client sessions currently open.",
+                               [({}, Gauge(active_sessions))])
+        if buffered_bytes is not None:
+            # read from every session's transports at scrape time
+            self.registry.register("proxpy_buffered_bytes", "gauge", "Bytes waiting in write buffers, all sessions.",
+                                   [({'leg': "client"}, Gauge(lambda: buffered_bytes()['clientBufferedBytes'])),
+                                    ({'leg': "proxied"}, Gauge(lambda: buffered_bytes()['proxiedBufferedBytes']))])
+            self.registry.register("proxpy_buffered_bytes_max", "gauge",
+                                   "Largest write buffer of a single session.",
+                                   [({'leg': "client"}, Gauge(lambda: buffered_bytes()['clientBufferedBytesMax'])),
+                                    ({'leg': "proxied"}, Gauge(lambda: buffered_bytes()['proxiedBufferedBytesMax']))])
+        self.registry.register("proxpy_auth_failures_total", "counter", "Rejected client credentials.",
+                               [({}, self.auth_failures)])
+        self.registry.register("proxpy_upstream_connect_errors_total", "counter",
+                               "Failed connection attempts to the proxied server.",
+                               [({}, self.upstream_connect_errors)])
+        self.registry.register("proxpy_messages_total", "counter", "Messages forwarded.",
+                               [({'direction': "client_to_proxied"}, self.messages_client_to_proxied),
+                                ({'direction': "proxied_to_client"}, self.messages_proxied_to_client)])
+        self.registry.register("proxpy_payload_bytes_total", "counter",
+                               "Payload forwarded, in bytes for binary and characters for text messages.",
+                               [({'direction': "client_to_proxied"}, self.bytes_client_to_proxied),
+                                ({'direction': "proxied_to_client"}, self.bytes_proxied_to_client)])
+        self.registry.register("proxpy_upstream_connect_seconds", "histogram",
+                               "Time to open a connection to the proxied server.",
+                               [({}, self.upstream_connect_time)])
+        self.registry.register("proxpy_message_proxy_seconds", "histogram",
+                               "Time from receiving a message on one leg to handing it to the other.",
+                               [({}, self.message_latency)])
+        self.registry.register("proxpy_session_duration_seconds", "histogram", "Client session lifetime.",
+                               [({}, self.session_duration)])
+        self.registry.register("proxpy_event_loop_lag_seconds", "histogram",
+                               "How late the event loop lag monitor woke up.", [({}, self.loop_lag)])
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+class MetricsServer:
+    """Minimal HTTP/1.0 responder serving GET /metrics; anything else gets a 404."""
+
+    def __init__(self, metrics: ProxyMetrics, host: str = "127.0.0.1", port: int = 9100) -> None:
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle_request, self.host, self.port)
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            parts = request_line.decode("latin-1").split()
+
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.metrics.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+
+            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
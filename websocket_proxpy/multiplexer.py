@@ -0,0 +1,273 @@
+import asyncio
+import itertools
+from typing import AsyncIterator, Awaitable, Callable
+
+import websockets.exceptions
+
+CHANNEL_PLACEHOLDER = "{channel}"
+
+
+class ChannelEnvelope:
+    """
+    Wraps messages for a shared upstream as <before>channel-id<after>payload<suffix>, where the configured prefix
+    template is <before>{channel}<after>. The upstream must answer with the same envelope so replies can be routed
+    back to the right client session.
+    """
+    __slots__ = ('before', 'after', 'suffix', 'binary_before', 'binary_after', 'binary_suffix')
+
+    def __init__(self, prefix_template: str = "{channel}:", suffix: str = "") -> None:
+        if prefix_template.count(CHANNEL_PLACEHOLDER) != 1:
+            raise ValueError(f"Channel prefix [{prefix_template}] must contain {CHANNEL_PLACEHOLDER} exactly once")
+        self.before, self.after = prefix_template.split(CHANNEL_PLACEHOLDER)
+        if not self.after:
+            raise ValueError(f"Channel prefix [{prefix_template}] needs a separator after {CHANNEL_PLACEHOLDER}")
+
+        self.suffix = suffix
+        self.binary_before = self.before.encode("utf-8")
+        self.binary_after = self.after.encode("utf-8")
+        self.binary_suffix = suffix.encode("utf-8")
+
+    def wrap(self, channel_id: int, message):
+        if isinstance(message, str):
+            return "".join((self.before, str(channel_id), self.after, message, self.suffix))
+        return b"".join((self.binary_before, str(channel_id).encode("ascii"), self.binary_after, message,
+                         self.binary_suffix))
+
+    async def wrap_fragments(self, channel_id: int, fragments: AsyncIterator) -> AsyncIterator:
+        suffix = None
+        async for fragment in fragments:
+            if suffix is None:
+                if isinstance(fragment, str):
+                    yield "".join((self.before, str(channel_id), self.after))
+                    suffix = self.suffix
+                else:
+                    yield b"".join((self.binary_before, str(channel_id).encode("ascii"), self.binary_after))
+                    suffix = self.binary_suffix
+            yield fragment
+        if suffix:
+            yield suffix
+
+    def unwrap(self, message) -> tuple[int, any] or None:
+        if isinstance(message, str):
+            before, after, suffix = self.before, self.after, self.suffix
+        else:
+            before, after, suffix = self.binary_before, self.binary_after, self.binary_suffix
+
+        if not message.startswith(before) or not message.endswith(suffix):
+            return None
+
+        separator_index = message.find(after, len(before))
+        if separator_index < 0:
+            return None
+
+        try:
+            channel_id = int(message[len(before):separator_index])
+        except ValueError:
+            return None
+
+        payload_end = len(message) - len(suffix)
+        payload_start = separator_index + len(after)
+        if payload_start > payload_end:
+            return None
+        return channel_id, message[payload_start:payload_end]
+
+
+class MultiplexedChannel:
+    """
+    One client session's view of a shared upstream. Quacks like the parts of a websockets connection the proxy uses
+    (send/recv/close), so the forwarding loops don't need to know they're multiplexed.
+    """
+
+    def __init__(self, channel_id: int, upstream: 'MultiplexedUpstream', queue_size: int) -> None:
+        self.channel_id = channel_id
+        self.upstream = upstream
+        self.incoming = asyncio.Queue(queue_size)
+        self.close_exception = None
+
+    async def send(self, message) -> None:
+        if self.close_exception is not None:
+            raise self.close_exception
+
+        envelope = self.upstream.envelope
+        if isinstance(message, (str, bytes, bytearray, memoryview)):
+            await self.upstream.web_socket.send(envelope.wrap(self.channel_id, message))
+        else:
+            await self.upstream.web_socket.send(envelope.wrap_fragments(self.channel_id, message))
+
+    async def recv(self):
+        if self.close_exception is not None and self.incoming.empty():
+            raise self.close_exception
+
+        message = await self.incoming.get()
+        if message is None:
+            raise self.close_exception
+        return message
+
+    def deliver(self, message) -> bool:
+        try:
+            self.incoming.put_nowait(message)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def fail(self, exception: Exception) -> None:
+        if self.close_exception is not None:
+            return
+        self.close_exception = exception
+        # wake a pending recv; a full queue is drained first and then raises from the check above
+        self.deliver(None)
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.upstream.remove_channel(self)
+        self.fail(websockets.exceptions.ConnectionClosedOK(None, None))
+
+
+class MultiplexedUpstream:
+
+    def __init__(self, url: str, web_socket, envelope: ChannelEnvelope, multiplexer: 'UpstreamMultiplexer') -> None:
+        self.url = url
+        self.web_socket = web_socket
+        self.envelope = envelope
+        self.multiplexer = multiplexer
+        self.channels = {}
+        # closes the upstream once it has had no channels for the multiplexer's idle_timeout
+        self.idle_handle = None
+        self.reader_task = asyncio.ensure_future(self.read())
+
+    def add_channel(self, channel: MultiplexedChannel) -> None:
+        if self.idle_handle is not None:
+            self.idle_handle.cancel()
+            self.idle_handle = None
+        self.channels[channel.channel_id] = channel
+
+    def remove_channel(self, channel: MultiplexedChannel) -> None:
+        if self.channels.pop(channel.channel_id, None) is not None and not self.channels:
+            self.multiplexer.upstream_idle(self)
+
+    async def read(self) -> None:
+        try:
+            async for message in self.web_socket:
+                unwrapped = self.envelope.unwrap(message)
+                channel = self.channels.get(unwrapped[0]) if unwrapped is not None else None
+
+                if channel is None:
+                    self.multiplexer.unroutable_messages += 1
+                elif not channel.deliver(unwrapped[1]):
+                    # one slow client must not stall every other channel on this upstream
+                    self.multiplexer.channel_overflows += 1
+                    self.remove_channel(channel)
+                    channel.fail(websockets.exceptions.ConnectionClosedError(None, None))
+            close_exception = websockets.exceptions.ConnectionClosedOK(None, None)
+        except websockets.exceptions.ConnectionClosed as error:
+            close_exception = error
+
+        self.multiplexer.remove_upstream(self)
+        for channel in list(self.channels.values()):
+            channel.fail(close_exception)
+        self.channels.clear()
+
+    async def close(self) -> None:
+        if self.idle_handle is not None:
+            self.idle_handle.cancel()
+            self.idle_handle = None
+        self.reader_task.cancel()
+        await asyncio.gather(self.reader_task, return_exceptions=True)
+        await self.web_socket.close()
+
+
+class UpstreamMultiplexer:
+    """
+    Shares a few upstream WebSockets per destination url between many client sessions. Each session gets a channel
+    id carried in a ChannelEnvelope; upstream replies are routed back by that id. An upstream left without channels is
+    closed after idle_timeout seconds (right away with 0), so every destination ever requested doesn't keep a socket.
+    """
+
+    def __init__(self, connect: Callable[[str], Awaitable], envelope: ChannelEnvelope,
+                 max_upstreams_per_url: int = 1, max_channels_per_upstream: int = 1000,
+                 channel_queue_size: int = 64, idle_timeout: float = 10.0) -> None:
+        self.connect = connect
+        self.envelope = envelope
+        self.max_upstreams_per_url = max_upstreams_per_url
+        self.max_channels_per_upstream = max_channels_per_upstream
+        self.channel_queue_size = channel_queue_size
+        self.idle_timeout = idle_timeout
+
+        self.upstreams = {}
+        self.connecting = {}
+        self.closing = set()
+        self.channel_ids = itertools.count(1)
+        self.unroutable_messages = 0
+        self.channel_overflows = 0
+        self.idle_closed = 0
+
+    async def open_channel(self, url: str) -> MultiplexedChannel:
+        upstream = await self.get_upstream(url)
+        channel = MultiplexedChannel(next(self.channel_ids), upstream, self.channel_queue_size)
+        upstream.add_channel(channel)
+        return channel
+
+    async def get_upstream(self, url: str) -> MultiplexedUpstream:
+        upstreams = self.upstreams.setdefault(url, [])
+        least_loaded = min(upstreams, key=lambda upstream: len(upstream.channels), default=None)
+
+        if least_loaded is not None and (len(least_loaded.channels) < self.max_channels_per_upstream
+                                         or len(upstreams) >= self.max_upstreams_per_url):
+            return least_loaded
+
+        # sessions arriving while the first handshake is in flight share it instead of opening their own
+        pending = self.connecting.get(url)
+        if pending is None:
+            pending = asyncio.ensure_future(self.open_upstream(url))
+            self.connecting[url] = pending
+            pending.add_done_callback(lambda _: self.connecting.pop(url, None))
+        return await asyncio.shield(pending)
+
+    async def open_upstream(self, url: str) -> MultiplexedUpstream:
+        upstream = MultiplexedUpstream(url, await self.connect(url), self.envelope, self)
+        self.upstreams.setdefault(url, []).append(upstream)
+        return upstream
+
+    def remove_upstream(self, upstream: MultiplexedUpstream) -> None:
+        upstreams = self.upstreams.get(upstream.url, [])
+        if upstream in upstreams:
+            upstreams.remove(upstream)
+        if not upstreams:
+            self.upstreams.pop(upstream.url, None)
+        if upstream.idle_handle is not None:
+            upstream.idle_handle.cancel()
+            upstream.idle_handle = None
+
+    def upstream_idle(self, upstream: MultiplexedUpstream) -> None:
+        if upstream not in self.upstreams.get(upstream.url, []):
+            # already closed or closing
+            return
+        if self.idle_timeout > 0:
+            upstream.idle_handle = asyncio.get_running_loop().call_later(self.idle_timeout, self.close_idle, upstream)
+        else:
+            self.close_idle(upstream)
+
+    def close_idle(self, upstream: MultiplexedUpstream) -> None:
+        upstream.idle_handle = None
+        if upstream.channels:
+            return
+        self.remove_upstream(upstream)
+        self.idle_closed += 1
+        closing = asyncio.ensure_future(upstream.close())
+        self.closing.add(closing)
+        closing.add_done_callback(self.closing.discard)
+
+    async def close(self) -> None:
+        upstreams = [upstream for url_upstreams in self.upstreams.values() for upstream in url_upstreams]
+        self.upstreams.clear()
+        await asyncio.gather(*(upstream.close() for upstream in upstreams), *self.closing, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        upstreams = [upstream for url_upstreams in self.upstreams.values() for upstream in url_upstreams]
+        return {
+            'destinations': len(self.upstreams),
+            'upstreams': len(upstreams),
+            'channels': sum(len(upstream.channels) for upstream in upstreams),
+            'unroutableMessages': self.unroutable_messages,
+            'channelOverflows': self.channel_overflows,
+            'idleClosed': self.idle_closed,
+        }
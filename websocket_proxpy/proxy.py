@@ -2,28 +2,72 @@ import sys
 from typing import Hashable, Union
 
 from websocket_proxpy.util import base
+from websocket_proxpy import event_loop
 
 try:
     import websockets
+    import websockets.exceptions
 except ImportError:
     base.fatal_fail("'websockets' library required (pip install websockets). Exiting.")
     sys.exit()
 
-from websocket_proxpy.util.jsonutils import get_json_status_response
+from websocket_proxpy.util.control import ControlMessageClassifier
+from websocket_proxpy.util.jsonutils import StatusResponses
+from websocket_proxpy.auth import (PBKDF2_SCHEME, SessionTokenCache, create_dummy_password, load_authenticator_class,
+                                   verify_password)
+from websocket_proxpy.compression import CompressionControl, LegCompression
+from websocket_proxpy.config_reload import (RELOAD_SIGNAL, ConfigFileWatcher, SessionConfig,
+                                            get_applied_config, get_restart_required_changes, read_config_file)
+from websocket_proxpy.destinations import CircuitBreaker, DestinationPolicy, DnsCache
+from websocket_proxpy.flow_control import BackpressureExceeded, FlowControl, LegLimits, get_buffered_bytes
+from websocket_proxpy.metrics import MetricsServer, ProxyMetrics
+from websocket_proxpy.rate_limits import ConnectionLimiter, RateLimit, RateLimiter
+from websocket_proxpy.transport import FragmentedMessage, MessageWrapper, get_message_size
+from websocket_proxpy.multiplexer import ChannelEnvelope, UpstreamMultiplexer
+from websocket_proxpy.sessions import SessionRegistry, WebSocketConnection
+from websocket_proxpy.timeouts import SessionTimers
+from websocket_proxpy.upstream_pool import UpstreamPool, UpstreamResponseTimeout
 import asyncio
+import functools
+import http
 import json
+import signal
+import types
+import time
 
+# user name for clients authenticated with the shared authenticationConfiguration.password
+DEFAULT_USER = "default"
 
-class WebSocketConnection:
-    request_count = 0
-    credentials = ""
+# status message templates, rendered through WebSocketProxpy.status_responses
+PROXIED_CONNECTION_CLOSED = "Proxied connection closed."
+PROXIED_CONNECTION_OPEN = "Proxied connection [{}] open for arbitrary requests."
+PROXIED_CONNECT_ERROR = "Unable to connect with proxied url [{}]. Connection closed."
+CONNECTION_LIMIT_EXCEEDED = "Unable to proxy request, connection exceeds config limit of [{}] requests per connection."
+WSS_NOT_SUPPORTED = "WSS not yet supported"
+URL_NOT_WS = "URL must start with ws://"
+DESTINATION_REJECTED = "{}. Connection closed."
+REQUEST_DROPPED = "Proxied server is not keeping up, request dropped."
+PROXIED_RESPONSE_TIMEOUT = "Proxied server didn't respond in time. Connection closed."
+RATE_LIMIT_EXCEEDED = "Rate limit exceeded, message not forwarded."
+TOO_MANY_CONNECTIONS = "Too many connections"
 
 
-async def send_to_web_socket_connection_aware(proxy_web_socket, proxied_web_socket, request_for_proxy):
+async def send_status(web_socket, status_response) -> None:
+    if isinstance(status_response, bytes):
+        # pre-encoded JSON still goes out as a text frame
+        await web_socket.send(status_response, text=True)
+    else:
+        await web_socket.send(status_response)
+
+
+async def send_to_web_socket_connection_aware(proxy_web_socket, proxied_web_socket, request_for_proxy,
+                                              closed_response, flow_control: FlowControl) -> bool:
+    # False when the flow control policy dropped the request
     try:
-        await proxied_web_socket.send(request_for_proxy)
+        return await flow_control.send_to_proxied(proxied_web_socket, request_for_proxy)
     except websockets.exceptions.InvalidState:
-        proxy_web_socket.send(get_json_status_response("ok", "Proxied connection closed."))
+        await send_status(proxy_web_socket, closed_response)
+        return True
 
 
 class WebSocketProxpy:
@@ -33,12 +77,66 @@ class WebSocketProxpy:
     serverType = "OPEN_URL"
     proxied_url = ""
     password = ""
+    users = None
+    dummy_password = None
+    authenticator = None
+    authenticate_in_thread = False
+    session_tokens = None
     send_suffix = ""
     send_prefix = ""
+    forwarding_mode = "REQUEST_RESPONSE"
     requests_per_connection = 10000
+    control_classifier = None
+    message_wrapper = None
+    flow_control = None
+    compression = None
+    status_responses = None
+    authenticated_message = None
+    destination_policy = None
+    upstream_pool = None
+    upstream_multiplexer = None
+    metrics = None
+    metrics_server = None
+    metrics_port_offset = 0
+    reuse_port = False
+    stats_sink = None
+    stats_interval = 5.0
+    stats_task = None
+    session_timers = None
+    rate_limiter = None
+    connection_limiter = None
+    fairness_quantum = 8
+    total_sessions = 0
+    loop_backend = "AUTO"
+    loop_factory = None
+    loop_lag_monitor = None
+    drain_timeout = 10.0
+    stop_signals = (signal.SIGINT, signal.SIGTERM)
+    startup_seconds = None
+    config = None
+    config_yaml = None
+    config_path = None
+    config_watch_interval = 0.0
+    config_watcher = None
+    config_reload_task = None
+    config_generation = 0
+    config_reloads = 0
+    config_reload_failures = 0
 
     def __init__(self, logger):
         self.logger = logger
+        self.control_classifier = ControlMessageClassifier()
+        self.message_wrapper = MessageWrapper(self.send_prefix, self.send_suffix)
+        self.flow_control = FlowControl()
+        self.compression = CompressionControl()
+        self.users = {}
+        self.sessions = SessionRegistry()
+        self.metrics = ProxyMetrics(lambda: len(self.sessions), self.get_buffered_bytes_stats)
+        self.session_timers = SessionTimers(self.sessions, logger)
+        self.connection_limiter = ConnectionLimiter()
+        self.status_responses = StatusResponses()
+        self.pin_status_responses()
+        self.config = self.snapshot_config()
 
     def is_open_url_server(self) -> bool:
         return self.serverType == "OPEN_URL"
@@ -49,20 +147,56 @@ class WebSocketProxpy:
     def is_forced_url_no_password_server(self) -> bool:
         return self.serverType == "FORCED_URL_NO_PASSWORD"
 
+    def is_full_duplex_forwarding(self) -> bool:
+        return self.forwarding_mode == "FULL_DUPLEX"
+
     def authenticate(self, connection: WebSocketConnection) -> bool:
-        # expects {"password": "12345"}
+        # expects {"password": "12345"}, {"user": "alice", "password": "12345"} or {"token": "..."}
+        config = self.get_session_config(connection)
         try:
             parsed_json = json.loads(connection.credentials)
         except ValueError:
             return False
 
-        if 'password' not in parsed_json:
-            return False
-        elif parsed_json['password'] != self.password:
+        if not isinstance(parsed_json, dict):
             return False
+        elif 'token' in parsed_json and self.session_tokens is not None:
+            user = self.session_tokens.redeem(parsed_json['token'])
+        elif config.authenticator is not None:
+            user = config.authenticator.authenticate(parsed_json)
         else:
-            self.logger.log("User authenticated.")
-            return True
+            user = self.authenticate_password(parsed_json, config)
+
+        if user is None:
+            return False
+        connection.user = user
+        self.logger.info(f"User [{user}] authenticated.")
+        return True
+
+    @staticmethod
+    def authenticate_password(credentials: dict, config: SessionConfig) -> str or None:
+        if 'password' not in credentials:
+            return None
+
+        user = credentials.get('user')
+        if user is None:
+            # the single shared password from older configs
+            return DEFAULT_USER if verify_password(credentials['password'], config.password) else None
+
+        stored_password = config.users.get(user) if isinstance(user, str) else None
+        if stored_password is None:
+            # an unknown user costs the same hash as a wrong password, so the response time doesn't reveal user names
+            verify_password(credentials['password'], config.dummy_password)
+            return None
+        if not verify_password(credentials['password'], stored_password):
+            return None
+        return user
+
+    async def authenticate_session(self, connection: WebSocketConnection) -> bool:
+        if not self.get_session_config(connection).authenticate_in_thread:
+            return self.authenticate(connection)
+        # password hashing is slow by design; in a thread it doesn't stall every other session on the loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.authenticate, connection)
 
     @staticmethod
     def parse_destination_url(json_content) -> str or None:
@@ -72,7 +206,7 @@ class WebSocketProxpy:
         except ValueError:
             return None
 
-        if 'url' not in parsed_json:
+        if not isinstance(parsed_json, dict) or not isinstance(parsed_json.get('url'), str):
             return None
         return parsed_json['url']
 
@@ -97,19 +231,141 @@ class WebSocketProxpy:
             self.load_server_config_from_yaml(config_yaml)
             self.load_authentication_config_from_yaml(config_yaml)
             self.load_transport_config_from_yaml(config_yaml)
-            return True
+            self.load_flow_control_config_from_yaml(config_yaml)
+            self.load_compression_config_from_yaml(config_yaml)
+            self.load_destination_config_from_yaml(config_yaml)
+            self.load_upstream_pool_config_from_yaml(config_yaml)
+            self.load_multiplex_config_from_yaml(config_yaml)
+            self.load_timeout_config_from_yaml(config_yaml)
+            self.load_rate_limit_config_from_yaml(config_yaml)
+            self.load_metrics_config_from_yaml(config_yaml)
+            self.load_event_loop_config_from_yaml(config_yaml)
+            self.load_status_responses_config_from_yaml(config_yaml)
         except TypeError:
             return False
 
-    async def proxy_dispatcher(self, proxy_web_socket, path: str) -> None:
-        self.logger.log("Connection established with CLIENT at " + path)
+        self.config_yaml = config_yaml
+        self.config_watch_interval = float((config_yaml['configuration'].get('reloadConfiguration') or {})
+                                           .get('watchInterval', 0))
+        self.config_generation += 1
+        self.config = self.snapshot_config()
+        return True
+
+    def snapshot_config(self) -> SessionConfig:
+        return SessionConfig(self.config_generation, self.proxied_url, self.requests_per_connection,
+                             self.message_wrapper, self.control_classifier, self.forwarding_mode, self.password,
+                             types.MappingProxyType(dict(self.users)), self.dummy_password, self.authenticator,
+                             self.authenticate_in_thread)
+
+    def get_session_config(self, connection: WebSocketConnection) -> SessionConfig:
+        # a connection that wasn't opened through proxy_dispatcher runs with the current settings
+        return connection.config if connection.config is not None else self.snapshot_config()
+
+    def validate_config_file(self, running_config_yaml: Union[dict[Hashable, any], list, None]) -> tuple or None:
+        # (new file, config to apply, candidate proxy loaded from it), or None if either config is invalid
+        # runs in a worker thread: parsing and validating never hold up the forwarding loop
+        try:
+            config_yaml = read_config_file(self.config_path)
+            if not WebSocketProxpy(self.logger).load_config_from_yaml(config_yaml):
+                return None
+            # what actually runs is the reloadable keys on top of the running config, and that mix must be valid too
+            applied_config_yaml = get_applied_config(running_config_yaml, config_yaml)
+            candidate = WebSocketProxpy(self.logger)
+            if candidate.load_config_from_yaml(applied_config_yaml):
+                return config_yaml, applied_config_yaml, candidate
+        except (OSError, KeyError, ValueError, AttributeError) as error:
+            self.logger.error(f"Config file [{self.config_path}] is invalid: {error!r}")
+        except SystemExit:
+            # the loaders fail startup on invalid values; on reload the running config just stays in place
+            pass
+        return None
+
+    async def reload_config(self) -> bool:
+        validated = await asyncio.get_running_loop().run_in_executor(None, self.validate_config_file, self.config_yaml)
+        if validated is None:
+            self.config_reload_failures += 1
+            self.logger.error(f"Config reload from [{self.config_path}] failed, keeping the running config")
+            return False
+
+        config_yaml, applied_config_yaml, candidate = validated
+        restart_required_changes = get_restart_required_changes(self.config_yaml, config_yaml)
+        if restart_required_changes:
+            self.logger.warning(f"Config changes to {restart_required_changes} need a restart and were not applied")
+        self.apply_config(candidate, applied_config_yaml)
+        return True
+
+    def apply_config(self, candidate: 'WebSocketProxpy', config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        # one synchronous swap on the loop thread: new sessions see either the old or the new config, never a mix
+        self.proxied_url = candidate.proxied_url
+        self.requests_per_connection = candidate.requests_per_connection
+        self.send_prefix = candidate.send_prefix
+        self.send_suffix = candidate.send_suffix
+        self.message_wrapper = candidate.message_wrapper
+        self.control_classifier = candidate.control_classifier
+        self.forwarding_mode = candidate.forwarding_mode
+        self.password = candidate.password
+        self.users = candidate.users
+        self.dummy_password = candidate.dummy_password
+        self.authenticator = candidate.authenticator
+        self.authenticate_in_thread = candidate.authenticate_in_thread
+        self.status_responses = candidate.status_responses
+        self.config_yaml = config_yaml
+        self.config_generation += 1
+        self.config_reloads += 1
+        self.config = self.snapshot_config()
+        self.logger.info(f"Config reloaded from [{self.config_path}], generation [{self.config_generation}] applies "
+                         f"to new sessions")
+
+    def request_config_reload(self) -> None:
+        # reloads run one after another, so the file read last is also the config applied last
+        self.config_reload_task = asyncio.ensure_future(self.reload_config_after(self.config_reload_task))
 
-        connection = WebSocketConnection()
+    async def reload_config_after(self, previous_reload: asyncio.Task or None) -> None:
+        if previous_reload is not None:
+            await asyncio.gather(previous_reload, return_exceptions=True)
+        await self.reload_config()
 
+    def start_config_watcher(self) -> None:
+        if self.config_path is not None and self.config_watch_interval > 0:
+            self.config_watcher = ConfigFileWatcher(self.config_path, self.request_config_reload,
+                                                    self.config_watch_interval)
+            self.config_watcher.start()
+
+    async def proxy_dispatcher(self, proxy_web_socket, path: str = None) -> None:
+        if path is None:
+            # websockets >= 13 passes only the connection; the path lives on the handshake request
+            path = proxy_web_socket.request.path
+        self.logger.info("Connection established with CLIENT at %s", path)
+
+        if not await self.connection_limiter.acquire():
+            self.logger.warning(f"Connection limit of [{self.connection_limiter.max_connections}] reached, closing")
+            await proxy_web_socket.close(1013, TOO_MANY_CONNECTIONS)
+            return
+        try:
+            await self.run_session(proxy_web_socket)
+        finally:
+            self.connection_limiter.release()
+
+    async def run_session(self, proxy_web_socket) -> None:
+        connection = self.sessions.open(proxy_web_socket)
+        connection.config = self.config
+        self.session_timers.track(connection)
+        self.total_sessions += 1
+        self.metrics.connections.inc()
+        try:
+            await self.dispatch_session(connection, proxy_web_socket)
+        except websockets.exceptions.ConnectionClosed as error:
+            # e.g. closed by a session timeout while waiting for credentials or on the upstream
+            self.logger.info(f"Session [{connection.session_id}] ended, connection closed: {error}")
+        finally:
+            self.sessions.close(connection)
+            self.metrics.session_duration.observe(time.monotonic() - connection.connected_at)
+
+    async def dispatch_session(self, connection: WebSocketConnection, proxy_web_socket) -> None:
         if self.requires_authentication():
             connection.credentials = await self.get_credentials(proxy_web_socket)
 
-            if self.authenticate(connection):
+            if await self.authenticate_session(connection):
                 await self.handle_authenticated_connection(connection, proxy_web_socket)
             else:
                 await self.handle_failed_authentication(connection, proxy_web_socket)
@@ -117,88 +373,414 @@ class WebSocketProxpy:
             await self.handle_connection_without_authentication(connection, proxy_web_socket)
 
     async def handle_authenticated_connection(self, connection: WebSocketConnection, proxy_web_socket) -> None:
-        authenticated_message = "Authenticated " + self.get_post_authentication_directions()
-        await proxy_web_socket.send(get_json_status_response("ok", f"{authenticated_message}'"))
+        await send_status(proxy_web_socket, self.get_authenticated_response(connection))
         if self.is_open_url_server():
             proxied_url_value = await self.get_proxy_url_from_client(proxy_web_socket)
             if proxied_url_value is None:
                 return
         else:
-            proxied_url_value = self.proxied_url
-        proxied_web_socket = await self.connect_to_proxy_server(proxied_url_value, proxy_web_socket)
-        await self.process_requests(proxy_web_socket, proxied_web_socket, connection)
+            proxied_url_value = self.get_session_config(connection).proxied_url
+        await self.proxy_session(proxied_url_value, proxy_web_socket, connection)
+
+    def get_authenticated_response(self, connection: WebSocketConnection) -> str or bytes:
+        session_token_fields = self.get_session_token_fields(connection)
+        if session_token_fields is not None:
+            # a fresh token per session, so this one can't be cached
+            return self.status_responses.render("ok", self.authenticated_message, session_token_fields)
+        return self.status_responses.format("ok", self.authenticated_message)
+
+    def get_session_token_fields(self, connection: WebSocketConnection) -> dict or None:
+        if self.session_tokens is None:
+            return None
+        return {'token': self.session_tokens.issue(connection.user), 'tokenTtl': self.session_tokens.ttl}
 
     async def handle_connection_without_authentication(self, connection: WebSocketConnection, proxy_web_socket) -> None:
-        proxied_url_value = self.proxied_url
-        proxied_web_socket = await self.connect_to_proxy_server(proxied_url_value, proxy_web_socket)
-        await self.process_requests(proxy_web_socket, proxied_web_socket, connection)
+        await self.proxy_session(self.get_session_config(connection).proxied_url, proxy_web_socket, connection)
+
+    async def proxy_session(self, proxied_url_value: str, proxy_web_socket, connection: WebSocketConnection) -> None:
+        proxied_web_socket = await self.connect_to_proxy_server(proxied_url_value, proxy_web_socket, connection)
+        if proxied_web_socket is None:
+            return
+
+        connection.proxied_web_socket = proxied_web_socket
+        connection.upstream_url = proxied_url_value
+        self.session_timers.track(connection)
+        self.start_compression(connection)
+        try:
+            await self.process_requests(proxy_web_socket, proxied_web_socket, connection)
+        except BackpressureExceeded as error:
+            self.logger.warning(f"Closing session, peer can't keep up: {error}")
+            await proxy_web_socket.close(1013, "Backpressure limit exceeded")
+        except UpstreamResponseTimeout as error:
+            self.logger.warning(f"Closing session: {error}")
+            await send_status(proxy_web_socket, self.status_responses.format("error", PROXIED_RESPONSE_TIMEOUT))
+        finally:
+            await self.disconnect_from_proxy_server(proxied_web_socket, connection)
+
+    def start_compression(self, connection: WebSocketConnection) -> None:
+        self.compression.start_session(connection.proxy_web_socket, connection.proxied_web_socket)
+        connection.receive_from_client = self.compression.get_receiver(connection.proxy_web_socket)
+        connection.receive_from_proxied = self.compression.get_receiver(connection.proxied_web_socket)
 
     async def handle_failed_authentication(self, connection: WebSocketConnection, proxy_web_socket) -> None:
+        self.metrics.auth_failures.inc()
         auth_failed_message = "Authentication failed. Password invalid [" + connection.credentials + "]"
-        await proxy_web_socket.send(get_json_status_response("error", auth_failed_message + "'}"))
-        self.logger.log("CLIENT authentication credentials [%s] rejected.", connection.credentials)
+        # rendered per client: credentials are arbitrary client input and have no place in a cache
+        await send_status(proxy_web_socket, self.status_responses.render("error", auth_failed_message))
+        self.logger.warning(f"Session [{connection.session_id}] from {connection.client_address} failed authentication")
+        self.logger.log_payload("CLIENT authentication credentials rejected", connection.credentials)
 
     async def respond_with_proxy_connect_error(self, proxied_url_value: str, proxy_web_socket) -> None:
-        error_message = "Unable to connect with proxied url [" + proxied_url_value + "]. Connection closed."
-        await proxy_web_socket.send(get_json_status_response("error", error_message + "'}"))
-        self.logger.log(error_message)
+        await send_status(proxy_web_socket,
+                          self.status_responses.format("error", PROXIED_CONNECT_ERROR, proxied_url_value))
+        self.logger.error(PROXIED_CONNECT_ERROR.format(proxied_url_value))
 
     async def get_credentials(self, web_socket):
         credentials = await web_socket.recv()
-        self.logger.log(f"Credentials received from CLIENT [{credentials}]")
+        self.compression.discard_received(web_socket)
+        self.logger.log_payload("Credentials received from CLIENT", credentials)
 
         return credentials
 
-    def run(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+    def run(self, config_yaml: Union[dict[Hashable, any], list, None], config_path: str or None = None) -> None:
+        # with config_path, SIGHUP (and the file watcher, if configured) reload the config from that file
+        started_at = time.perf_counter()
+        self.config_path = config_path
         is_config_loaded = self.load_config_from_yaml(config_yaml)
 
         if not is_config_loaded:
             base.fatal_fail("Unable to load config file, can't parse the YAML!")
 
-        server = websockets.serve(self.proxy_dispatcher, self.host, self.port)
-        self.logger.log("Initializing PROXY SERVER")
-        asyncio.get_event_loop().run_until_complete(server)
-        asyncio.get_event_loop().run_forever()
+        self.logger.info("Initializing PROXY SERVER")
+        event_loop.run(self.serve_until_stopped(started_at), self.loop_factory)
+
+    async def serve_until_stopped(self, started_at: float) -> None:
+        server = await self.start_server()
+        self.startup_seconds = time.perf_counter() - started_at
+        self.logger.info(f"PROXY SERVER listening on {self.host}:{self.port} with "
+                         f"[{type(asyncio.get_running_loop()).__module__}] event loop, started in "
+                         f"[{self.startup_seconds * 1000:.1f}] ms")
+
+        stop_requested = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in self.stop_signals:
+            loop.add_signal_handler(signal_number, stop_requested.set)
+        reload_signals = (RELOAD_SIGNAL,) if self.config_path is not None and RELOAD_SIGNAL is not None else ()
+        for signal_number in reload_signals:
+            loop.add_signal_handler(signal_number, self.request_config_reload)
+        self.start_config_watcher()
+        try:
+            await stop_requested.wait()
+        finally:
+            for signal_number in (*self.stop_signals, *reload_signals):
+                loop.remove_signal_handler(signal_number)
+
+        await self.drain(server)
+
+    async def drain(self, server) -> None:
+        # new connections are refused right away; open sessions get drain_timeout seconds to finish on their own
+        self.logger.info(f"Stopping PROXY SERVER, draining [{len(self.sessions)}] open sessions for up to "
+                         f"[{self.drain_timeout}] s")
+        server.close(close_connections=False)
+
+        deadline = time.monotonic() + self.drain_timeout
+        while len(self.sessions) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if len(self.sessions):
+            await self.close_all_sessions()
+
+        await server.wait_closed()
+        await self.stop_background_tasks()
+        if self.stats_sink is not None:
+            # a worker's last report, so its final interval isn't lost from the supervisor's totals
+            self.stats_sink(self.get_stats())
+        self.logger.info(f"PROXY SERVER stopped. Final stats {self.get_stats()}")
+
+    async def stop_background_tasks(self) -> None:
+        if self.stats_task is not None:
+            self.stats_task.cancel()
+            await asyncio.gather(self.stats_task, return_exceptions=True)
+            self.stats_task = None
+        if self.loop_lag_monitor is not None:
+            await self.loop_lag_monitor.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        if self.upstream_multiplexer is not None:
+            await self.upstream_multiplexer.close()
+        if self.upstream_pool is not None:
+            await self.upstream_pool.close()
+        await self.session_timers.close()
+        if self.config_watcher is not None:
+            await self.config_watcher.close()
+        if self.config_reload_task is not None:
+            self.config_reload_task.cancel()
+            await asyncio.gather(self.config_reload_task, return_exceptions=True)
+            self.config_reload_task = None
+
+    async def start_server(self) -> any:
+        if self.upstream_pool is not None:
+            await self.upstream_pool.start()
+        if self.stats_sink is not None:
+            self.stats_task = asyncio.ensure_future(self.report_stats())
+        if self.loop_lag_monitor is not None:
+            self.loop_lag_monitor.start()
+        self.session_timers.start()
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+            self.logger.info(f"Serving metrics on http://{self.metrics_server.host}:{self.metrics_server.port}/metrics")
+
+        # websockets.serve needs a running loop in recent websockets releases, so it's awaited from here
+        serve_kwargs = self.get_client_leg_kwargs()
+        if self.connection_limiter.is_enabled():
+            serve_kwargs['process_request'] = self.refuse_when_saturated
+        return await websockets.serve(self.proxy_dispatcher, self.host, self.port, reuse_port=self.reuse_port or None,
+                                      **serve_kwargs)
+
+    def refuse_when_saturated(self, connection, request) -> any:
+        # with every slot taken and the wait queue full, refuse before the handshake rather than after it
+        if not self.connection_limiter.is_saturated():
+            return None
+        self.connection_limiter.rejected += 1
+        respond = getattr(connection, 'respond', None)
+        if respond is None:
+            # websockets < 13 calls process_request(path, headers) and takes a (status, headers, body) tuple
+            return http.HTTPStatus.SERVICE_UNAVAILABLE, [], f"{TOO_MANY_CONNECTIONS}\n".encode()
+        return respond(http.HTTPStatus.SERVICE_UNAVAILABLE, f"{TOO_MANY_CONNECTIONS}\n")
+
+    def get_client_leg_kwargs(self) -> dict:
+        return {**self.flow_control.client_limits.connection_kwargs(), **self.compression.server_kwargs(),
+                **self.session_timers.connection_kwargs()}
+
+    def get_proxied_leg_kwargs(self) -> dict:
+        return {**self.flow_control.proxied_limits.connection_kwargs(), **self.compression.client_kwargs()}
 
     async def process_requests(self, proxy_web_socket, proxied_web_socket, connection: WebSocketConnection) -> None:
+        if proxied_web_socket is None:
+            return
+
+        config = self.get_session_config(connection)
+        if config.forwarding_mode == "FULL_DUPLEX":
+            await self.process_requests_full_duplex(proxy_web_socket, proxied_web_socket, connection)
+            return
+
         while True:
-            request_for_proxy = await proxy_web_socket.recv()
-            self.logger.log(f"Received request from CLIENT [{request_for_proxy}")
+            try:
+                request_for_proxy = await connection.receive_from_client(proxy_web_socket)
+            except websockets.exceptions.ConnectionClosedOK:
+                return
+            self.logger.log_payload("Received request from CLIENT", request_for_proxy)
 
-            if self.is_close(request_for_proxy):
-                self.logger.log(f"Received CLOSE from CLIENT [{request_for_proxy}")
+            if config.control_classifier.is_close(request_for_proxy):
+                self.logger.log_payload("Received CLOSE from CLIENT", request_for_proxy)
                 return
 
-            if self.send_prefix is not None and self.send_suffix is not None:
-                request_for_proxy = "".join([self.send_prefix, request_for_proxy, self.send_suffix])
-            await send_to_web_socket_connection_aware(proxy_web_socket, proxied_web_socket, request_for_proxy)
-            connection.request_count += 1
+            received_at = time.perf_counter()
+            if connection.request_count >= config.requests_per_connection:
+                # rejected before forwarding so an upstream reply is never left unread on a pooled socket
+                await self.send_connection_limit_reject(proxy_web_socket, config.requests_per_connection)
+                return
+            if not await self.admit_client_message(proxy_web_socket, request_for_proxy, connection):
+                continue
+
+            request_for_proxy = config.message_wrapper.wrap(request_for_proxy)
+            response_from_proxy = await self.forward_request(
+                proxy_web_socket, proxied_web_socket, request_for_proxy, connection, received_at)
+            if response_from_proxy is None:
+                # dropped by flow control, so there's no response to wait for
+                await send_status(proxy_web_socket, self.status_responses.format("error", REQUEST_DROPPED))
+                continue
+
+            self.logger.log_payload("Received response from PROXIED SERVER", response_from_proxy)
+            received_at = time.perf_counter()
+            if await self.flow_control.send_to_client(proxy_web_socket, response_from_proxy):
+                self.record_proxied_to_client(response_from_proxy, received_at, connection)
+                self.logger.log_payload("Sending response to CLIENT", response_from_proxy)
+            await self.yield_turn(connection.request_count)
+
+    async def admit_client_message(self, proxy_web_socket, message, connection: WebSocketConnection) -> bool:
+        if self.rate_limiter is None:
+            return True
 
-            if connection.request_count > self.requests_per_connection:
-                await self.send_connection_limit_reject(proxy_web_socket)
+        # a fragmented message is still arriving: its bytes are charged once it's forwarded, and since its remaining
+        # frames would have to be read anyway it's delayed but never rejected
+        fragmented = isinstance(message, FragmentedMessage)
+        delay = self.rate_limiter.acquire(connection, 0 if fragmented else get_message_size(message), not fragmented)
+        if delay is None:
+            self.logger.log(f"Session [{connection.session_id}] {RATE_LIMIT_EXCEEDED}")
+            await send_status(proxy_web_socket, self.status_responses.format("error", RATE_LIMIT_EXCEEDED))
+            return False
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return True
+
+    async def yield_turn(self, message_count: int) -> None:
+        # recv and send don't suspend while a client's messages are already buffered, so a busy session would keep
+        # the loop to itself; every fairness_quantum messages it goes to the back of the queue
+        if self.fairness_quantum > 0 and message_count % self.fairness_quantum == 0:
+            await asyncio.sleep(0)
+
+    def record_client_to_proxied(self, message, received_at: float, connection: WebSocketConnection) -> None:
+        message_size = get_message_size(message)
+        connection.bytes_from_client += message_size
+        connection.last_activity_at = time.monotonic()
+        if self.rate_limiter is not None and isinstance(message, FragmentedMessage):
+            self.rate_limiter.charge(connection, message_size)
+
+        metrics = self.metrics
+        metrics.message_latency.observe(time.perf_counter() - received_at)
+        metrics.messages_client_to_proxied.inc()
+        metrics.bytes_client_to_proxied.inc(message_size)
+
+    def record_proxied_to_client(self, message, received_at: float, connection: WebSocketConnection) -> None:
+        message_size = get_message_size(message)
+        connection.response_count += 1
+        connection.bytes_to_client += message_size
+        connection.last_activity_at = time.monotonic()
+
+        metrics = self.metrics
+        metrics.message_latency.observe(time.perf_counter() - received_at)
+        metrics.messages_proxied_to_client.inc()
+        metrics.bytes_proxied_to_client.inc(message_size)
+
+    async def forward_request(self, proxy_web_socket, proxied_web_socket, request_for_proxy,
+                              connection: WebSocketConnection, received_at: float):
+        if connection.upstream_lock is None:
+            return await self.round_trip(proxy_web_socket, proxied_web_socket, request_for_proxy, connection,
+                                         received_at)
+
+        # shared pooled upstream: round trips take turns on its lock, and one without a reply evicts it
+        return await self.upstream_pool.exchange(connection.upstream_lease, functools.partial(
+            self.round_trip, proxy_web_socket, proxied_web_socket, request_for_proxy, connection, received_at))
+
+    async def round_trip(self, proxy_web_socket, proxied_web_socket, request_for_proxy,
+                         connection: WebSocketConnection, received_at: float):
+        if not await send_to_web_socket_connection_aware(
+                proxy_web_socket, proxied_web_socket, request_for_proxy,
+                self.status_responses.format("ok", PROXIED_CONNECTION_CLOSED), self.flow_control):
+            return None
+        self.record_client_to_proxied(request_for_proxy, received_at, connection)
+        connection.request_count += 1
+
+        if self.logger.is_enabled():
+            self.logger.log_payload(f"Sending request [{connection.request_count}] to PROXIED SERVER",
+                                    request_for_proxy)
+        return await connection.receive_from_proxied(proxied_web_socket)
+
+    async def process_requests_full_duplex(self, proxy_web_socket, proxied_web_socket,
+                                           connection: WebSocketConnection) -> None:
+        # both directions are pumped concurrently; whichever side finishes first tears down the other
+        client_pump = asyncio.ensure_future(
+            self.pump_client_to_proxied(proxy_web_socket, proxied_web_socket, connection))
+        proxied_pump = asyncio.ensure_future(
+            self.pump_proxied_to_client(proxy_web_socket, proxied_web_socket, connection))
+
+        done = set()
+        try:
+            done, _ = await asyncio.wait({client_pump, proxied_pump}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (client_pump, proxied_pump):
+                task.cancel()
+            await asyncio.gather(client_pump, proxied_pump, return_exceptions=True)
+            await proxied_web_socket.close()
+
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, websockets.exceptions.ConnectionClosed):
+                raise error
+
+    async def pump_client_to_proxied(self, proxy_web_socket, proxied_web_socket,
+                                     connection: WebSocketConnection) -> None:
+        config = self.get_session_config(connection)
+        while True:
+            try:
+                request_for_proxy = await connection.receive_from_client(proxy_web_socket)
+            except websockets.exceptions.ConnectionClosedOK:
                 return
+            self.logger.log_payload("Received request from CLIENT", request_for_proxy)
 
-            self.logger.log(
-                f"Sending request [{str(connection.request_count)}] to PROXIED SERVER [{request_for_proxy}]")
-            response_from_proxy = await proxied_web_socket.recv()
-            self.logger.log(f"Received response from PROXIED SERVER [{response_from_proxy}]")
-            await proxy_web_socket.send(response_from_proxy)
-            self.logger.log(f"Sending response to CLIENT [{response_from_proxy}]")
+            if config.control_classifier.is_close(request_for_proxy):
+                self.logger.log_payload("Received CLOSE from CLIENT", request_for_proxy)
+                return
 
-    async def send_connection_limit_reject(self, proxy_web_socket) -> None:
-        connection_limit_error = "Unable to proxy request, connection exceeds config limit of [" + str(
-            self.requests_per_connection) + "] requests per connection."
-        self.logger.log(connection_limit_error)
-        await proxy_web_socket.send(get_json_status_response("error", connection_limit_error))
+            received_at = time.perf_counter()
+            connection.request_count += 1
+            if connection.request_count > config.requests_per_connection:
+                await self.send_connection_limit_reject(proxy_web_socket, config.requests_per_connection)
+                return
+            if not await self.admit_client_message(proxy_web_socket, request_for_proxy, connection):
+                connection.request_count -= 1
+                continue
+
+            request_for_proxy = config.message_wrapper.wrap(request_for_proxy)
+            if self.logger.is_enabled():
+                self.logger.log_payload(f"Sending request [{connection.request_count}] to PROXIED SERVER",
+                                        request_for_proxy)
+            if await self.flow_control.send_to_proxied(proxied_web_socket, request_for_proxy):
+                self.record_client_to_proxied(request_for_proxy, received_at, connection)
+            await self.yield_turn(connection.request_count)
+
+    async def pump_proxied_to_client(self, proxy_web_socket, proxied_web_socket,
+                                     connection: WebSocketConnection) -> None:
+        while True:
+            try:
+                response_from_proxy = await connection.receive_from_proxied(proxied_web_socket)
+            except websockets.exceptions.ConnectionClosedOK:
+                break
+            self.logger.log_payload("Received response from PROXIED SERVER", response_from_proxy)
+            received_at = time.perf_counter()
+            if await self.flow_control.send_to_client(proxy_web_socket, response_from_proxy):
+                self.record_proxied_to_client(response_from_proxy, received_at, connection)
+            await self.yield_turn(connection.response_count)
+
+        self.logger.info("PROXIED SERVER closed the connection")
+        await send_status(proxy_web_socket, self.status_responses.format("ok", PROXIED_CONNECTION_CLOSED))
+
+    async def send_connection_limit_reject(self, proxy_web_socket, requests_per_connection: int) -> None:
+        self.logger.warning(CONNECTION_LIMIT_EXCEEDED.format(requests_per_connection))
+        await send_status(proxy_web_socket, self.status_responses.format("error", CONNECTION_LIMIT_EXCEEDED,
+                                                                         requests_per_connection))
 
     def load_authentication_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
         authentication_configuration = config_yaml['configuration']['authenticationConfiguration']
-        self.password = authentication_configuration['password']
+        self.users = dict(authentication_configuration.get('users') or {})
+        self.password = authentication_configuration.get('password')
+        self.dummy_password = create_dummy_password(self.users.values())
+
+        self.authenticator = None
+        authenticator_class = authentication_configuration.get('authenticatorClass')
+        if authenticator_class:
+            try:
+                self.authenticator = load_authenticator_class(authenticator_class)(authentication_configuration)
+            except (ImportError, AttributeError, TypeError) as error:
+                self.logger.error(f"Unable to load authenticator class [{authenticator_class}]: {error}")
+                base.fatal_fail(None)
+        elif self.password is None and not self.users and self.requires_authentication():
+            self.logger.error("authenticationConfiguration needs a password or users. Can't start server")
+            base.fatal_fail(None)
+
+        hashed_passwords = [password for password in [self.password, *self.users.values()]
+                            if isinstance(password, str) and password.startswith(PBKDF2_SCHEME + "$")]
+        self.authenticate_in_thread = self.authenticator is not None or bool(hashed_passwords)
+
+        session_token_configuration = authentication_configuration.get('sessionTokens') or {}
+        self.session_tokens = None
+        if session_token_configuration.get('enabled', False):
+            self.session_tokens = SessionTokenCache(float(session_token_configuration.get('ttl', 300)),
+                                                    int(session_token_configuration.get('maxTokens', 10000)))
 
     def load_transport_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
         transport_configuration = config_yaml['configuration']['transportConfiguration']
         self.send_prefix = transport_configuration['sendPrefix']
         self.send_suffix = transport_configuration['sendSuffix']
+        self.message_wrapper = MessageWrapper(self.send_prefix, self.send_suffix)
+        self.forwarding_mode = transport_configuration.get('forwardingMode', "REQUEST_RESPONSE")
+        self.control_classifier = ControlMessageClassifier(
+            bool(transport_configuration.get('controlMessages', True)),
+            transport_configuration.get('controlPrefix', ""))
+        if not self.has_valid_forwarding_mode():
+            self.logger.error(f"Forwarding mode value [{self.forwarding_mode}] in config is invalid. "
+                              f"Can't start server")
+            base.fatal_fail(None)
 
     def load_server_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
         server_config = config_yaml['configuration']['serverConfiguration']
@@ -207,8 +789,9 @@ class WebSocketProxpy:
         self.port = int(server_config['port'])
         self.serverType = server_config['type']
         self.requests_per_connection = int(server_config['requestsPerConnection'])
+        self.stats_interval = float(server_config.get('statsInterval', 5))
         if not self.has_valid_server_type():
-            self.logger.log(f"Server type value [{self.serverType}] in config is invalid. Can't start server")
+            self.logger.error(f"Server type value [{self.serverType}] in config is invalid. Can't start server")
             base.fatal_fail(None)
 
         if self.is_forced_url_server() or self.is_forced_url_no_password_server():
@@ -216,9 +799,215 @@ class WebSocketProxpy:
 
             if self.proxied_url is None or self.proxied_url == "":
                 error_message = "Proxied url in config missing--required when running in FORCED_URL mode."
-                self.logger.log(error_message)
+                self.logger.error(error_message)
                 base.fatal_fail(None)
 
+    def load_flow_control_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        flow_control_configuration = config_yaml['configuration'].get('flowControlConfiguration') or {}
+        policy = flow_control_configuration.get('policy', "PAUSE")
+
+        if policy not in FlowControl.POLICIES:
+            self.logger.error(f"Flow control policy [{policy}] in config is invalid. Can't start server")
+            base.fatal_fail(None)
+
+        self.flow_control = FlowControl(LegLimits.from_yaml(flow_control_configuration.get('client')),
+                                        LegLimits.from_yaml(flow_control_configuration.get('proxied')),
+                                        policy)
+
+    def load_compression_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        compression_configuration = config_yaml['configuration'].get('compressionConfiguration') or {}
+        client = LegCompression.from_yaml(compression_configuration.get('client'))
+        proxied = LegCompression.from_yaml(compression_configuration.get('proxied'))
+        passthrough = bool(compression_configuration.get('passthrough', False))
+
+        if passthrough and not (client.enabled and proxied.enabled):
+            self.logger.error("Compression passthrough needs compression enabled on both the client and proxied leg")
+            base.fatal_fail(None)
+        if passthrough and not self.message_wrapper.is_empty:
+            self.logger.error("Compression passthrough can't be combined with sendPrefix/sendSuffix")
+            base.fatal_fail(None)
+
+        try:
+            self.compression = CompressionControl(client, proxied, passthrough)
+            # builds the extension factories once, so out-of-range window bits fail here rather than per connection
+            self.get_client_leg_kwargs()
+            self.get_proxied_leg_kwargs()
+        except ValueError as error:
+            self.logger.error(f"Invalid compression config: {error}")
+            base.fatal_fail(None)
+
+    def load_destination_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        destination_configuration = config_yaml['configuration'].get('destinationConfiguration') or {}
+        self.destination_policy = None
+
+        if not self.is_open_url_server():
+            return
+
+        try:
+            self.destination_policy = DestinationPolicy(
+                functools.partial(websockets.connect, **self.get_proxied_leg_kwargs()),
+                destination_configuration.get('allowedDestinations') or [],
+                DnsCache(ttl=float(destination_configuration.get('dnsCacheTtl', 30)),
+                         negative_ttl=float(destination_configuration.get('dnsNegativeTtl', 5)),
+                         max_size=int(destination_configuration.get('dnsCacheSize', 1024))),
+                CircuitBreaker(failure_threshold=int(destination_configuration.get('failureThreshold', 5)),
+                               cooldown=float(destination_configuration.get('breakerCooldown', 10))))
+        except ValueError as error:
+            self.logger.error(f"Invalid destination config: {error}")
+            base.fatal_fail(None)
+
+    def get_upstream_connect(self):
+        if self.destination_policy is not None:
+            return self.destination_policy.connect
+        return functools.partial(websockets.connect, **self.get_proxied_leg_kwargs())
+
+    def load_status_responses_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        status_configuration = config_yaml['configuration']['transportConfiguration'].get('statusResponses') or {}
+        self.status_responses = StatusResponses(int(status_configuration.get('cacheSize', 256)),
+                                                bool(status_configuration.get('preEncoded', False)))
+        self.pin_status_responses()
+
+    def pin_status_responses(self) -> None:
+        # everything the config fixes is rendered once here rather than per session
+        status_responses = self.status_responses
+        self.authenticated_message = "Authenticated " + self.get_post_authentication_directions()
+        status_responses.pin("ok", self.authenticated_message)
+        status_responses.pin("ok", PROXIED_CONNECTION_CLOSED)
+        status_responses.pin("error", CONNECTION_LIMIT_EXCEEDED, self.requests_per_connection)
+        status_responses.pin("error", WSS_NOT_SUPPORTED)
+        status_responses.pin("error", URL_NOT_WS)
+        if not self.is_open_url_server():
+            status_responses.pin("ok", PROXIED_CONNECTION_OPEN, self.proxied_url)
+            status_responses.pin("error", PROXIED_CONNECT_ERROR, self.proxied_url)
+
+    def load_multiplex_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        multiplex_configuration = config_yaml['configuration'].get('multiplexConfiguration') or {}
+        self.upstream_multiplexer = None
+
+        if not multiplex_configuration.get('enabled', False):
+            return
+
+        if self.upstream_pool is not None:
+            self.logger.error("Multiplexing can't be combined with upstreamPool, enable only one of them")
+            base.fatal_fail(None)
+
+        if self.compression.passthrough:
+            self.logger.error("Multiplexing can't be combined with compression passthrough")
+            base.fatal_fail(None)
+
+        try:
+            envelope = ChannelEnvelope(multiplex_configuration.get('channelPrefix', "{channel}:"),
+                                       multiplex_configuration.get('channelSuffix', ""))
+        except ValueError as error:
+            self.logger.error(f"Invalid multiplex envelope in config: {error}")
+            base.fatal_fail(None)
+            return
+
+        self.upstream_multiplexer = UpstreamMultiplexer(
+            self.get_upstream_connect(),
+            envelope,
+            max_upstreams_per_url=int(multiplex_configuration.get('maxUpstreamsPerUrl', 1)),
+            max_channels_per_upstream=int(multiplex_configuration.get('maxChannelsPerUpstream', 1000)),
+            channel_queue_size=int(multiplex_configuration.get('channelQueueSize', 64)),
+            idle_timeout=float(multiplex_configuration.get('idleTimeout', 10)))
+
+    def load_timeout_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        timeout_configuration = config_yaml['configuration'].get('timeoutConfiguration') or {}
+        self.session_timers = SessionTimers(
+            self.sessions, self.logger,
+            handshake_timeout=float(timeout_configuration.get('handshakeTimeout', 30)),
+            idle_timeout=float(timeout_configuration.get('idleTimeout', 0)),
+            max_lifetime=float(timeout_configuration.get('maxLifetime', 0)),
+            ping_interval=float(timeout_configuration.get('pingInterval', 20)),
+            ping_timeout=float(timeout_configuration.get('pingTimeout', 20)),
+            resolution=float(timeout_configuration.get('resolution', 0.5)),
+            ping_proxied=self.upstream_multiplexer is None)
+
+        if self.session_timers.resolution <= 0:
+            self.logger.error("timeoutConfiguration.resolution must be above 0. Can't start server")
+            base.fatal_fail(None)
+
+    def load_rate_limit_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        rate_limit_configuration = config_yaml['configuration'].get('rateLimitConfiguration') or {}
+        try:
+            self.rate_limiter = RateLimiter(RateLimit.from_yaml(rate_limit_configuration.get('session')),
+                                            RateLimit.from_yaml(rate_limit_configuration.get('perIp')),
+                                            RateLimit.from_yaml(rate_limit_configuration.get('global')),
+                                            int(rate_limit_configuration.get('maxTrackedIps', 10000)),
+                                            float(rate_limit_configuration.get('maxDelay', 1.0)))
+        except ValueError as error:
+            self.logger.error(f"Invalid rate limit config: {error}")
+            base.fatal_fail(None)
+        if not self.rate_limiter.is_enabled():
+            self.rate_limiter = None
+
+        self.connection_limiter = ConnectionLimiter(int(rate_limit_configuration.get('maxConnections', 0)),
+                                                    int(rate_limit_configuration.get('maxPendingConnections', 0)),
+                                                    float(rate_limit_configuration.get('connectionQueueTimeout', 5)))
+        self.fairness_quantum = int(rate_limit_configuration.get('fairnessQuantum', 8))
+
+    def load_metrics_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        metrics_configuration = config_yaml['configuration'].get('metricsConfiguration') or {}
+        self.metrics_server = None
+
+        if metrics_configuration.get('enabled', False):
+            self.metrics_server = MetricsServer(self.metrics, metrics_configuration.get('listenHost', "127.0.0.1"),
+                                                int(metrics_configuration.get('port', 9100)) + self.metrics_port_offset)
+
+    def load_event_loop_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        event_loop_configuration = config_yaml['configuration'].get('eventLoopConfiguration') or {}
+        self.loop_backend = event_loop_configuration.get('backend', "AUTO")
+        self.drain_timeout = float(event_loop_configuration.get('drainTimeout', 10))
+
+        if self.loop_backend not in event_loop.LOOP_BACKENDS:
+            self.logger.error(f"Event loop backend [{self.loop_backend}] in config is invalid. Can't start server")
+            base.fatal_fail(None)
+
+        self.loop_factory = event_loop.get_loop_factory(self.loop_backend)
+        if self.loop_factory is None and self.loop_backend == "UVLOOP":
+            self.logger.error("Event loop backend UVLOOP requires the 'uvloop' library (pip install uvloop)")
+            base.fatal_fail(None)
+
+        lag_monitor_configuration = event_loop_configuration.get('lagMonitor') or {}
+        self.loop_lag_monitor = None
+        if lag_monitor_configuration.get('enabled', True):
+            self.loop_lag_monitor = event_loop.LoopLagMonitor(
+                self.logger, float(lag_monitor_configuration.get('interval', 0.5)),
+                float(lag_monitor_configuration.get('threshold', 0.1)), self.metrics.loop_lag)
+
+    def load_upstream_pool_config_from_yaml(self, config_yaml: Union[dict[Hashable, any], list, None]) -> None:
+        pool_configuration = config_yaml['configuration']['serverConfiguration'].get('upstreamPool')
+        self.upstream_pool = None
+
+        if not pool_configuration or not pool_configuration.get('enabled', False):
+            return
+
+        if self.is_open_url_server():
+            self.logger.warning("Upstream pool is only available in FORCED_URL modes, ignoring upstreamPool config")
+            return
+
+        if self.compression.passthrough:
+            # a pooled upstream's inflate context carries over from earlier sessions
+            self.logger.error("Upstream pool can't be combined with compression passthrough")
+            base.fatal_fail(None)
+
+        shared = pool_configuration.get('mode', "DEDICATED") == "SHARED"
+        if shared and self.is_full_duplex_forwarding():
+            self.logger.error("Upstream pool mode SHARED can't be combined with FULL_DUPLEX forwarding")
+            base.fatal_fail(None)
+
+        self.upstream_pool = UpstreamPool(
+            self.proxied_url,
+            functools.partial(websockets.connect, **self.get_proxied_leg_kwargs()),
+            min_size=int(pool_configuration.get('minSize', 1)),
+            max_size=int(pool_configuration.get('maxSize', 10)),
+            idle_timeout=float(pool_configuration.get('idleTimeout', 60)),
+            health_check_interval=float(pool_configuration.get('healthCheckInterval', 15)),
+            ping_timeout=float(pool_configuration.get('pingTimeout', 5)),
+            acquire_timeout=float(pool_configuration.get('acquireTimeout', 10)),
+            shared=shared,
+            response_timeout=float(pool_configuration.get('responseTimeout', 30)))
+
     def get_post_authentication_directions(self) -> str:
         authentication_message = "Authenticated. "
 
@@ -232,34 +1021,151 @@ class WebSocketProxpy:
     def has_valid_server_type(self) -> bool:
         return self.is_open_url_server() or self.is_forced_url_server() or self.is_forced_url_no_password_server()
 
-    async def get_proxy_url_from_client(self, proxy_web_socket) -> str:
+    def has_valid_forwarding_mode(self) -> bool:
+        return self.forwarding_mode in ("REQUEST_RESPONSE", "FULL_DUPLEX")
+
+    async def get_proxy_url_from_client(self, proxy_web_socket) -> str or None:
         proxied_url_json = await proxy_web_socket.recv()
+        self.compression.discard_received(proxy_web_socket)
         proxied_url_value = self.parse_destination_url(proxied_url_json)
-        self.logger.log(f"PROXIED SERVER url received [{proxied_url_value}]")
+        self.logger.info(f"PROXIED SERVER url received [{proxied_url_value}]")
 
         if proxied_url_value is None:
             url_missing_message = f"Couldn't establish proxy. Url not provided in [{proxied_url_json}]"
-            await proxy_web_socket.send(get_json_status_response("error", url_missing_message))
+            await send_status(proxy_web_socket, self.status_responses.render("error", url_missing_message))
+            return None
 
         if proxied_url_value.startswith("wss://"):
-            await proxy_web_socket.send(get_json_status_response("error", "WSS not yet supported"))
-        elif not proxied_url_value.startswith("ws://"):
-            await proxy_web_socket.send(get_json_status_response("error", "URL must start with ws://"))
+            await send_status(proxy_web_socket, self.status_responses.format("error", WSS_NOT_SUPPORTED))
+            return None
+        if not proxied_url_value.startswith("ws://"):
+            await send_status(proxy_web_socket, self.status_responses.format("error", URL_NOT_WS))
+            return None
+
+        rejection = self.destination_policy.check_url(proxied_url_value) if self.destination_policy else None
+        if rejection is not None:
+            self.logger.warning(f"PROXIED SERVER url [{proxied_url_value}] rejected: {rejection}")
+            await send_status(proxy_web_socket, self.status_responses.format("error", DESTINATION_REJECTED, rejection))
+            return None
 
         return proxied_url_value
 
-    async def connect_to_proxy_server(self, proxied_url_value: str, proxy_web_socket) -> any:
+    async def connect_to_proxy_server(self, proxied_url_value: str, proxy_web_socket,
+                                      connection: WebSocketConnection) -> any:
+        connect_started = time.perf_counter()
         try:
-            proxied_web_socket = await websockets.connect(proxied_url_value)
-        except ConnectionRefusedError:
+            proxied_web_socket = await self.open_proxied_web_socket(proxied_url_value, connection)
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.InvalidHandshake):
+            self.metrics.upstream_connect_errors.inc()
             await self.respond_with_proxy_connect_error(proxied_url_value, proxy_web_socket)
             return
-        self.logger.log("Established proxied connection with PROXIED SERVER [" + proxied_url_value + "]")
+        self.metrics.upstream_connect_time.observe(time.perf_counter() - connect_started)
+        self.logger.info("Established proxied connection with PROXIED SERVER [" + proxied_url_value + "]")
 
-        connection_open_message = "Proxied connection [" + proxied_url_value + "] open for arbitrary requests.'"
-        await proxy_web_socket.send(get_json_status_response("ok", connection_open_message))
+        try:
+            await send_status(proxy_web_socket,
+                              self.status_responses.format("ok", PROXIED_CONNECTION_OPEN, proxied_url_value))
+        except websockets.exceptions.ConnectionClosed:
+            # the client left, or timed out, while the upstream was connecting
+            await self.disconnect_from_proxy_server(proxied_web_socket, connection)
+            raise
 
         return proxied_web_socket
 
+    async def open_proxied_web_socket(self, proxied_url_value: str, connection: WebSocketConnection) -> any:
+        if self.upstream_multiplexer is not None:
+            return await self.upstream_multiplexer.open_channel(proxied_url_value)
+
+        # a session's own upstream is kept alive by the session timers; pooled and multiplexed ones ping themselves
+        if self.destination_policy is not None:
+            return await self.destination_policy.connect(proxied_url_value, **self.session_timers.connection_kwargs())
+
+        if self.upstream_pool is None or proxied_url_value != self.upstream_pool.url:
+            return await websockets.connect(proxied_url_value, **self.get_proxied_leg_kwargs(),
+                                            **self.session_timers.connection_kwargs())
+
+        connection.upstream_lease = await self.upstream_pool.acquire()
+        if self.upstream_pool.shared:
+            connection.upstream_lock = connection.upstream_lease.lock
+        return connection.upstream_lease.socket
+
+    async def disconnect_from_proxy_server(self, proxied_web_socket, connection: WebSocketConnection) -> None:
+        if connection.upstream_lease is None:
+            await proxied_web_socket.close()
+            return
+
+        lease, connection.upstream_lease, connection.upstream_lock = connection.upstream_lease, None, None
+        await self.upstream_pool.release(lease)
+
+    def get_upstream_pool_stats(self) -> dict or None:
+        if self.upstream_pool is None:
+            return None
+        return self.upstream_pool.get_stats()
+
+    def get_stats(self) -> dict:
+        stats = {
+            'activeSessions': len(self.sessions),
+            'totalSessions': self.total_sessions,
+        }
+        stats.update(self.flow_control.get_stats())
+        stats.update(self.compression.get_stats())
+        stats.update(self.get_buffered_bytes_stats())
+        upstream_pool_stats = self.get_upstream_pool_stats()
+        if upstream_pool_stats is not None:
+            stats['upstreamPool'] = upstream_pool_stats
+        if self.upstream_multiplexer is not None:
+            stats['upstreamMultiplexer'] = self.upstream_multiplexer.get_stats()
+        if self.destination_policy is not None:
+            stats['destinations'] = self.destination_policy.get_stats()
+        stats.update(self.status_responses.get_stats())
+        stats.update(self.session_timers.get_stats())
+        stats.update(self.connection_limiter.get_stats())
+        if self.rate_limiter is not None:
+            stats.update(self.rate_limiter.get_stats())
+        stats['configReloads'] = self.config_reloads
+        stats['configReloadFailures'] = self.config_reload_failures
+        if self.loop_lag_monitor is not None:
+            stats.update(self.loop_lag_monitor.get_stats())
+        if self.session_tokens is not None:
+            stats['sessionTokens'] = self.session_tokens.get_stats()
+        return stats
+
+    def get_buffered_bytes_stats(self) -> dict:
+        client_buffered = [get_buffered_bytes(connection.proxy_web_socket) for connection in self.sessions]
+        proxied_buffered = [get_buffered_bytes(connection.proxied_web_socket) for connection in self.sessions
+                            if connection.proxied_web_socket is not None]
+        return {
+            'clientBufferedBytes': sum(client_buffered),
+            'clientBufferedBytesMax': max(client_buffered, default=0),
+            'proxiedBufferedBytes': sum(proxied_buffered),
+            'proxiedBufferedBytesMax': max(proxied_buffered, default=0),
+        }
+
+    @staticmethod
+    def get_connection_buffered_bytes(connection: WebSocketConnection) -> tuple[int, int]:
+        proxied_buffered = 0
+        if connection.proxied_web_socket is not None:
+            proxied_buffered = get_buffered_bytes(connection.proxied_web_socket)
+        return get_buffered_bytes(connection.proxy_web_socket), proxied_buffered
+
+    def describe_sessions(self) -> list[dict]:
+        # one entry per open session, with the bytes each of its legs has waiting in its write buffer
+        descriptions = []
+        for connection in self.sessions:
+            description = connection.describe()
+            description['clientBufferedBytes'], description['proxiedBufferedBytes'] = \
+                self.get_connection_buffered_bytes(connection)
+            descriptions.append(description)
+        return descriptions
+
+    async def close_all_sessions(self) -> None:
+        self.logger.info(f"Closing [{len(self.sessions)}] open sessions")
+        await self.sessions.close_all()
+
+    async def report_stats(self) -> None:
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.stats_sink(self.get_stats())
+
     def requires_authentication(self) -> bool:
         return not self.is_forced_url_no_password_server()
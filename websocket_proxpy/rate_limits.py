@@ -0,0 +1,222 @@
+import asyncio
+import collections
+import time
+from typing import Callable, NamedTuple
+
+
+class TokenBucket:
+    """
+    rate tokens a second, up to burst. Tokens are taken before the message they pay for is forwarded and may go
+    negative: the debt is what later messages wait out, so callers sharing a bucket are served in arrival order.
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def get_delay(self, amount: float, now: float) -> float:
+        tokens = self.tokens + (now - self.updated_at) * self.rate
+        self.tokens = tokens if tokens < self.burst else self.burst
+        self.updated_at = now
+        # a message bigger than the burst goes through once the bucket is full, and leaves it in debt
+        shortfall = min(amount, self.burst) - self.tokens
+        return shortfall / self.rate if shortfall > 0 else 0.0
+
+
+class RateLimit(NamedTuple):
+    """Messages and bytes per second for one scope (a session, a client IP or the whole proxy); 0 disables either."""
+    messages_per_second: float = 0.0
+    bytes_per_second: float = 0.0
+    # 0 allows one second's worth
+    message_burst: float = 0.0
+    byte_burst: float = 0.0
+
+    @classmethod
+    def from_yaml(cls, limit_configuration: dict or None) -> 'RateLimit':
+        limit_configuration = limit_configuration or {}
+        limit = cls(*(float(limit_configuration.get(key, 0)) for key in
+                      ('messagesPerSecond', 'bytesPerSecond', 'messageBurst', 'byteBurst')))
+        if any(value < 0 for value in limit):
+            raise ValueError("Rate limits can't be negative")
+        return limit
+
+    def is_enabled(self) -> bool:
+        return self.messages_per_second > 0 or self.bytes_per_second > 0
+
+    def create_buckets(self, now: float) -> tuple[TokenBucket or None, TokenBucket or None]:
+        message_bucket = None
+        byte_bucket = None
+        if self.messages_per_second > 0:
+            message_bucket = TokenBucket(self.messages_per_second, self.message_burst or self.messages_per_second, now)
+        if self.bytes_per_second > 0:
+            byte_bucket = TokenBucket(self.bytes_per_second, self.byte_burst or self.bytes_per_second, now)
+        return message_bucket, byte_bucket
+
+
+class RateLimiter:
+    """
+    Token buckets for client messages per session, per client IP and for the whole proxy, checked before a message
+    is forwarded. A message that finds a bucket empty waits until its tokens are due, or is rejected if that is more
+    than max_delay seconds away (right away with max_delay 0). Session buckets live on the session; IP buckets are
+    kept for the max_tracked_ips most recently active addresses, so every check is O(1) and the table stays bounded.
+    """
+
+    def __init__(self, session_limit: RateLimit = RateLimit(), ip_limit: RateLimit = RateLimit(),
+                 global_limit: RateLimit = RateLimit(), max_tracked_ips: int = 10000, max_delay: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.session_limit = session_limit
+        self.ip_limit = ip_limit
+        self.max_tracked_ips = max_tracked_ips
+        self.max_delay = max_delay
+        self.clock = clock
+        self.global_buckets = global_limit.create_buckets(clock()) if global_limit.is_enabled() else None
+        # client IP -> (message bucket, byte bucket), least recently active first
+        self.ip_buckets = collections.OrderedDict()
+        self.delayed = 0
+        self.rejected = 0
+        self.evicted_ips = 0
+
+    def is_enabled(self) -> bool:
+        return self.session_limit.is_enabled() or self.ip_limit.is_enabled() or self.global_buckets is not None
+
+    def acquire(self, connection, size: int, may_reject: bool = True) -> float or None:
+        """Takes a message of size bytes from every bucket of the session; returns the seconds to wait before
+        forwarding it, or None if it's rejected."""
+        now = self.clock()
+        scopes = self.get_scopes(connection, now)
+
+        delay = 0.0
+        for message_bucket, byte_bucket in scopes:
+            if message_bucket is not None:
+                delay = max(delay, message_bucket.get_delay(1, now))
+            if byte_bucket is not None:
+                delay = max(delay, byte_bucket.get_delay(size, now))
+
+        if delay > self.max_delay:
+            if may_reject:
+                self.rejected += 1
+                return None
+            delay = self.max_delay
+
+        for message_bucket, byte_bucket in scopes:
+            if message_bucket is not None:
+                message_bucket.tokens -= 1
+            if byte_bucket is not None:
+                byte_bucket.tokens -= size
+        if delay > 0:
+            self.delayed += 1
+        return delay
+
+    def charge(self, connection, size: int) -> None:
+        # bytes of a message whose size was only known once it had been forwarded
+        for _, byte_bucket in self.get_scopes(connection, self.clock()):
+            if byte_bucket is not None:
+                byte_bucket.tokens -= size
+
+    def get_scopes(self, connection, now: float) -> list[tuple]:
+        scopes = []
+        if self.session_limit.is_enabled():
+            if connection.rate_buckets is None:
+                connection.rate_buckets = self.session_limit.create_buckets(now)
+            scopes.append(connection.rate_buckets)
+        if self.ip_limit.is_enabled():
+            scopes.append(self.get_ip_buckets(connection.client_address[0] if connection.client_address else None,
+                                              now))
+        if self.global_buckets is not None:
+            scopes.append(self.global_buckets)
+        return scopes
+
+    def get_ip_buckets(self, ip: str or None, now: float) -> tuple:
+        buckets = self.ip_buckets.get(ip)
+        if buckets is not None:
+            self.ip_buckets.move_to_end(ip)
+            return buckets
+
+        buckets = self.ip_limit.create_buckets(now)
+        self.ip_buckets[ip] = buckets
+        if len(self.ip_buckets) > self.max_tracked_ips:
+            self.ip_buckets.popitem(last=False)
+            self.evicted_ips += 1
+        return buckets
+
+    def get_stats(self) -> dict:
+        return {
+            'rateLimitDelayed': self.delayed,
+            'rateLimitRejected': self.rejected,
+            'rateLimitTrackedIps': len(self.ip_buckets),
+            'rateLimitEvictedIps': self.evicted_ips,
+        }
+
+
+class ConnectionLimiter:
+    """
+    At most max_connections sessions at a time. Connections over the cap wait for a slot in arrival order, up to
+    queue_timeout seconds and at most max_pending of them; is_saturated() lets the server refuse further connections
+    before their handshake. A max_connections of 0 disables the cap.
+    """
+
+    def __init__(self, max_connections: int = 0, max_pending: int = 0, queue_timeout: float = 5.0) -> None:
+        self.max_connections = max_connections
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        # waiters for a slot; ones that gave up stay in the deque, done, until release() reaches them
+        self.waiters = collections.deque()
+        self.pending = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def is_enabled(self) -> bool:
+        return self.max_connections > 0
+
+    def is_saturated(self) -> bool:
+        return self.is_enabled() and self.active >= self.max_connections and self.pending >= self.max_pending
+
+    async def acquire(self) -> bool:
+        if not self.is_enabled():
+            return True
+        if self.active < self.max_connections and not self.pending:
+            self.active += 1
+            return True
+        if self.pending >= self.max_pending or self.queue_timeout <= 0:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.pending += 1
+        self.queued += 1
+        try:
+            # release() hands its slot straight to the waiter, so active already counts it
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # cancelled just as the slot was handed over; pass it on
+                self.release()
+            raise
+        finally:
+            self.pending -= 1
+
+    def release(self) -> None:
+        if not self.is_enabled():
+            return
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def get_stats(self) -> dict:
+        return {
+            'connectionsQueued': self.queued,
+            'connectionsWaiting': self.pending,
+            'connectionsRejected': self.rejected,
+        }
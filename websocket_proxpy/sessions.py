@@ -0,0 +1,101 @@
+import asyncio
+import itertools
+import time
+
+from websocket_proxpy.transport import receive_message
+
+
+class WebSocketConnection:
+    """
+    Per-session state. Slotted because the proxy holds one of these for every open client socket, most of them idle:
+    an instance is just one pointer per slot, with no per-instance __dict__, roughly half the size of an equivalent
+    dict-backed object (see test/sessions_tests.py).
+    """
+    __slots__ = ('session_id', 'client_address', 'upstream_url', 'credentials', 'request_count', 'response_count',
+                 'bytes_from_client', 'bytes_to_client', 'connected_at', 'last_activity_at', 'proxy_web_socket',
+                 'proxied_web_socket', 'upstream_lease', 'upstream_lock', 'receive_from_client',
+                 'receive_from_proxied', 'user', 'timer_deadline', 'keepalive', 'config', 'rate_buckets')
+
+    def __init__(self, session_id: int = 0, proxy_web_socket=None, client_address: tuple or None = None) -> None:
+        self.session_id = session_id
+        self.client_address = client_address
+        self.upstream_url = None
+        self.credentials = ""
+        self.user = None
+        # SessionConfig snapshot the session started with; config reloads don't touch it
+        self.config = None
+        self.request_count = 0
+        self.response_count = 0
+        self.bytes_from_client = 0
+        self.bytes_to_client = 0
+        self.connected_at = time.monotonic()
+        self.last_activity_at = self.connected_at
+        self.proxy_web_socket = proxy_web_socket
+        self.proxied_web_socket = None
+        self.upstream_lease = None
+        self.upstream_lock = None
+        # swapped per session when compression passthrough needs to know which messages are still compressed
+        self.receive_from_client = receive_message
+        self.receive_from_proxied = receive_message
+        # SessionTimers state: deadline of the session's live heap entry, and (pinged_at, pong waiters)
+        self.timer_deadline = None
+        self.keepalive = None
+        # the session's (message, byte) token buckets, created by RateLimiter on the first message
+        self.rate_buckets = None
+
+    def get_owned_sockets(self) -> list:
+        # a pooled upstream belongs to the pool and outlives the session
+        sockets = [self.proxy_web_socket]
+        if self.proxied_web_socket is not None and self.upstream_lease is None:
+            sockets.append(self.proxied_web_socket)
+        return [web_socket for web_socket in sockets if web_socket is not None]
+
+    async def close_sockets(self, code: int = 1000, reason: str = "") -> None:
+        await asyncio.gather(*(web_socket.close(code, reason) for web_socket in self.get_owned_sockets()),
+                             return_exceptions=True)
+
+    def describe(self) -> dict:
+        now = time.monotonic()
+        return {
+            'sessionId': self.session_id,
+            'clientAddress': self.client_address,
+            'upstreamUrl': self.upstream_url,
+            'user': self.user,
+            'configGeneration': self.config.generation if self.config is not None else None,
+            'requests': self.request_count,
+            'responses': self.response_count,
+            'bytesFromClient': self.bytes_from_client,
+            'bytesToClient': self.bytes_to_client,
+            'age': now - self.connected_at,
+            'idle': now - self.last_activity_at,
+        }
+
+
+class SessionRegistry:
+    """Live sessions keyed by session id: O(1) register/unregister/lookup, iteration for admin and metrics."""
+
+    def __init__(self) -> None:
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+
+    def open(self, proxy_web_socket) -> WebSocketConnection:
+        connection = WebSocketConnection(next(self.session_ids), proxy_web_socket,
+                                         getattr(proxy_web_socket, 'remote_address', None))
+        self.sessions[connection.session_id] = connection
+        return connection
+
+    def close(self, connection: WebSocketConnection) -> None:
+        self.sessions.pop(connection.session_id, None)
+
+    def get(self, session_id: int) -> WebSocketConnection or None:
+        return self.sessions.get(session_id)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    async def close_all(self, code: int = 1001, reason: str = "Proxy shutting down") -> None:
+        await asyncio.gather(*(connection.close_sockets(code, reason) for connection in self),
+                             return_exceptions=True)
@@ -0,0 +1,189 @@
+import asyncio
+import heapq
+import time
+from typing import Callable
+
+import websockets.exceptions
+
+from websocket_proxpy.sessions import SessionRegistry, WebSocketConnection
+
+HANDSHAKE_TIMEOUT = (1000, "Handshake timeout")
+IDLE_TIMEOUT = (1000, "Session idle timeout")
+LIFETIME_EXCEEDED = (1000, "Session lifetime exceeded")
+KEEPALIVE_TIMEOUT = (1011, "keepalive ping timeout")
+
+
+class SessionTimers:
+    """
+    Handshake deadline, idle timeout, maximum lifetime and keepalive pings for every session, driven by one heap and
+    one task instead of a timer task per session. A session has one live heap entry, at its next deadline; when that
+    comes due the session is checked against all of its limits and pushed back at the following one. Forwarding a
+    message only updates last_activity_at, so the heap is never touched on the forwarding path. A value of 0
+    disables a limit.
+
+    The handshake lasts from the client connecting until its proxied connection is open, so it covers the
+    credentials, the url in OPEN_URL mode and the upstream connect. Keepalive pings go to the client and, unless it's
+    pooled or multiplexed, the proxied leg; websockets' own per-connection keepalive is turned off for those.
+    """
+
+    def __init__(self, sessions: SessionRegistry, logger, handshake_timeout: float = 30.0, idle_timeout: float = 0.0,
+                 max_lifetime: float = 0.0, ping_interval: float = 20.0, ping_timeout: float = 20.0,
+                 resolution: float = 0.5, ping_proxied: bool = True,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.sessions = sessions
+        self.logger = logger
+        self.handshake_timeout = handshake_timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.resolution = resolution
+        self.ping_proxied = ping_proxied
+        self.clock = clock
+        # (deadline, session id); entries of closed sessions, or superseded by an earlier connection.timer_deadline,
+        # are dropped when they come due
+        self.heap = []
+        self.task = None
+        self.pending = set()
+        self.handshake_timeouts = 0
+        self.idle_timeouts = 0
+        self.lifetime_expirations = 0
+        self.keepalive_failures = 0
+        self.pings_sent = 0
+
+    def is_enabled(self) -> bool:
+        return any(limit > 0 for limit in (self.handshake_timeout, self.idle_timeout, self.max_lifetime,
+                                           self.ping_interval))
+
+    @staticmethod
+    def connection_kwargs() -> dict:
+        return {'ping_interval': None}
+
+    def start(self) -> None:
+        if self.task is None and self.is_enabled():
+            self.task = asyncio.ensure_future(self.run())
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, *self.pending, return_exceptions=True)
+            self.task = None
+
+    def track(self, connection: WebSocketConnection) -> None:
+        # called when the session opens and once its proxied connection is open, which may bring deadlines forward
+        deadline = self.get_next_deadline(connection, self.clock())
+        if deadline is not None and (connection.timer_deadline is None or deadline < connection.timer_deadline):
+            self.push(connection, deadline)
+
+    def schedule(self, connection: WebSocketConnection, now: float) -> None:
+        deadline = self.get_next_deadline(connection, now)
+        connection.timer_deadline = None
+        if deadline is not None:
+            self.push(connection, deadline)
+
+    def push(self, connection: WebSocketConnection, deadline: float) -> None:
+        connection.timer_deadline = deadline
+        heapq.heappush(self.heap, (deadline, connection.session_id))
+
+    async def run(self) -> None:
+        while True:
+            now = self.clock()
+            self.expire_due(now)
+            delay = self.resolution
+            if self.heap:
+                delay = min(delay, max(0.0, self.heap[0][0] - now))
+            await asyncio.sleep(delay)
+
+    def expire_due(self, now: float) -> None:
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            deadline, session_id = heapq.heappop(heap)
+            connection = self.sessions.get(session_id)
+            if connection is not None and connection.timer_deadline == deadline:
+                self.check(connection, now)
+
+    def check(self, connection: WebSocketConnection, now: float) -> None:
+        expiry = self.get_expiry(connection, now)
+        if expiry is not None:
+            self.logger.info(f"Closing session [{connection.session_id}]: {expiry[1]}")
+            self.spawn(connection.close_sockets(*expiry))
+            return
+
+        if self.is_ping_due(connection, now):
+            connection.keepalive = (now, ())
+            self.spawn(self.send_pings(connection, now))
+            self.pings_sent += 1
+        self.schedule(connection, now)
+
+    def get_expiry(self, connection: WebSocketConnection, now: float) -> tuple[int, str] or None:
+        if self.max_lifetime > 0 and now >= connection.connected_at + self.max_lifetime:
+            self.lifetime_expirations += 1
+            return LIFETIME_EXCEEDED
+        if connection.proxied_web_socket is None:
+            if self.handshake_timeout > 0 and now >= connection.connected_at + self.handshake_timeout:
+                self.handshake_timeouts += 1
+                return HANDSHAKE_TIMEOUT
+            return None
+        if self.idle_timeout > 0 and now >= connection.last_activity_at + self.idle_timeout:
+            self.idle_timeouts += 1
+            return IDLE_TIMEOUT
+        if connection.keepalive is not None:
+            pinged_at, pong_waiters = connection.keepalive
+            if now >= pinged_at + self.ping_timeout and not all(waiter.done() for waiter in pong_waiters):
+                self.keepalive_failures += 1
+                return KEEPALIVE_TIMEOUT
+        return None
+
+    def is_ping_due(self, connection: WebSocketConnection, now: float) -> bool:
+        if self.ping_interval <= 0 or connection.proxied_web_socket is None:
+            return False
+        pinged_at = connection.connected_at if connection.keepalive is None else connection.keepalive[0]
+        return now >= pinged_at + self.ping_interval
+
+    def get_next_deadline(self, connection: WebSocketConnection, now: float) -> float or None:
+        deadlines = []
+        if self.max_lifetime > 0:
+            deadlines.append(connection.connected_at + self.max_lifetime)
+        if connection.proxied_web_socket is None:
+            if self.handshake_timeout > 0:
+                deadlines.append(connection.connected_at + self.handshake_timeout)
+        else:
+            if self.idle_timeout > 0:
+                deadlines.append(connection.last_activity_at + self.idle_timeout)
+            if self.ping_interval > 0:
+                pinged_at = connection.connected_at if connection.keepalive is None else connection.keepalive[0]
+                if connection.keepalive is not None and now < pinged_at + self.ping_timeout:
+                    # the pongs are checked once, ping_timeout after the ping
+                    deadlines.append(pinged_at + self.ping_timeout)
+                deadlines.append(pinged_at + self.ping_interval)
+        return min(deadlines, default=None)
+
+    def get_ping_sockets(self, connection: WebSocketConnection) -> list:
+        if self.ping_proxied and connection.upstream_lease is None:
+            return [connection.proxy_web_socket, connection.proxied_web_socket]
+        return [connection.proxy_web_socket]
+
+    async def send_pings(self, connection: WebSocketConnection, pinged_at: float) -> None:
+        pong_waiters = []
+        for web_socket in self.get_ping_sockets(connection):
+            try:
+                pong_waiters.append(await web_socket.ping())
+            except websockets.exceptions.ConnectionClosed:
+                continue
+        connection.keepalive = (pinged_at, tuple(pong_waiters))
+
+    def spawn(self, coroutine) -> None:
+        # closes and pings for a whole tick run concurrently, outside the timer loop
+        task = asyncio.ensure_future(coroutine)
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    def get_stats(self) -> dict:
+        return {
+            'timerEntries': len(self.heap),
+            'handshakeTimeouts': self.handshake_timeouts,
+            'idleTimeouts': self.idle_timeouts,
+            'lifetimeExpirations': self.lifetime_expirations,
+            'keepaliveFailures': self.keepalive_failures,
+            'keepalivePingsSent': self.pings_sent,
+        }
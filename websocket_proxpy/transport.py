@@ -0,0 +1,142 @@
+from typing import AsyncIterator
+
+
+class MessageWrapper:
+    """
+    Applies the configured sendPrefix/sendSuffix to forwarded messages. Both are encoded once up front so binary
+    frames never round-trip through str, and messages are returned untouched when there is nothing to add.
+    """
+    __slots__ = ('text_prefix', 'text_suffix', 'binary_prefix', 'binary_suffix', 'is_empty')
+
+    def __init__(self, prefix: str or None = "", suffix: str or None = "") -> None:
+        # matches the original behaviour: a missing prefix or suffix disables wrapping altogether
+        if prefix is None or suffix is None:
+            prefix, suffix = "", ""
+
+        self.text_prefix = prefix
+        self.text_suffix = suffix
+        self.binary_prefix = prefix.encode("utf-8")
+        self.binary_suffix = suffix.encode("utf-8")
+        self.is_empty = not prefix and not suffix
+
+    def wrap(self, message):
+        if self.is_empty:
+            return message
+
+        if isinstance(message, FragmentedMessage):
+            message.wrapper = self
+            return message
+
+        if isinstance(message, str):
+            return "".join((self.text_prefix, message, self.text_suffix))
+
+        return self.wrap_binary(message)
+
+    def wrap_binary(self, message) -> bytearray:
+        # one allocation; the payload is copied straight from its buffer into place
+        prefix_length = len(self.binary_prefix)
+        payload = memoryview(message)
+        wrapped = bytearray(prefix_length + payload.nbytes + len(self.binary_suffix))
+        wrapped_view = memoryview(wrapped)
+        wrapped_view[:prefix_length] = self.binary_prefix
+        wrapped_view[prefix_length:prefix_length + payload.nbytes] = payload.cast("B")
+        wrapped_view[prefix_length + payload.nbytes:] = self.binary_suffix
+        return wrapped
+
+    def prefix_for(self, fragment):
+        return self.text_prefix if isinstance(fragment, str) else self.binary_prefix
+
+    def suffix_for(self, fragment):
+        return self.text_suffix if isinstance(fragment, str) else self.binary_suffix
+
+
+NO_WRAPPER = MessageWrapper()
+
+
+class FragmentedMessage:
+    """
+    A message that arrived in more than one frame. Its fragments are forwarded as they arrive instead of being
+    reassembled into a full payload first.
+    """
+    __slots__ = ('head', 'fragments', 'wrapper', 'size')
+
+    def __init__(self, head: list, fragments: AsyncIterator) -> None:
+        self.head = head
+        self.fragments = fragments
+        self.wrapper = NO_WRAPPER
+        # payload length seen so far; complete once the message has been sent
+        self.size = 0
+
+    async def iterate(self) -> AsyncIterator:
+        wrapper = self.wrapper
+        first_fragment = self.head[0]
+
+        if not wrapper.is_empty and wrapper.prefix_for(first_fragment):
+            yield wrapper.prefix_for(first_fragment)
+        for fragment in self.head:
+            self.size += len(fragment)
+            yield fragment
+        async for fragment in self.fragments:
+            self.size += len(fragment)
+            yield fragment
+        if not wrapper.is_empty and wrapper.suffix_for(first_fragment):
+            yield wrapper.suffix_for(first_fragment)
+
+    async def discard(self) -> None:
+        # reads the frames still on the socket, which has to happen before the next message can be received
+        async for _ in self.fragments:
+            pass
+
+    def __str__(self) -> str:
+        return "<fragmented message>"
+
+
+class PrecompressedMessage(bytes):
+    """
+    A message payload still compressed with the sending peer's permessage-deflate context, relayed as is when
+    compression passthrough is enabled for the session (see websocket_proxpy.compression).
+    """
+
+    def __new__(cls, payload, is_text: bool) -> 'PrecompressedMessage':
+        message = super().__new__(cls, payload)
+        message.is_text = is_text
+        return message
+
+    def __str__(self) -> str:
+        return "<compressed message>"
+
+
+async def receive_message(web_socket):
+    """
+    Returns the next message as str/bytes, or as a FragmentedMessage when it spans several frames. Connections
+    without a streaming API (older websockets releases) always return the reassembled message.
+    """
+    recv_streaming = getattr(web_socket, 'recv_streaming', None)
+    if recv_streaming is None:
+        return await web_socket.recv()
+
+    fragments = recv_streaming()
+    first_fragment = await fragments.__anext__()
+    try:
+        # ends immediately after a final frame, so single-frame messages don't wait on the network here
+        second_fragment = await fragments.__anext__()
+    except StopAsyncIteration:
+        return first_fragment
+
+    return FragmentedMessage([first_fragment, second_fragment], fragments)
+
+
+def get_message_size(message) -> int:
+    if isinstance(message, FragmentedMessage):
+        return message.size
+    return len(message)
+
+
+async def send_message(web_socket, message) -> None:
+    if isinstance(message, FragmentedMessage):
+        await web_socket.send(message.iterate())
+    elif isinstance(message, PrecompressedMessage):
+        await web_socket.send(message, text=message.is_text)
+    else:
+        await web_socket.send(message)
+
@@ -0,0 +1,273 @@
+import asyncio
+import collections
+import time
+from typing import Awaitable, Callable
+
+import websockets.exceptions
+
+# what a failed upstream connect raises; pre-warming gives up on these until the next maintenance round
+CONNECT_ERRORS = (OSError, asyncio.TimeoutError, websockets.exceptions.InvalidHandshake)
+
+
+class UpstreamResponseTimeout(Exception):
+    pass
+
+
+def is_socket_open(web_socket) -> bool:
+    state = getattr(web_socket, 'state', None)
+    return state is not None and state.name == "OPEN"
+
+
+class PooledUpstream:
+    __slots__ = ('socket', 'lock', 'leases', 'idle_since')
+
+    def __init__(self, socket) -> None:
+        self.socket = socket
+        self.lock = asyncio.Lock()
+        self.leases = 0
+        self.idle_since = time.monotonic()
+
+
+class UpstreamPool:
+    """
+    Pool of pre-warmed WebSocket connections to one fixed upstream url (FORCED_URL modes).
+
+    In dedicated mode every client session leases an upstream exclusively. When the session ends the upstream is closed
+    rather than handed to the next client, since unread or late frames meant for the previous session may still
+    arrive on it; a replacement is opened in the background to keep min_size warm. In shared mode sessions are
+    multiplexed onto at most max_size upstreams and take turns through exchange(). Replies are matched to requests by
+    order only, so the upstream must answer every request with exactly one message; one that doesn't reply within
+    response_timeout is evicted, since its late reply would reach the next session's round trip.
+    """
+
+    def __init__(self, url: str, connect: Callable[[str], Awaitable], min_size: int = 1, max_size: int = 10,
+                 idle_timeout: float = 60.0, health_check_interval: float = 15.0, ping_timeout: float = 5.0,
+                 acquire_timeout: float = 10.0, shared: bool = False, response_timeout: float = 30.0) -> None:
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid upstream pool size bounds [{min_size}, {max_size}]")
+
+        self.url = url
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+        self.acquire_timeout = acquire_timeout
+        self.shared = shared
+        self.response_timeout = response_timeout
+
+        self.upstreams = []
+        self.idle = collections.deque()
+        self.capacity = asyncio.Semaphore(max_size)
+        # connects in flight, counted against min_size and max_size before they finish
+        self.connecting = set()
+        self.maintenance_task = None
+        self.refill_task = None
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.evictions = 0
+        self.retired = 0
+        self.connect_errors = 0
+        self.response_timeouts = 0
+
+    async def start(self) -> None:
+        await self.fill_to_min_size()
+        self.maintenance_task = asyncio.ensure_future(self.maintain())
+
+    async def close(self) -> None:
+        for task in (self.maintenance_task, self.refill_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self.maintenance_task = None
+        self.refill_task = None
+
+        upstreams, self.upstreams = self.upstreams, []
+        self.idle.clear()
+        await asyncio.gather(*(upstream.socket.close() for upstream in upstreams), return_exceptions=True)
+
+    async def acquire(self) -> PooledUpstream:
+        if self.shared:
+            return await self.acquire_shared()
+        return await self.acquire_dedicated()
+
+    async def release(self, upstream: PooledUpstream) -> None:
+        upstream.leases -= 1
+        if upstream.leases == 0:
+            upstream.idle_since = time.monotonic()
+
+        if self.shared:
+            if not is_socket_open(upstream.socket):
+                await self.evict(upstream)
+            return
+
+        if is_socket_open(upstream.socket):
+            await self.retire(upstream)
+        else:
+            await self.evict(upstream)
+        self.capacity.release()
+        self.schedule_refill()
+
+    def schedule_refill(self) -> None:
+        if self.refill_task is None or self.refill_task.done():
+            self.refill_task = asyncio.ensure_future(self.fill_to_min_size())
+
+    async def acquire_dedicated(self) -> PooledUpstream:
+        started = time.monotonic()
+        if self.capacity.locked():
+            self.waits += 1
+
+        await asyncio.wait_for(self.capacity.acquire(), self.acquire_timeout)
+        self.record_wait(time.monotonic() - started)
+
+        try:
+            while self.idle:
+                upstream = self.idle.pop()
+                if is_socket_open(upstream.socket):
+                    self.hits += 1
+                    upstream.leases = 1
+                    return upstream
+                await self.evict(upstream)
+
+            self.misses += 1
+            upstream = await self.open_upstream()
+            upstream.leases = 1
+            return upstream
+        except BaseException:
+            self.capacity.release()
+            raise
+
+    async def acquire_shared(self) -> PooledUpstream:
+        while True:
+            for upstream in [upstream for upstream in self.upstreams if not is_socket_open(upstream.socket)]:
+                if upstream.leases == 0:
+                    await self.evict(upstream)
+
+            candidates = [upstream for upstream in self.upstreams if is_socket_open(upstream.socket)]
+            least_leased = min(candidates, key=lambda upstream: upstream.leases, default=None)
+            # connects still in flight hold their slot, so concurrent acquires can't open more than max_size
+            at_capacity = len(candidates) + len(self.connecting) >= self.max_size
+
+            if least_leased is not None and (least_leased.leases == 0 or at_capacity):
+                self.hits += 1
+                least_leased.leases += 1
+                return least_leased
+            if not at_capacity:
+                break
+            await asyncio.wait(list(self.connecting), return_when=asyncio.FIRST_COMPLETED)
+
+        self.misses += 1
+        upstream = await self.open_upstream()
+        upstream.leases += 1
+        return upstream
+
+    async def exchange(self, upstream: PooledUpstream, round_trip: Callable[[], Awaitable]) -> any:
+        # one request/response round trip at a time on a shared upstream
+        async with upstream.lock:
+            try:
+                return await asyncio.wait_for(round_trip(), self.response_timeout or None)
+            except asyncio.TimeoutError:
+                self.response_timeouts += 1
+                # dropped for every session on it, the others see it closed on their next round trip
+                await self.evict(upstream)
+                raise UpstreamResponseTimeout(f"No reply from [{self.url}] within {self.response_timeout} seconds")
+
+    async def open_upstream(self) -> PooledUpstream:
+        # registered before the first await, so the slot is taken while the connect is in flight
+        connecting = asyncio.ensure_future(self.connect(self.url))
+        self.connecting.add(connecting)
+        try:
+            socket = await connecting
+        except Exception:
+            self.connect_errors += 1
+            raise
+        finally:
+            self.connecting.discard(connecting)
+
+        upstream = PooledUpstream(socket)
+        self.upstreams.append(upstream)
+        return upstream
+
+    async def evict(self, upstream: PooledUpstream) -> None:
+        if self.remove(upstream):
+            self.evictions += 1
+        await upstream.socket.close()
+
+    async def retire(self, upstream: PooledUpstream) -> None:
+        if self.remove(upstream):
+            self.retired += 1
+        await upstream.socket.close()
+
+    def remove(self, upstream: PooledUpstream) -> bool:
+        if upstream in self.idle:
+            self.idle.remove(upstream)
+        if upstream not in self.upstreams:
+            return False
+        self.upstreams.remove(upstream)
+        return True
+
+    async def fill_to_min_size(self) -> None:
+        while len(self.upstreams) + len(self.connecting) < self.min_size:
+            try:
+                upstream = await self.open_upstream()
+            except CONNECT_ERRORS:
+                return
+            if not self.shared:
+                self.idle.append(upstream)
+
+    async def is_healthy(self, upstream: PooledUpstream) -> bool:
+        if not is_socket_open(upstream.socket):
+            return False
+        try:
+            pong_waiter = await upstream.socket.ping()
+            await asyncio.wait_for(pong_waiter, self.ping_timeout)
+        except Exception:
+            return False
+        return True
+
+    async def maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await self.evict_idle_and_broken()
+            await self.fill_to_min_size()
+
+    async def evict_idle_and_broken(self) -> None:
+        now = time.monotonic()
+        for upstream in list(self.upstreams):
+            if upstream.leases:
+                continue
+
+            expired = now - upstream.idle_since > self.idle_timeout and len(self.upstreams) > self.min_size
+            if expired or not await self.is_healthy(upstream):
+                # a session may have leased it while we were waiting on the pong
+                if upstream.leases == 0:
+                    await self.evict(upstream)
+
+    def record_wait(self, wait_time: float) -> None:
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def get_stats(self) -> dict:
+        acquires = self.hits + self.misses
+        return {
+            'url': self.url,
+            'mode': "SHARED" if self.shared else "DEDICATED",
+            'size': len(self.upstreams),
+            'idle': sum(1 for upstream in self.upstreams if upstream.leases == 0),
+            'leases': sum(upstream.leases for upstream in self.upstreams),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / acquires if acquires else 0.0,
+            'waits': self.waits,
+            'waitTimeTotal': self.wait_time_total,
+            'waitTimeMax': self.wait_time_max,
+            'evictions': self.evictions,
+            'retired': self.retired,
+            'connectErrors': self.connect_errors,
+            'responseTimeouts': self.response_timeouts,
+        }
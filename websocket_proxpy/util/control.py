@@ -0,0 +1,37 @@
+import json
+
+# {"action": "close"} with generous whitespace fits comfortably; anything longer is treated as payload
+MAX_CONTROL_MESSAGE_LENGTH = 128
+
+
+class ControlMessageClassifier:
+    enabled = True
+    prefix = ""
+
+    def __init__(self, enabled: bool = True, prefix: str or None = "") -> None:
+        self.enabled = enabled
+        self.prefix = prefix or ""
+
+    def is_close(self, message) -> bool:
+        # cheap checks first so ordinary payloads never reach json.loads; binary frames are never control messages
+        if not self.enabled or not isinstance(message, str):
+            return False
+
+        if self.prefix:
+            if not message.startswith(self.prefix):
+                return False
+            message = message[len(self.prefix):]
+
+        if len(message) > MAX_CONTROL_MESSAGE_LENGTH:
+            return False
+
+        stripped_message = message.lstrip()
+        if not stripped_message.startswith("{") or "close" not in stripped_message:
+            return False
+
+        try:
+            parsed_json = json.loads(stripped_message)
+        except ValueError:
+            return False
+
+        return isinstance(parsed_json, dict) and parsed_json.get('action') == "close"
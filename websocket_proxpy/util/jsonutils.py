@@ -1,9 +1,64 @@
+import collections
 import json
 
 
-def get_json_status_response(status_code: str, message: str) -> str:
+def get_json_status_response(status_code: str, message: str, fields: dict or None = None) -> str:
     response = {
         'status': status_code,
         'message': message
     }
+    if fields:
+        response.update(fields)
     return json.dumps(response)
+
+
+class StatusResponses:
+    """
+    Rendered get_json_status_response strings, looked up by (status_code, message template, template arguments).
+    Responses that are fixed for a config are pinned once at config load; parametrized ones (e.g. a client supplied
+    url) are kept in an LRU cache of max_size entries. With pre_encoded, responses are UTF-8 bytes meant to be sent
+    as text frames, so they aren't encoded again per send.
+    """
+
+    def __init__(self, max_size: int = 256, pre_encoded: bool = False) -> None:
+        self.max_size = max_size
+        self.pre_encoded = pre_encoded
+        self.pinned = {}
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, status_code: str, message: str, fields: dict or None = None) -> str or bytes:
+        response = get_json_status_response(status_code, message, fields)
+        return response.encode("utf-8") if self.pre_encoded else response
+
+    def pin(self, status_code: str, template: str, *args) -> None:
+        self.pinned[(status_code, template, args)] = self.render(status_code, template.format(*args) if args
+                                                                 else template)
+
+    def format(self, status_code: str, template: str, *args) -> str or bytes:
+        key = (status_code, template, args)
+        response = self.pinned.get(key)
+        if response is not None:
+            return response
+
+        response = self.cache.get(key)
+        if response is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return response
+
+        self.misses += 1
+        response = self.render(status_code, template.format(*args) if args else template)
+        if self.max_size > 0:
+            self.cache[key] = response
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return response
+
+    def get_stats(self) -> dict:
+        return {
+            'statusResponsesCached': len(self.cache),
+            'statusResponseHits': self.hits,
+            'statusResponseMisses': self.misses,
+        }
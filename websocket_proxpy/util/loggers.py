@@ -1,19 +1,129 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+from typing import Callable, Hashable, Union
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class PayloadFormatter:
+    """
+    Defers truncation/redaction of a forwarded payload until a handler actually formats the record, so a
+    disabled level never touches the payload at all.
+    """
+    __slots__ = ('payload', 'max_length', 'redact')
+
+    def __init__(self, payload, max_length: int or None, redact: bool) -> None:
+        self.payload = payload
+        self.max_length = max_length
+        self.redact = redact
+
+    def __str__(self) -> str:
+        payload = self.payload
+        if not isinstance(payload, (str, bytes, bytearray, memoryview)):
+            return str(payload)
+
+        unit = "bytes" if isinstance(payload, (bytes, bytearray, memoryview)) else "chars"
+
+        if self.redact:
+            return f"<redacted {len(payload)} {unit}>"
+
+        if self.max_length is not None and len(payload) > self.max_length:
+            return f"{payload[:self.max_length]}... <{len(payload)} {unit}>"
+
+        return str(payload)
 
 
 class ConsoleDebugLogger:
     logger = None
+    level = logging.DEBUG
+    max_payload_length = None
+    redact_payloads = False
+    listener = None
 
-    def __init__(self, name: str) -> None:
+    def __init__(self, name: str, level: int = logging.DEBUG, max_payload_length: int or None = None,
+                 redact_payloads: bool = False, non_blocking: bool = False, log_file: str or None = None) -> None:
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(logging.DEBUG)
+        self.logger.setLevel(level)
+        self.level = level
+        self.max_payload_length = max_payload_length
+        self.redact_payloads = redact_payloads
 
-        logging_stream_handler = logging.StreamHandler()
+        formatter = logging.Formatter(LOG_FORMAT)
 
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        logging_stream_handler = logging.StreamHandler()
         logging_stream_handler.setFormatter(formatter)
+        handlers = [logging_stream_handler]
+
+        if log_file:
+            logging_file_handler = logging.FileHandler(log_file)
+            logging_file_handler.setFormatter(formatter)
+            handlers.append(logging_file_handler)
+
+        if non_blocking:
+            # the event loop only enqueues records; stream/file I/O happens on the listener thread
+            log_queue = queue.SimpleQueue()
+            self.listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.close)
+            self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        else:
+            for handler in handlers:
+                self.logger.addHandler(handler)
+
+    def is_enabled(self) -> bool:
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def log(self, message: str, *args) -> None:
+        # per-message tracing; session lifecycle and problems go through info/warning/error so INFO still shows them
+        self.emit(self.logger.debug, message, args)
+
+    def info(self, message: str, *args) -> None:
+        self.emit(self.logger.info, message, args)
+
+    def warning(self, message: str, *args) -> None:
+        self.emit(self.logger.warning, message, args)
+
+    def error(self, message: str, *args) -> None:
+        self.emit(self.logger.error, message, args)
+
+    @staticmethod
+    def emit(log_function: Callable, message: str, args: tuple) -> None:
+        if args:
+            log_function("WebSocketProxy: " + message, *args)
+        else:
+            log_function("WebSocketProxy: %s", message)
+
+    def log_payload(self, message: str, payload) -> None:
+        # hot path: bail out before building anything when DEBUG is off
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        self.logger.debug("WebSocketProxy: %s [%s]", message,
+                          PayloadFormatter(payload, self.max_payload_length, self.redact_payloads))
+
+    def close(self) -> None:
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+def create_logger_from_yaml(name: str, config_yaml: Union[dict[Hashable, any], list, None]) -> ConsoleDebugLogger:
+    try:
+        logging_configuration = config_yaml['configuration'].get('loggingConfiguration') or {}
+    except (TypeError, KeyError, AttributeError):
+        logging_configuration = {}
+
+    level = logging.getLevelName(str(logging_configuration.get('level', "DEBUG")).upper())
+    if not isinstance(level, int):
+        level = logging.DEBUG
 
-        self.logger.addHandler(logging_stream_handler)
+    max_payload_length = logging_configuration.get('maxPayloadLength')
 
-    def log(self, message: str) -> None:
-        self.logger.debug("WebSocketProxy: %s", message)
+    return ConsoleDebugLogger(
+        name,
+        level=level,
+        max_payload_length=int(max_payload_length) if max_payload_length is not None else None,
+        redact_payloads=bool(logging_configuration.get('redactPayloads', False)),
+        non_blocking=bool(logging_configuration.get('nonBlocking', False)),
+        log_file=logging_configuration.get('file') or None)
@@ -0,0 +1,213 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import signal
+import time
+from typing import Hashable, Union
+
+from websocket_proxpy.config_reload import RELOAD_SIGNAL, ConfigFileWatcher
+from websocket_proxpy.proxy import WebSocketProxpy
+from websocket_proxpy.util import base
+from websocket_proxpy.util.loggers import ConsoleDebugLogger, create_logger_from_yaml
+
+LOGGER_NAME = 'websocket_proxy'
+
+
+def get_worker_count(config_yaml: Union[dict[Hashable, any], list, None]) -> int:
+    try:
+        return max(1, int(config_yaml['configuration']['serverConfiguration'].get('workers', 1)))
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return 1
+
+
+def aggregate_stats(worker_stats: list[dict]) -> dict:
+    # counters and gauges are summed, *Max values take the maximum; ratios can't be summed and are dropped
+    aggregated = {}
+    for stats in worker_stats:
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                aggregated[key] = aggregate_stats([aggregated.get(key, {}), value])
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or key.endswith("Rate"):
+                continue
+            elif key.endswith("Max"):
+                aggregated[key] = max(aggregated.get(key, value), value)
+            else:
+                aggregated[key] = aggregated.get(key, 0) + value
+    return aggregated
+
+
+def run_worker(worker_id: int, config_yaml: Union[dict[Hashable, any], list, None],
+               stats_queue: multiprocessing.Queue, config_path: str or None = None) -> None:
+    # the supervisor handles Ctrl-C; workers only stop, draining their sessions, on SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if RELOAD_SIGNAL is not None:
+        # a reload forwarded by the supervisor before the worker's loop is up mustn't kill it
+        signal.signal(RELOAD_SIGNAL, signal.SIG_IGN)
+
+    # handlers inherited through fork may point at the parent's queue listener thread, which doesn't exist here
+    logging.getLogger(LOGGER_NAME).handlers.clear()
+
+    web_socket_proxpy = WebSocketProxpy(create_logger_from_yaml(LOGGER_NAME, config_yaml))
+    web_socket_proxpy.reuse_port = True
+    web_socket_proxpy.stop_signals = (signal.SIGTERM,)
+    # every worker serves its own /metrics, on the configured port plus its worker id
+    web_socket_proxpy.metrics_port_offset = worker_id
+    web_socket_proxpy.stats_sink = lambda stats: stats_queue.put((worker_id, stats))
+    web_socket_proxpy.run(config_yaml, config_path)
+
+
+class WorkerSupervisor:
+    """
+    Runs worker_count proxy processes bound to the same host/port with SO_REUSEPORT, restarts workers that exit
+    unexpectedly and terminates them all on SIGTERM/SIGINT. Workers report their stats every statsInterval seconds,
+    and once more when they stop; the supervisor logs the combined stats on the same interval. With config_path,
+    SIGHUP is forwarded to every worker, each of which reloads the file itself; the supervisor keeps the last valid
+    config to start restarted workers with.
+    """
+
+    def __init__(self, worker_count: int, config_yaml: Union[dict[Hashable, any], list, None],
+                 logger: ConsoleDebugLogger, restart_delay: float = 1.0, shutdown_timeout: float = 10.0,
+                 config_path: str or None = None) -> None:
+        self.worker_count = worker_count
+        self.config_yaml = config_yaml
+        self.config_path = config_path
+        self.config_watcher = None
+        self.logger = logger
+        self.restart_delay = restart_delay
+        self.shutdown_timeout = shutdown_timeout
+
+        self.context = multiprocessing.get_context("fork")
+        self.stats_queue = self.context.Queue()
+        self.workers = {}
+        self.last_started = {}
+        self.worker_stats = {}
+        self.restarts = 0
+        self.stats_interval = 5.0
+        self.stats_logged_at = time.monotonic()
+        self.stopping = False
+        self.reload_requested = False
+
+    def run(self) -> None:
+        web_socket_proxpy = WebSocketProxpy(self.logger)
+        if not web_socket_proxpy.load_config_from_yaml(self.config_yaml):
+            base.fatal_fail("Unable to load config file, can't parse the YAML!")
+        # workers get their drain deadline, plus time to close what's left, before they are killed
+        self.shutdown_timeout = max(self.shutdown_timeout, web_socket_proxpy.drain_timeout + 5.0)
+        self.stats_interval = web_socket_proxpy.stats_interval
+
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        if self.config_path is not None and RELOAD_SIGNAL is not None:
+            signal.signal(RELOAD_SIGNAL, self.request_reload)
+        if self.config_path is not None and web_socket_proxpy.config_watch_interval > 0:
+            # workers watch the file too; this one only keeps the config for restarts current
+            self.config_watcher = ConfigFileWatcher(self.config_path, lambda: None)
+
+        self.logger.info(f"Starting {self.worker_count} PROXY SERVER workers")
+        for worker_id in range(self.worker_count):
+            self.start_worker(worker_id)
+
+        try:
+            while not self.stopping:
+                sentinels = [process.sentinel for process in self.workers.values()]
+                multiprocessing.connection.wait(sentinels, timeout=1.0)
+                self.drain_stats()
+                self.log_stats_if_due()
+                self.reload_config_if_requested()
+                self.restart_exited_workers()
+        finally:
+            self.stop_workers()
+
+    def request_stop(self, signal_number: int, frame) -> None:
+        self.logger.info(f"Received signal [{signal_number}], stopping workers")
+        self.stopping = True
+
+    def request_reload(self, signal_number: int, frame) -> None:
+        self.reload_requested = True
+
+    def reload_config_if_requested(self) -> None:
+        if self.reload_requested:
+            self.reload_requested = False
+            self.reload_config()
+            for process in self.workers.values():
+                if process.is_alive():
+                    os.kill(process.pid, RELOAD_SIGNAL)
+        elif self.config_watcher is not None and self.config_watcher.has_changed():
+            self.reload_config()
+
+    def reload_config(self) -> None:
+        candidate = WebSocketProxpy(self.logger)
+        candidate.config_path = self.config_path
+        validated = candidate.validate_config_file(self.config_yaml)
+        if validated is None:
+            self.logger.error(f"Config file [{self.config_path}] is invalid, restarted workers keep the previous "
+                              f"config")
+            return
+        # restarted workers share the running listeners, so they get the same reloadable-only changes as the others
+        self.config_yaml = validated[1]
+
+    def start_worker(self, worker_id: int) -> None:
+        process = self.context.Process(target=run_worker,
+                                       args=(worker_id, self.config_yaml, self.stats_queue, self.config_path),
+                                       name=f"websocket-proxpy-worker-{worker_id}", daemon=True)
+        process.start()
+        self.workers[worker_id] = process
+        self.last_started[worker_id] = time.monotonic()
+        self.logger.info(f"Worker [{worker_id}] started with pid [{process.pid}]")
+
+    def restart_exited_workers(self) -> None:
+        for worker_id, process in list(self.workers.items()):
+            if process.is_alive() or self.stopping:
+                continue
+
+            # don't spin on a worker that dies immediately after starting
+            if time.monotonic() - self.last_started[worker_id] < self.restart_delay:
+                continue
+
+            self.logger.warning(f"Worker [{worker_id}] exited with code [{process.exitcode}], restarting")
+            process.close()
+            self.worker_stats.pop(worker_id, None)
+            self.restarts += 1
+            self.start_worker(worker_id)
+
+    def stop_workers(self) -> None:
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for worker_id, process in self.workers.items():
+            # the stats queue is read while waiting, so a final report can't keep a worker from exiting
+            while process.is_alive() and time.monotonic() < deadline:
+                process.join(min(0.1, max(0.0, deadline - time.monotonic())))
+                self.drain_stats()
+            if process.is_alive():
+                self.logger.warning(f"Worker [{worker_id}] didn't stop in time, killing it")
+                process.kill()
+                process.join()
+
+        self.drain_stats()
+        self.logger.info(f"All workers stopped. Final stats {self.get_stats()}")
+
+    def drain_stats(self) -> None:
+        while True:
+            try:
+                worker_id, stats = self.stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.worker_stats[worker_id] = stats
+
+    def log_stats_if_due(self) -> None:
+        now = time.monotonic()
+        if now - self.stats_logged_at >= self.stats_interval:
+            self.stats_logged_at = now
+            self.logger.info(f"Worker stats {self.get_stats()}")
+
+    def get_stats(self) -> dict:
+        stats = aggregate_stats(list(self.worker_stats.values()))
+        stats['workers'] = sum(1 for process in self.workers.values() if process.is_alive())
+        stats['workerRestarts'] = self.restarts
+        return stats